@@ -15,6 +15,18 @@ class EtlSettings(CommonConfig):
     info_tb_same_app_db: bool = False  # 基础信息数据是否跟随主业务表, 为True时, info表统一从demo环境读取
     enabled_flow_log: bool = False  # etl执行是否注册prefect任务, 当通过prefect平台调度时开启
     enabled_event: bool = False  # 是否启用event
+    enabled_query_cache: bool = False  # 是否启用源sql查询结果缓存（批量etl时相同的sql只查询一次数据库）
+    query_cache_path: str = None  # 查询缓存目录，默认为etl目录下的.query_cache
+    query_cache_ttl: int = 12 * 3600  # 查询缓存有效期（秒）
+    query_cache_max_bytes: int = 2 * 1024 ** 3  # 查询缓存最大占用空间，超过时按最近访问时间淘汰
+    db_max_concurrency: int = 8  # 每个数据库session同时执行的查询数上限（进程内），<=0不限制
+    db_session_max_concurrency: dict = {}  # 按session单独配置并发上限，如 {"info": 4}
+    enabled_metrics: bool = True  # 是否记录etl分阶段指标（JSON lines + Prometheus文本格式）
+    metrics_path: str = None  # 指标文件目录，默认为etl目录下的.metrics
+    compact_target_bytes: int = 128 * 1024 ** 2  # compact合并小文件的目标文件大小
+    compact_vacuum_grace: int = 3600  # compact替换下的旧文件保留时间（秒），供仍持有旧文件列表的读取方使用，之后由vacuum删除
+    plan_rows_per_unit: int = 500000  # 并发查询每个工作单元的目标行数（按探测/历史行数切分日期区间）
+    plan_probe_rows: bool = True  # 并发查询前是否按日COUNT(*)探测源表行数（模型配置了PLAN_DATE_COLUMN时）
 
     @validator("etl_save_path", pre=False)
     def validate_etl_save_path(cls, etl_save_path, values):
@@ -23,6 +35,18 @@ class EtlSettings(CommonConfig):
             etl_save_path = os.path.join(STATIC_PATH, f"qlib-{run_env}")
         return etl_save_path
 
+    @validator("query_cache_path", pre=False, always=True)
+    def validate_query_cache_path(cls, query_cache_path, values):
+        if not query_cache_path and values.get('etl_save_path'):
+            query_cache_path = os.path.join(values['etl_save_path'], '.query_cache')
+        return query_cache_path
+
+    @validator("metrics_path", pre=False, always=True)
+    def validate_metrics_path(cls, metrics_path, values):
+        if not metrics_path and values.get('etl_save_path'):
+            metrics_path = os.path.join(values['etl_save_path'], '.metrics')
+        return metrics_path
+
 
 settings: EtlSettings = get_settings(EtlSettings)
 
@@ -11,6 +11,24 @@ class PartitionByDateType(Enum):
     quarter = 'quarter'
 
 
+class ExecutorType(Enum):
+    thread = 'thread'  # 线程池，适合io(sql查询)为主的任务
+    process = 'process'  # 进程池，适合cpu密集的转换计算，df通过Arrow IPC传递
+    serial = 'serial'  # 串行，便于调试
+
+
+class StringDtype(Enum):
+    object = 'object'  # python str对象（默认）
+    category = 'category'  # 字典编码字段转为pandas Categorical，其余字符串字段为object
+    pyarrow = 'pyarrow'  # 字符串字段（含字典编码字段）转为string[pyarrow]
+
+
+class InterpMethod(Enum):
+    linear = 'linear'  # 线性
+    cubic = 'cubic'  # 三次样条
+    flat_forward = 'flat_forward'  # 远期利率分段常数（对 rate * tenor 线性插值）
+
+
 DEF_SEC_CSI = [
     'SEC024342013',  # 沪深300
     'SEC023059609',  # 中证
@@ -0,0 +1,176 @@
+# vim set fileencoding=utf-8
+"""数据库并发控制：按session限制同时执行的查询数，等待的查询按模型轮转放行（公平排队），记录排队耗时"""
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from qt_etl.config import settings
+
+__all__ = ['SessionGovernor', 'get_governor', 'slot', 'get_stats', 'reset']
+
+
+class SessionGovernor:
+    """
+    单个session的并发控制
+    有空闲名额且无人排队时直接放行；否则按owner(模型)分队列排队，释放名额时在各owner之间轮转放行，
+    避免按月拆分出几十个查询的模型占满名额、其他模型长时间等待
+    """
+
+    def __init__(self, session: str, max_in_flight: int):
+        """
+        :param session: 数据库session
+        :param max_in_flight: 最大同时执行的查询数，<=0时不限制
+        """
+        self.session = session
+        self.max_in_flight = max_in_flight
+        self._cond = threading.Condition()
+        self._queues: Dict[str, deque] = OrderedDict()  # owner -> 等待的ticket
+        self._granted = set()
+        self._in_flight = 0
+        # 统计
+        self._queries = 0
+        self._waited = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._peak_in_flight = 0
+        self._owner_queries: Dict[str, int] = {}
+
+    def _has_slot(self) -> bool:
+        return self.max_in_flight <= 0 or self._in_flight < self.max_in_flight
+
+    def _take(self):
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _grant(self):
+        """按owner轮转放行排队的查询"""
+        granted = False
+        while self._queues and self._has_slot():
+            owner, queue = next(iter(self._queues.items()))
+            self._granted.add(queue.popleft())
+            self._take()
+            # 放行后该owner移到队尾
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, owner: str = '') -> float:
+        """
+        获取名额
+        :param owner: 排队的分组（模型名）
+        :return: 排队耗时（秒）
+        """
+        t1 = time.perf_counter()
+        with self._cond:
+            if not self._queues and self._has_slot():
+                self._take()
+            else:
+                ticket = object()
+                self._queues.setdefault(owner, deque()).append(ticket)
+                while ticket not in self._granted:
+                    self._cond.wait()
+                self._granted.discard(ticket)
+            wait = time.perf_counter() - t1
+            self._queries += 1
+            self._owner_queries[owner] = self._owner_queries.get(owner, 0) + 1
+            if wait > 0.001:
+                self._waited += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return wait
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._grant()
+
+    @contextmanager
+    def slot(self, owner: str = ''):
+        self.acquire(owner)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'session': self.session,
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self._in_flight,
+                'queued': sum(len(q) for q in self._queues.values()),
+                'peak_in_flight': self._peak_in_flight,
+                'queries': self._queries,
+                'waited': self._waited,
+                'total_wait': round(self._total_wait, 3),
+                'avg_wait': round(self._total_wait / self._queries, 3) if self._queries else 0.0,
+                'max_wait': round(self._max_wait, 3),
+                'owner_queries': dict(self._owner_queries),
+            }
+
+
+_governors: Dict[str, SessionGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def get_max_in_flight(session: str) -> int:
+    """session的最大并发查询数，settings.db_session_max_concurrency中未配置时取settings.db_max_concurrency"""
+    return (settings.db_session_max_concurrency or {}).get(session, settings.db_max_concurrency)
+
+
+def get_governor(session: str) -> SessionGovernor:
+    with _governors_lock:
+        governor = _governors.get(session)
+        if governor is None:
+            governor = _governors[session] = SessionGovernor(session, get_max_in_flight(session))
+        return governor
+
+
+@contextmanager
+def slot(session: str, owner: str = ''):
+    """
+    在session的并发限制内执行查询
+        with db_governor.slot('info', 'BondInfo'):
+            db_manager.pd_read_sql(sql, 'info')
+    """
+    with get_governor(session).slot(owner):
+        yield
+
+
+def get_stats(session: Optional[str] = None):
+    """
+    排队统计
+    :param session: 为空时返回全部session
+    """
+    if session:
+        return get_governor(session).stats()
+    with _governors_lock:
+        governors = list(_governors.values())
+    return {g.session: g.stats() for g in governors}
+
+
+def reset():
+    """清空统计，按当前配置重建（修改并发配置后调用）"""
+    with _governors_lock:
+        _governors.clear()
+
+
+if __name__ == '__main__':
+    from concurrent.futures import ThreadPoolExecutor
+
+    _governor = SessionGovernor('default', 2)
+
+    def _query(owner):
+        with _governor.slot(owner):
+            time.sleep(0.05)
+        return owner
+
+    with ThreadPoolExecutor(max_workers=16) as _executor:
+        # A先提交12个查询，B后提交2个，B不需要等A全部执行完
+        print(list(_executor.map(_query, ['A'] * 12 + ['B'] * 2)))
+    print(_governor.stats())
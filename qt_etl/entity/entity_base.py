@@ -3,28 +3,40 @@ import asyncio
 import copy
 import functools
 import gc
+import json
 import os
 import shutil
+import statistics
+import threading
 import time
 import traceback
+import uuid
+import zlib
+from collections import defaultdict
 from contextvars import ContextVar
 from datetime import date, datetime, timedelta
 from typing import Optional, Union, Any, List
+from urllib.parse import quote, unquote
 
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 from qt_common import async_helper, db_manager, utils
 from qt_common.error import QtException, QtError
 from qt_common.event_handlers import EventHandler, EventRecord
 from qt_common.protoc.db.event import EventType, EventStatus
 from qt_common.qt_logging import frame_log as logger
-from qt_common.utils import date_to_str, month_end, str_to_date, month_beg
+from qt_common.utils import date_to_str, month_end, str_to_date
 from qt_etl.config import settings
-from qt_etl.constants import PartitionByDateType
+from qt_etl.constants import PartitionByDateType, ExecutorType, StringDtype
 from qt_etl.entity.fields import Dimension
+from qt_etl.entity.filters import build_filter, PUSHDOWN_PARTITION_TYPES
 from qt_etl.err_code import EtlError
+from qt_etl.executor import map_frames
+from qt_etl import db_governor, metrics, query_cache
 from qt_etl.utils import deal_date, is_completed
 
 
@@ -32,6 +44,29 @@ def decode_value(v):
     return v.decode()
 
 
+def as_date(d: Optional[Union[str, date, datetime]]):
+    """统一转为date，避免datetime与date比较报错"""
+    if d is None:
+        return None
+    if isinstance(d, str):
+        d = str_to_date(d)
+    if isinstance(d, datetime):
+        return d.date()
+    return d
+
+
+def bucket_of(value, bucket_count: int) -> int:
+    """分桶编号：crc32(值) mod 分桶数（跨进程稳定，不能用hash()）"""
+    return zlib.crc32(str(value).encode('utf-8')) % bucket_count
+
+
+_etl_state_lock = threading.RLock()
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+# 进程内dataset缓存 {(etl目录, 日期分区类型): (generation, FileSystemDataset)}
+_dataset_cache = {}
+_dataset_cache_lock = threading.Lock()
+
+
 class EntityBase:
     """etl数据核心类"""
 
@@ -41,17 +76,36 @@ class EntityBase:
 
     is_concurrent_query = False  # 并发查询
     is_concurrent_save = False  # 并发保存
+    depends_on = ()  # 依赖的上游etl模型（模型类名），批量运行时上游完成后才运行
 
     partitioned_by_secu_code = False
     partitioned_cols = []  # 按字段分割
     partition_max_rows_per_file = None  # 按数量分割
     partitioned_by_date = None  # 按日期分割（支持，年/月/季度/日）
+    bucket_by = None  # 分桶字段，按crc32(值) mod bucket_count分到bucket=N目录（替代每个取值一个目录）
+    bucket_count = None  # 分桶数，可与日期分割同时使用（bucket=N/month=yyyy-mm）
+    BUCKET_FIELD = 'bucket'  # 分桶目录字段名
     partition_max_rows_per_group = 1024 * 1024
+    CLUSTERED_ROWS_PER_GROUP = 128 * 1024  # 有排序字段时默认的row group行数（row group越小，统计信息过滤粒度越细）
+    sort_keys = None  # 写入时的排序（聚簇）字段，None时取CODE_COLUMN或instrument_code，()时不排序
+    rows_per_group = None  # 目标row group行数，None时有排序字段取CLUSTERED_ROWS_PER_GROUP，否则取partition_max_rows_per_group
     etl_save_path = settings.etl_save_path
-    CODE_COLUMN = None
+    CODE_COLUMN = None  # 合并写入主键（与trade_date一起），为空时按trade_date整日替换
     DATE_COLUMN = None
     USED_TABLE = None
+    PLAN_TABLE = None  # 并发查询前探测行数的源表，None时取main_table
+    PLAN_DATE_COLUMN = None  # 探测行数的源表日期字段，为空时只按历史行数规划
+    PLAN_CODE_COLUMN = None  # 探测行数时按secu_codes过滤的源表字段
+    plan_rows_per_unit = None  # 并发查询每个工作单元的目标行数，None时取settings.plan_rows_per_unit
+    plan_split_codes = False  # 单日超过目标行数时按代码分桶拆分secu_codes（fetch_data按secu_code过滤的模型）
     schema = None
+    ETL_STATE_SUFFIX = '.state.json'  # etl状态文件（水位线等），与etl目录同级
+    # 默认字典编码的维度字段（每个文件中不同值很少）
+    DICTIONARY_DIMENSIONS = (Dimension.BOOK_ID, Dimension.INSTRUMENT_CODE, Dimension.INSTRUMENT_TYPE,
+                             Dimension.CURRENCY, Dimension.TRADING_MARKET, Dimension.INDEX, Dimension.TENOR,
+                             Dimension.TIME_SERIES_TYPE)
+    dictionary_columns = None  # 字典编码字段，None时取schema中属于DICTIONARY_DIMENSIONS的string字段，()时不编码
+    string_dtype = StringDtype.object  # get_data字符串字段的pandas类型
 
     @classmethod
     def get_partition_dates(cls, start_date: Optional[Union[datetime, date]],
@@ -66,6 +120,166 @@ class EntityBase:
         date_partitions.append((start_date, end_date))
         return date_partitions
 
+    @classmethod
+    def get_plan_rows_per_unit(cls) -> int:
+        return cls.plan_rows_per_unit or settings.plan_rows_per_unit
+
+    @classmethod
+    def get_count_sql(cls, secu_codes, start_date: date, end_date: date) -> Optional[str]:
+        """按日统计源表行数的sql，未配置PLAN_DATE_COLUMN时返回None"""
+        table = cls.PLAN_TABLE or cls.main_table
+        if not (table and cls.PLAN_DATE_COLUMN):
+            return None
+        sql = f"""SELECT {cls.PLAN_DATE_COLUMN} AS PLAN_DATE, COUNT(*) AS PLAN_ROWS FROM {table}
+                WHERE {cls.PLAN_DATE_COLUMN} BETWEEN '{start_date}' AND '{end_date}'"""
+        codes = cls.parse_secu_codes(secu_codes)
+        if codes and cls.PLAN_CODE_COLUMN:
+            code_list = ",".join(["'%s'" % code for code in codes])
+            sql += f" AND {cls.PLAN_CODE_COLUMN} in ({code_list})"
+        return sql + f" GROUP BY {cls.PLAN_DATE_COLUMN}"
+
+    @classmethod
+    def probe_row_counts(cls, secu_codes, start_date: date, end_date: date) -> Optional[dict]:
+        """
+        探测源表行数：一次group by查询得到每日行数（代替每个候选区间一次COUNT(*)）
+        :return: {date: 行数}，未配置或探测失败时返回None
+        """
+        sql = cls.get_count_sql(secu_codes, start_date, end_date)
+        if not sql or not settings.plan_probe_rows:
+            return None
+        try:
+            df = cls.query(sql, use_cache=False)
+        except Exception as e:
+            logger.warning(f'{cls.__name__} 探测行数异常，按历史行数规划：{e}')
+            return None
+        counts = defaultdict(int)
+        if df is not None and not df.empty:
+            for trade_date, rows in zip(df.iloc[:, 0], df.iloc[:, 1]):
+                counts[as_date(trade_date)] += int(rows)
+        return counts
+
+    @classmethod
+    def get_row_history(cls) -> dict:
+        """历史行数 {yyyy-mm: 该月每个交易日的平均行数}"""
+        return cls.load_etl_state().get('row_history') or {}
+
+    @classmethod
+    def record_row_history(cls, df: pd.DataFrame):
+        """按本次拉取的数据记录每月日均行数（日均不受增量只拉取部分月份影响），供下次规划并发查询单元"""
+        if df is None or df.empty or Dimension.TRADE_DATE not in df.columns:
+            return
+        trade_dates = df[Dimension.TRADE_DATE].dropna().astype(str)
+        if trade_dates.empty:
+            return
+        stats = trade_dates.groupby(trade_dates.str[:7]).agg(['size', 'nunique'])
+        history = {month: int(round(item['size'] / item['nunique'])) for month, item in stats.iterrows()}
+        with _etl_state_lock:
+            cls.update_etl_state(row_history={**cls.get_row_history(), **history})
+
+    @classmethod
+    def estimate_daily_rows(cls, secu_codes, start_date: Optional[Union[datetime, date]],
+                            end_date: Optional[Union[datetime, date]]) -> Optional[list]:
+        """
+        每日估计行数：优先探测源表，其次按历史日均行数（周末按0估计，没有记录的月份取历史中位数）
+        :return: [(date, 估计行数)]，不能估计时返回None
+        """
+        start_date, end_date = as_date(start_date), as_date(end_date)
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        if not days:
+            return None
+        counts = cls.probe_row_counts(secu_codes, start_date, end_date)
+        if counts is not None:
+            return [(d, counts.get(d, 0)) for d in days]
+        history = cls.get_row_history()
+        if not history:
+            return None
+        default = statistics.median(history.values())
+        return [(d, 0 if d.weekday() >= 5 else history.get(f'{d:%Y-%m}', default)) for d in days]
+
+    @staticmethod
+    def parse_secu_codes(secu_codes) -> list:
+        """secu_codes（代码列表或sql in列表字符串）转为代码列表"""
+        if not secu_codes:
+            return []
+        if isinstance(secu_codes, str):
+            secu_codes = secu_codes.split(',')
+        codes = (str(code).strip().strip('\'"') for code in secu_codes if code is not None)
+        return [code for code in codes if code]
+
+    @classmethod
+    def split_secu_codes(cls, secu_codes, parts: int) -> list:
+        """
+        按代码分桶拆分secu_codes（plan_split_codes时）
+        代码列表拆分为多个列表（fetch_data的装饰器再格式化为sql in列表），sql in列表字符串拆分为多个字符串
+        :return: [secu_codes]，不能拆分时只有原值一个元素
+        """
+        codes = cls.parse_secu_codes(secu_codes)
+        if parts <= 1 or not (cls.plan_split_codes and len(codes) > 1):
+            return [secu_codes]
+        groups = defaultdict(list)
+        for code in codes:
+            groups[bucket_of(code, parts)].append(code)
+        return [cls.format_secu_codes(secu_codes, group) for _, group in sorted(groups.items())]
+
+    @staticmethod
+    def format_secu_codes(secu_codes, codes: list):
+        """codes转为与secu_codes相同的形式（代码列表或sql in列表字符串）"""
+        if isinstance(secu_codes, str):
+            return ",".join(["'%s'" % code for code in codes])
+        return list(codes)
+
+    @classmethod
+    def plan_work_units(cls, secu_codes, start_date: Optional[Union[datetime, date]],
+                        end_date: Optional[Union[datetime, date]]) -> list:
+        """
+        并发查询的工作单元：按估计行数把日期区间切分为行数接近plan_rows_per_unit的连续区间，
+        单日仍超过目标行数时按代码分桶拆分；不能估计行数时按月切分（get_partition_dates）
+        :return: [(secu_codes, start_date, end_date, 估计行数)]，按月切分时估计行数为None
+        """
+        if secu_codes and not isinstance(secu_codes, (str, list)):
+            # 元组、集合等转为列表，fetch_data的装饰器只格式化列表
+            secu_codes = list(secu_codes)
+        estimates = cls.estimate_daily_rows(secu_codes, start_date, end_date)
+        if not estimates:
+            return [(secu_codes, s_date, e_date, None)
+                    for s_date, e_date in cls.get_partition_dates(start_date=start_date, end_date=end_date)]
+        target = cls.get_plan_rows_per_unit()
+        date_units = []
+        unit_start, unit_rows = None, 0
+        for d, rows in estimates:
+            # 加上当天超过目标行数时，之前的日期作为一个单元
+            if unit_rows and unit_rows + rows > target:
+                date_units.append((unit_start, d - timedelta(days=1), unit_rows))
+                unit_start, unit_rows = None, 0
+            if unit_start is None:
+                unit_start = d
+            unit_rows += rows
+        date_units.append((unit_start, estimates[-1][0], unit_rows))
+
+        units = []
+        for s_date, e_date, rows in date_units:
+            code_groups = cls.split_secu_codes(secu_codes, -(-int(rows) // target)) if rows > target else [secu_codes]
+            units.extend((codes, s_date, e_date, int(rows / len(code_groups))) for codes in code_groups)
+        logger.info(f'{cls.__name__} 并发查询规划 units:{len(units)} 估计行数:{int(sum(r for *_, r in units))} '
+                    f'单元最大行数:{max(r for *_, r in units)} 目标行数:{target}')
+        return units
+
+    @classmethod
+    def split_by_date_partition(cls, df: pd.DataFrame, partitioned_by_date=None) -> list:
+        """
+        按日期分区拆分df（并发保存时每个任务只写一个日期分区）
+        :param partitioned_by_date: 日期分区，None时取已有数据的分区
+        """
+        if partitioned_by_date is None:
+            partitioned_by_date = cls.get_write_partitioned_by_date()
+        if df.empty or Dimension.TRADE_DATE not in df.columns or \
+                partitioned_by_date not in (PartitionByDateType.year, PartitionByDateType.quarter,
+                                            PartitionByDateType.month):
+            return [df]
+        trade_dates = df[Dimension.TRADE_DATE]
+        date_mapping = {d: deal_date(d, partitioned_by_date) for d in trade_dates.dropna().unique()}
+        return [_df for _, _df in df.groupby(trade_dates.map(date_mapping), sort=False, dropna=False)]
+
     @classmethod
     def get_partition_columns(cls):
         schema = cls.schema
@@ -73,6 +287,8 @@ class EntityBase:
         if cls.partitioned_cols:
             for col in cls.partitioned_cols:
                 partition_columns.append(schema.field(col))
+        if cls.bucket_count:
+            partition_columns.append(pa.field(cls.BUCKET_FIELD, pa.string()))
         return partition_columns
 
     @classmethod
@@ -86,99 +302,353 @@ class EntityBase:
         return part
 
     @classmethod
-    @utils.timing
-    def save_dataset(cls, df, file_path, sign="all"):
+    def get_read_partition_columns(cls):
+        """读取时的分区字段，月/季/年分区额外加上日期分区字段用于下推过滤"""
+        partition_columns = cls.get_partition_columns()
+        partitioned_by_date = cls.get_partitioned_by_date()
+        if cls.schema is not None and partitioned_by_date in PUSHDOWN_PARTITION_TYPES:
+            partition_columns.append(pa.field(partitioned_by_date.value, pa.string()))
+        return partition_columns
+
+    @classmethod
+    def get_sort_keys(cls) -> list:
+        """写入时的排序字段：相同取值集中在少数row group，按该字段过滤时根据row group统计信息跳过其余row group"""
+        if cls.schema is None:
+            return []
+        keys = [cls.CODE_COLUMN or Dimension.INSTRUMENT_CODE] if cls.sort_keys is None else cls.sort_keys
+        partition_names = {field.name for field in cls.get_partition_columns()}
+        return [key for key in keys if key in cls.schema.names and key not in partition_names]
+
+    @classmethod
+    def sort_table(cls, table: pa.Table) -> pa.Table:
+        """按排序字段升序、trade_date降序排列，未定义排序字段时不排序"""
+        keys = cls.get_sort_keys()
+        if not keys or table.num_rows <= 1:
+            return table
+        sort_keys = [(key, 'ascending') for key in keys]
+        if Dimension.TRADE_DATE in table.column_names and Dimension.TRADE_DATE not in keys:
+            sort_keys.append((Dimension.TRADE_DATE, 'descending'))
+        # dictionary字段不支持直接排序，按解码后的值计算顺序
+        key_table = cls.decode_dictionary(table.select([key for key, _ in sort_keys]))
+        return table.take(pc.sort_indices(key_table, sort_keys=sort_keys))
+
+    @classmethod
+    def get_row_group_kwargs(cls) -> dict:
+        """write_dataset的row group参数，有排序字段时小分块累积到目标行数再写出（避免产生大量小row group）"""
+        sort_keys = cls.get_sort_keys()
+        rows = cls.rows_per_group or (cls.CLUSTERED_ROWS_PER_GROUP if sort_keys else cls.partition_max_rows_per_group)
+        if cls.partition_max_rows_per_file:
+            rows = min(rows, cls.partition_max_rows_per_file)
+        return dict(min_rows_per_group=rows if sort_keys else 0, max_rows_per_group=rows)
+
+    @classmethod
+    def get_dictionary_columns(cls, include_sort_keys: bool = False) -> list:
         """
-        :param df:
-        :param file_path:
-        :param sign: 标识
-        :return:
+        字典编码字段：写入时以dictionary类型存储，读取时直接解码为dictionary（不逐行生成字符串）
+        排序字段按string存储：dictionary类型的字段不能利用row group统计信息过滤
+        :param include_sort_keys: 是否包含排序字段（get_data转为category时读取后再编码）
+        """
+        if cls.schema is None:
+            return []
+        names = cls.DICTIONARY_DIMENSIONS if cls.dictionary_columns is None else cls.dictionary_columns
+        # 分区字段不在文件中存储
+        excluded = {field.name for field in cls.get_partition_columns()}
+        if not include_sort_keys:
+            excluded.update(cls.get_sort_keys())
+        return [name for name in names if name in cls.schema.names and name not in excluded
+                and pa.types.is_string(cls.schema.field(name).type)]
+
+    @classmethod
+    def with_dictionary_types(cls, schema: pa.Schema) -> pa.Schema:
+        """schema中的字典编码字段改为dictionary类型"""
+        for name in cls.get_dictionary_columns():
+            i = schema.get_field_index(name)
+            if i >= 0:
+                schema = schema.set(i, schema.field(i).with_type(DICTIONARY_TYPE))
+        return schema
+
+    @classmethod
+    def encode_dictionary(cls, table: pa.Table, columns: Optional[list] = None) -> pa.Table:
+        """
+        table中的字典编码字段转为dictionary
+        :param columns: 需要编码的字段，默认get_dictionary_columns()
+        """
+        for name in cls.get_dictionary_columns() if columns is None else columns:
+            i = table.schema.get_field_index(name)
+            if i >= 0 and pa.types.is_string(table.schema.field(i).type):
+                table = table.set_column(i, table.schema.field(i).with_type(DICTIONARY_TYPE),
+                                         pc.dictionary_encode(table.column(i)))
+        return table
+
+    @staticmethod
+    def decode_dictionary(table: pa.Table) -> pa.Table:
+        """dictionary字段解码为原类型"""
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.with_type(field.type.value_type),
+                                         pc.cast(table.column(i), field.type.value_type))
+        return table
+
+    @classmethod
+    def get_read_schema(cls):
+        """dataset读取schema（schema + 日期分区字段，字典编码字段为dictionary类型）"""
+        schema = cls.schema
+        if schema is None:
+            return schema
+        schema = cls.with_dictionary_types(schema)
+        for field in cls.get_read_partition_columns():
+            if field.name not in schema.names:
+                schema = schema.append(field)
+        return schema
+
+    @classmethod
+    def get_write_partition_columns(cls, partitioned_by_date=None):
+        """
+        写入时的分区字段（partitioned_cols + 日期分区字段）
+        :param partitioned_by_date: 日期分区，None时取已有数据的分区
         """
+        if partitioned_by_date is None:
+            partitioned_by_date = cls.get_write_partitioned_by_date()
+        partition_columns = None
+        # 按日期分割
+        if partitioned_by_date:
+            partition_columns = cls.get_partition_columns()
+            if partitioned_by_date.value not in PartitionByDateType.__members__:
+                raise QtException(QtError.E_SUCCESS, msg='暂不支持的参数',
+                                  partitioned_by_date=partitioned_by_date)
+            if partitioned_by_date == PartitionByDateType.day:
+                partition_columns.append(pa.field(Dimension.TRADE_DATE, pa.string()))
+            else:
+                partition_columns.append(pa.field(partitioned_by_date.value, pa.string()))
+        return partition_columns
+
+    @classmethod
+    def get_write_schema(cls, partitioned_by_date=None):
+        """写入table的schema（schema + 分桶字段 + 日期分区字段，不含pandas metadata）"""
+        if partitioned_by_date is None:
+            partitioned_by_date = cls.get_write_partitioned_by_date()
+        schema = cls.with_dictionary_types(cls.schema.remove_metadata())
+        if cls.bucket_count:
+            schema = schema.append(pa.field(cls.BUCKET_FIELD, pa.string()))
+        if partitioned_by_date and partitioned_by_date != PartitionByDateType.day:
+            schema = schema.append(pa.field(partitioned_by_date.value, pa.string()))
+        return schema
+
+    @classmethod
+    def to_arrow_table(cls, df: pd.DataFrame, partitioned_by_date=None) -> pa.Table:
+        """df转为待写入的pa.Table（按schema字段排列，追加分桶、日期分区字段，字典编码字段转为dictionary）"""
+        if partitioned_by_date is None:
+            partitioned_by_date = cls.get_write_partitioned_by_date()
         schema = copy.deepcopy(cls.schema)
         if schema:
             # 这样定义schema filed字段可以不用和fetch_data返回字段顺序一致
             columns = [i.name for i in schema]
             if len(df):
                 df = df[columns]
+
+        # 支持某列为空
+        table = pa.Table.from_pandas(df, schema=schema)
+        if cls.bucket_count:
+            # 按取值去重后计算分桶
+            values = df[cls.bucket_by].fillna('')
+            bucket_mapping = {v: str(bucket_of(v, cls.bucket_count)) for v in values.unique()}
+            table = table.append_column(cls.BUCKET_FIELD, [values.map(bucket_mapping).to_list()])
+        if partitioned_by_date and partitioned_by_date != PartitionByDateType.day:
+            # 按日期去重后计算分区值
+            trade_dates = df[Dimension.TRADE_DATE]
+            date_mapping = {d: deal_date(d, partitioned_by_date) for d in trade_dates.unique()}
+            partition_date_value = trade_dates.map(date_mapping).to_list()
+            table = table.append_column(partitioned_by_date.value, [partition_date_value])
+        return cls.encode_dictionary(table)
+
+    @classmethod
+    @utils.timing
+    def save_dataset(cls, df, file_path, sign="all", append=False, partitioned_by_date=None):
+        """
+        :param df:
+        :param file_path:
+        :param sign: 标识
+        :param append: 是否追加写入（增量模式，只新增文件不改动已有分区数据）
+        :param partitioned_by_date: 日期分区，None时取已有数据的分区（get_write_partitioned_by_date）
+        :return:
+        """
         t1 = time.time()
         if df.empty:
             logger.warning('df为空')
             return
 
-        if cls.partitioned_by_date == PartitionByDateType.month:
-            date_list = df[Dimension.TRADE_DATE].sort_values(ascending=True).unique().tolist()
-            beg = month_beg(str_to_date(date_list[0]))
-            end = month_end(str_to_date(date_list[-1]))
-            try:
-                # 文件是不存在的  get_data 时间筛选会报错,所以加上异常捕获
-                df_existing = cls.get_data(start_date=beg, end_date=end)
-            except Exception as e:
-                df_existing = None
+        # 分割字段
+        if partitioned_by_date is None:
+            partitioned_by_date = cls.get_write_partitioned_by_date()
+        partition_columns = cls.get_write_partition_columns(partitioned_by_date)
+        with metrics.stage('arrow', cls.__name__) as record:
+            table = cls.to_arrow_table(df, partitioned_by_date)
+            record.rows, record.bytes = table.num_rows, table.nbytes
+        del df
 
-            if df_existing is not None and not df_existing.empty:
-                df_existing = df_existing[~df_existing[Dimension.TRADE_DATE].isin(df[Dimension.TRADE_DATE].unique())]
-                df = pd.concat([df, df_existing])
-                df = df.sort_values(Dimension.TRADE_DATE, ascending=False).reset_index(drop=True)
+        # 按月分割：与已有分区文件按(trade_date, CODE_COLUMN)合并，只重写受影响的文件
+        # 分桶：与桶内已有文件合并，本次写入的证券整体替换（与原先每个证券一个目录时的覆盖行为一致）
+        with metrics.stage('write', cls.__name__) as record:
+            cls.check_bucket_count()
+            retired_files = []
+            merged = partitioned_by_date == PartitionByDateType.month or bool(cls.bucket_count)
+            if partitioned_by_date == PartitionByDateType.month and not append:
+                table, retired_files = cls.merge_existing_partitions(table, file_path, partition_columns)
+            elif cls.bucket_count and not append:
+                table, retired_files = cls.merge_existing_partitions(
+                    table, file_path, partition_columns or cls.get_partition_columns(), keys=[cls.bucket_by])
+            table = cls.sort_table(table)
 
-        # 分割字段
-        partition_columns = None
-        # todo 去除索引
-        partition_date_value = None
-        # 按日期分割
-        if cls.partitioned_by_date:
-            partition_columns = cls.get_partition_columns()
-            if cls.partitioned_by_date.value not in PartitionByDateType.__members__:
-                raise QtException(QtError.E_SUCCESS, msg='暂不支持的参数',
-                                  partitioned_by_date=cls.partitioned_by_date)
-            if cls.partitioned_by_date == PartitionByDateType.day:
-                partition_columns.append(pa.field(Dimension.TRADE_DATE, pa.string()))
+            part = cls.get_partitioning(partition_columns=partition_columns)
+            # 文件名唯一：不会与compact登记的tombstone（按文件名记录）重名而被读取排除、被vacuum删除
+            write_kwargs = dict(existing_data_behavior='delete_matching')
+            if append or merged:
+                # 未受影响的分区文件保持不变
+                write_kwargs = dict(existing_data_behavior='overwrite_or_ignore')
+            ds.write_dataset(table, file_path, format='parquet',
+                             max_rows_per_file=cls.partition_max_rows_per_file,
+                             partitioning=part, file_visitor=metrics.file_visitor(record),
+                             basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                             **cls.get_row_group_kwargs(), **write_kwargs)
+            if retired_files:
+                # 被合并重写的旧文件与compact一样登记为tombstone，持有旧文件列表的读取方仍可读完，由vacuum删除
+                cls.update_file_state(tombstones_add=[cls.relative_path(f) for f in retired_files], bump=True,
+                                      **cls.get_layout_state(partitioned_by_date))
             else:
-                partition_date_value = df[Dimension.TRADE_DATE].apply(
-                    deal_date, args=(cls.partitioned_by_date,)).to_list()
-                partition_columns.append(pa.field(cls.partitioned_by_date.value, pa.string()))
-                # if not schema:
-                #     schema = []
-                # schema = schema.append(pa.field(cls.partitioned_by_date.value, pa.string()))
-
-        # 支持某列为空
-        table = pa.Table.from_pandas(df, schema=schema)
-        if partition_date_value is not None:
-            table = table.append_column(cls.partitioned_by_date.value, [partition_date_value])
-
-        part = cls.get_partitioning(partition_columns=partition_columns)
-        ds.write_dataset(table, file_path, format='parquet',
-                         max_rows_per_file=cls.partition_max_rows_per_file,
-                         max_rows_per_group=cls.partition_max_rows_per_group,
-                         existing_data_behavior='delete_matching',
-                         partitioning=part)
-        del df
+                cls.bump_generation(**cls.get_layout_state(partitioned_by_date))
+            record.rows = table.num_rows
+        del table
         gc.collect()
         logger.info(
             "save model:{} sign:{}  ETL data  used time {} output folder:{}",
             cls.__name__, sign, time.time() - t1, file_path)
 
+    @classmethod
+    def get_upsert_keys(cls) -> list:
+        """
+        合并写入的主键：trade_date + CODE_COLUMN（未定义CODE_COLUMN时按trade_date整日替换）
+        分桶时加上bucket_by：一个桶内有多个证券，只替换本次写入的证券
+        """
+        keys = [Dimension.TRADE_DATE]
+        if cls.CODE_COLUMN:
+            keys.append(cls.CODE_COLUMN)
+        if cls.bucket_count and cls.bucket_by not in keys:
+            keys.append(cls.bucket_by)
+        return keys
+
+    @classmethod
+    def get_upsert_key_array(cls, table: pa.Table, keys: Optional[list] = None):
+        """主键拼接为字符串列，用于is_in比较"""
+        keys = [pc.cast(table[k], pa.string()) for k in keys or cls.get_upsert_keys()]
+        if len(keys) == 1:
+            return keys[0]
+        return pc.binary_join_element_wise(*keys, '\x1f')
+
+    @staticmethod
+    def get_partition_dirs(table: pa.Table, partition_columns: list) -> list:
+        """table涉及到的hive分区目录（相对路径）"""
+        if not partition_columns:
+            return ['']
+        names = [f.name for f in partition_columns]
+        paths = pc.binary_join_element_wise(
+            *[pc.cast(table[name], pa.string()) for name in names], '\x1f')
+        part_dirs = []
+        for value in pc.unique(paths).to_pylist():
+            segments = [f'{name}={quote(v, safe="")}' for name, v in zip(names, value.split('\x1f'))]
+            part_dirs.append(os.path.join(*segments))
+        return part_dirs
+
+    @staticmethod
+    def file_overlaps_dates(file_name: str, min_date: str, max_date: str) -> bool:
+        """根据parquet row group统计信息判断文件是否包含[min_date, max_date]内的trade_date"""
+        metadata = pq.ParquetFile(file_name).metadata
+        names = metadata.schema.names
+        if Dimension.TRADE_DATE not in names:
+            return True
+        col_index = names.index(Dimension.TRADE_DATE)
+        for i in range(metadata.num_row_groups):
+            statistics = metadata.row_group(i).column(col_index).statistics
+            if statistics is None or not statistics.has_min_max:
+                return True
+            if statistics.min <= max_date and statistics.max >= min_date:
+                return True
+        return False
+
+    @classmethod
+    def merge_existing_partitions(cls, table: pa.Table, file_path: str, partition_columns: list,
+                                  keys: Optional[list] = None):
+        """
+        新数据与已有分区文件合并（upsert）
+        只读取trade_date范围有交集的文件，剔除主键相同的旧数据后和新数据一起重写
+        :param keys: 主键字段，默认get_upsert_keys()；指定时（分桶按证券替换）读取分区内全部文件
+        :return: (合并后的table, 需要删除的旧文件)
+        """
+        new_keys = pc.unique(cls.get_upsert_key_array(table, keys))
+        min_max = pc.min_max(table[Dimension.TRADE_DATE]).as_py()
+        min_date, max_date = min_max['min'], min_max['max']
+        excluded = cls.get_excluded_files()
+        tables, retired_files = [table], []
+        for part_dir in cls.get_partition_dirs(table, partition_columns):
+            dir_path = os.path.join(file_path, part_dir)
+            if not os.path.isdir(dir_path):
+                continue
+            # 分区目录上的分区字段值，文件中不存储
+            part_values = dict(
+                segment.split('=', 1) for segment in part_dir.split(os.path.sep) if '=' in segment)
+            for file_name in sorted(os.listdir(dir_path)):
+                file_name = os.path.join(dir_path, file_name)
+                if not file_name.endswith('.parquet') or os.path.basename(file_name).startswith(('.', '_')):
+                    continue
+                if cls.relative_path(file_name) in excluded:
+                    continue
+                if not keys and not cls.file_overlaps_dates(file_name, min_date, max_date):
+                    continue
+                existing = pq.read_table(file_name)
+                for field in table.schema:
+                    if field.name not in existing.column_names:
+                        value = unquote(part_values[field.name]) if field.name in part_values else None
+                        existing = existing.append_column(
+                            field.name, pa.array([value] * existing.num_rows, pa.string()).cast(field.type))
+                existing = cls.encode_dictionary(existing.select(table.column_names)).cast(table.schema)
+                mask = pc.is_in(cls.get_upsert_key_array(existing, keys), value_set=new_keys)
+                tables.append(existing.filter(pc.invert(mask)))
+                retired_files.append(file_name)
+        if len(tables) > 1:
+            table = pa.concat_tables(tables)
+            if not cls.get_sort_keys():
+                table = table.sort_by([(Dimension.TRADE_DATE, 'descending')])
+        return table, retired_files
+
     @classmethod
     @utils.timing
+    @metrics.track_run
     def run_etl(cls, secu_codes: Optional[list[str]] = None,
                 start_date: Optional[Union[datetime, date]] = date(2021, 1, 1),
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False, **kws):
+                is_init=False,
+                is_incremental=False,
+                is_stream=False,
+                executor: Optional[Union[str, ExecutorType]] = None,
+                is_full_universe: Optional[bool] = None, **kws):
         """
          run etl
         :param secu_codes:
         :param start_date:
         :param end_date:
-        :param is_concurrent_query: 是否并发执行（sql 按月分割）
+        :param is_concurrent_query: 是否并发执行（sql 按探测/历史行数切分，不能估计行数时按月分割）
         :param is_concurrent_save: 是否并发save(把并发执行的sql,查询一次save一次)
         :param is_init: 是否初始化（如果初始化删除原来的etl）
+        :param is_incremental: 是否增量（只拉取、追加水位线之后的数据）
+        :param is_stream: 是否流式（分块拉取后逐块写入，内存只保留一个分块）
+        :param executor: 并发查询的执行器 thread|process|serial，默认asyncio；
+            fetch_data中转换计算较重(持有GIL)的模型使用process
+        :param is_full_universe: 是否拉取模型的全部证券（决定是否推进水位线），None时按secu_codes是否为空判断；
+            run_etl中注入默认证券范围的模型传True；增量时证券列表中水位线未覆盖的证券从start_date补齐到水位线
         :param kws: 扩展参数
         :return:
         """
-        t1 = time.time()
-        dfs = []
-
         # 先查db是否存在event，不存在则注册
         if settings.ENABLED_EVENT:
             event_record = EventRecord(
@@ -206,21 +676,95 @@ class EntityBase:
             file_path = cls.get_etl_dir()
             if is_init:
                 shutil.rmtree(file_path, ignore_errors=True)  # 删除原来的文件
+                cls.reset_etl_state('watermark', 'watermark_codes', 'bucket_count', 'partitioned_by_date',
+                                    'pending_files', 'tombstones')
+                cls.bump_generation()
+            else:
+                # 旧的按证券分区目录先迁移为分桶目录
+                cls.migrate_partitions()
+                # 删除超过保留时间的tombstone文件（合并写入、compact替换的旧文件）
+                cls.vacuum()
 
             # 如果etl文件目录不存在则创建
             if not os.path.exists(file_path):
                 os.makedirs(file_path)
 
-            # 2.并发查询
+            # 增量：开始日期推进到水位线之后
+            watermark = backfill_codes = None
+            if is_incremental and not is_init:
+                if cls.support_incremental():
+                    watermark = cls.get_watermark()
+                else:
+                    logger.warning(f'{cls.__name__} 不支持增量，按全量窗口执行')
+            if watermark:
+                # 证券范围中水位线未覆盖的证券（如按持仓填充时新进入持仓的证券），先补齐水位线及之前的数据
+                backfill_codes = cls.get_backfill_codes(secu_codes, is_full_universe)
+                backfill_start_date = start_date
+                inc_start_date = as_date(watermark) + timedelta(days=1)
+                if not start_date or as_date(start_date) < inc_start_date:
+                    start_date = inc_start_date
+                logger.info(f'{cls.__name__} 增量执行，watermark:{watermark} start_date:{start_date}')
+
+            # 只拉取部分证券、或窗口与水位线之间有空档时不推进水位线
+            is_advance_watermark = cls.can_advance_watermark(secu_codes, start_date, is_full_universe)
+
+            # 2.查询、保存
+            if backfill_codes and (not backfill_start_date or as_date(backfill_start_date) <= as_date(watermark)):
+                logger.info(f'{cls.__name__} 补齐水位线之前的数据，secu_codes:{backfill_codes}')
+                cls.fetch_and_save(backfill_codes, backfill_start_date, as_date(watermark), file_path,
+                                   executor=executor, is_advance_watermark=False)
+            if watermark and as_date(start_date) > as_date(end_date):
+                # 水位线之后没有需要拉取的数据
+                rows = 0
+            elif is_stream:
+                rows = cls.stream_and_save(secu_codes, start_date, end_date, file_path,
+                                           watermark=watermark, is_init=is_init,
+                                           is_advance_watermark=is_advance_watermark)
+            else:
+                rows = cls.fetch_and_save(secu_codes, start_date, end_date, file_path, watermark=watermark,
+                                          executor=executor, is_advance_watermark=is_advance_watermark)
+            if is_advance_watermark and secu_codes:
+                cls.record_watermark_codes(secu_codes)
+            logger.info(f'Run ETL model:{cls.__name__} success, len:{rows}')
+
+        except Exception as err:
+            if settings.ENABLED_EVENT:
+                EventHandler.update(
+                    event_record, replace_dict=dict(
+                        event_status=str(EventStatus.FAILED), business_date=end_date,
+                        event_msg=f"Run etl error: f{str(err)}"))
+            raise
+        else:
+            if settings.ENABLED_EVENT:
+                EventHandler.update(
+                    event_record, replace_dict=dict(
+                        event_status=str(EventStatus.COMP), business_date=end_date, event_msg="OK"))
+            return rows
+
+    @classmethod
+    def fetch_and_save(cls, secu_codes, start_date, end_date, file_path, watermark=None, executor=None,
+                       is_advance_watermark=True) -> int:
+        """
+        拉取全部数据后保存
+        :param executor: 并发查询的执行器 thread|process|serial，None时使用asyncio
+        :param is_advance_watermark: 保存后是否按写入的数据推进水位线
+        :return: 保存的行数
+        """
+        t1 = time.time()
+        with metrics.stage('fetch', cls.__name__) as record:
+            dfs = []
+            # 并发查询
             if cls.is_concurrent_query:
-                cls.partitioned_by_date = cls.partitioned_by_date or PartitionByDateType.month
                 fetch_data_fns = [
                     functools.partial(
-                        cls.fetch_data, secu_codes, start_date=s_date, end_date=e_date)
-                    for s_date, e_date in cls.get_partition_dates(start_date=start_date, end_date=end_date)
+                        cls.fetch_data, unit_codes, start_date=s_date, end_date=e_date)
+                    for unit_codes, s_date, e_date, _ in cls.plan_work_units(secu_codes, start_date, end_date)
                 ]
                 try:
-                    dfs = asyncio.run(async_helper.patch_async_run(fetch_data_fns))
+                    if executor:
+                        dfs = map_frames(fetch_data_fns, executor)
+                    else:
+                        dfs = asyncio.run(async_helper.patch_async_run(fetch_data_fns))
                 except Exception as e:
                     raise QtException(msg=f"ETL并发查询异常：{e}")
                 if dfs:
@@ -229,40 +773,603 @@ class EntityBase:
                     df = pd.concat(dfs, ignore_index=True)
                 else:
                     df = pd.DataFrame()
+                cls.record_row_history(df)
             else:
                 df = cls.fetch_data(secu_codes, start_date, end_date)
-            logger.info(
-                "Running {} ETL fetch_data total used time {}s, df len:{}",
-                cls.__name__, time.time() - t1, len(df))
+            if watermark:
+                # fetch_data未按日期过滤的模型，这里再过滤一次
+                df = cls.filter_after_watermark(df, watermark)
+            record.rows = len(df)
+        logger.info(
+            "Running {} ETL fetch_data total used time {}s, df len:{}",
+            cls.__name__, time.time() - t1, len(df))
 
-            # 3.并发保存
-            if cls.is_concurrent_save and not df.empty:
-                try:
-                    asyncio.run(async_helper.patch_async_run(
-                        [functools.partial(cls.save_dataset, df=df, file_path=file_path) for df in dfs]
-                    ))
-                except Exception as e:
-                    raise QtException(msg=f"ETL并发保存异常：{e}")
+        # 并发查询没有日期分区时按月分区（已有数据时沿用已有数据的分区）
+        partitioned_by_date = cls.get_write_partitioned_by_date(
+            default=PartitionByDateType.month if cls.is_concurrent_query else None)
+        # 并发保存
+        append = bool(watermark)
+        if cls.is_concurrent_save and not df.empty:
+            # 工作单元可能跨越或拆分日期分区，按日期分区重新分组，避免多个任务同时写同一分区
+            dfs = cls.split_by_date_partition(df, partitioned_by_date)
+            try:
+                asyncio.run(async_helper.patch_async_run(
+                    [functools.partial(cls.save_dataset, df=_df, file_path=file_path, append=append,
+                                       partitioned_by_date=partitioned_by_date)
+                     for _df in dfs if len(_df)]
+                ))
+            except Exception as e:
+                raise QtException(msg=f"ETL并发保存异常：{e}")
+            if is_advance_watermark:
+                cls.advance_watermark(df)
+        else:
+            try:
+                cls.save_dataset(df, file_path, append=append, partitioned_by_date=partitioned_by_date)
+            except Exception as e:
+                logger.error(f'save {cls.__name__} model error: {e}')
             else:
-                try:
-                    cls.save_dataset(df, file_path)
-                except Exception as e:
-                    logger.error(f'save {cls.__name__} model error: {e}')
-            logger.info(f'Run ETL model:{cls.__name__} success, len:{len(df)}')
+                if is_advance_watermark:
+                    cls.advance_watermark(df)
+        return len(df)
 
-        except Exception as err:
-            if settings.ENABLED_EVENT:
-                EventHandler.update(
-                    event_record, replace_dict=dict(
-                        event_status=str(EventStatus.FAILED), business_date=end_date,
-                        event_msg=f"Run etl error: f{str(err)}"))
-            raise
+    @classmethod
+    def fetch_batches(cls, secu_codes=None,
+                      start_date: Optional[Union[datetime, date]] = None,
+                      end_date: Optional[Union[datetime, date]] = None):
+        """
+        分块拉取数据，默认按月分割调用fetch_data
+        子类可重写为按游标分块返回df
+        """
+        for s_date, e_date in cls.get_partition_dates(start_date=start_date, end_date=end_date):
+            yield cls.fetch_data(secu_codes, start_date=s_date, end_date=e_date)
+
+    @classmethod
+    def stream_and_save(cls, secu_codes, start_date, end_date, file_path, watermark=None, is_init=False,
+                        is_advance_watermark=True) -> int:
+        """
+        流式etl：fetch_batches分块拉取，每块转换为RecordBatch后写入
+        初始化、增量时一个writer写入所有分块；否则每块按分区合并写入
+        :param is_advance_watermark: 写入后是否按写入的数据推进水位线
+        :return: 保存的行数
+        """
+        if cls.schema is None:
+            raise QtException(msg=f'{cls.__name__} 未定义schema，不支持流式etl')
+        t1 = time.time()
+        # 没有日期分区时按月分区（已有数据时沿用已有数据的分区）
+        partitioned_by_date = cls.get_write_partitioned_by_date(default=PartitionByDateType.month)
+        if not (is_init or watermark or partitioned_by_date):
+            # 逐块按分区合并写入，没有日期分区时后写入的块会覆盖之前的块
+            raise QtException(msg=f'{cls.__name__} 已有数据未按日期分区，不支持流式合并写入，请使用is_init重新生成')
+        stats = {'rows': 0, 'max_date': None}
+
+        def iter_chunks():
+            for df in cls.fetch_batches(secu_codes, start_date, end_date):
+                if watermark:
+                    df = cls.filter_after_watermark(df, watermark)
+                if df is None or df.empty:
+                    continue
+                stats['rows'] += len(df)
+                max_date = df[Dimension.TRADE_DATE].dropna().max()
+                if isinstance(max_date, str) and (not stats['max_date'] or max_date > stats['max_date']):
+                    stats['max_date'] = max_date
+                yield df
+
+        if is_init or watermark:
+            cls.check_bucket_count()
+            write_schema = cls.get_write_schema(partitioned_by_date)
+            batches = (batch for df in iter_chunks()
+                       for batch in cls.sort_table(cls.to_arrow_table(df, partitioned_by_date))
+                       .cast(write_schema).to_batches())
+            # 拉取、转换、写入交替进行，整体记为write
+            with metrics.stage('write', cls.__name__, stream=True) as record:
+                ds.write_dataset(batches, file_path, schema=write_schema, format='parquet',
+                                 max_rows_per_file=cls.partition_max_rows_per_file,
+                                 **cls.get_row_group_kwargs(),
+                                 partitioning=cls.get_partitioning(
+                                     partition_columns=cls.get_write_partition_columns(partitioned_by_date)),
+                                 existing_data_behavior='overwrite_or_ignore',
+                                 basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                                 file_visitor=metrics.file_visitor(record))
+                record.rows = stats['rows']
+            cls.bump_generation(**cls.get_layout_state(partitioned_by_date))
         else:
-            if settings.ENABLED_EVENT:
-                EventHandler.update(
-                    event_record, replace_dict=dict(
-                        event_status=str(EventStatus.COMP), business_date=end_date, event_msg="OK"))
-            return len(df)
+            for df in iter_chunks():
+                cls.save_dataset(df, file_path, partitioned_by_date=partitioned_by_date)
+        if stats['max_date'] and is_advance_watermark:
+            cls.update_watermark(stats['max_date'])
+        logger.info(
+            "Running {} ETL stream total used time {}s, rows:{}",
+            cls.__name__, time.time() - t1, stats['rows'])
+        return stats['rows']
+
+    # --- etl state / watermark ---
+    @classmethod
+    def get_etl_state_path(cls):
+        """etl状态文件路径（与etl目录同级，is_init删除目录时不受影响）"""
+        return cls.get_etl_dir() + cls.ETL_STATE_SUFFIX
+
+    @classmethod
+    def load_etl_state(cls) -> dict:
+        state_path = cls.get_etl_state_path()
+        if not os.path.exists(state_path):
+            return {}
+        try:
+            with open(state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'读取{cls.__name__} etl状态文件异常：{e}')
+            return {}
+
+    @classmethod
+    def update_etl_state(cls, **values) -> dict:
+        """更新etl状态，先写临时文件再替换，保证读到的文件是完整的"""
+        state_path = cls.get_etl_state_path()
+        with _etl_state_lock:
+            state = cls.load_etl_state()
+            state.update(values)
+            os.makedirs(os.path.dirname(state_path), exist_ok=True)
+            tmp_path = f'{state_path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, state_path)
+        return state
+
+    @classmethod
+    def reset_etl_state(cls, *keys):
+        """清除etl状态，不传keys时清除水位线"""
+        keys = keys or ('watermark',)
+        with _etl_state_lock:
+            state = cls.load_etl_state()
+            if any(k in state for k in keys):
+                cls.update_etl_state(**{k: None for k in keys})
+
+    @classmethod
+    def get_generation(cls) -> int:
+        """etl数据版本号，每次写入后递增，用于使dataset缓存失效"""
+        return cls.load_etl_state().get('generation') or 0
+
+    @classmethod
+    def bump_generation(cls, **values) -> int:
+        """
+        :param values: 同时更新的其他状态
+        """
+        with _etl_state_lock:
+            generation = cls.get_generation() + 1
+            cls.update_etl_state(generation=generation, **values)
+        return generation
+
+    @classmethod
+    def get_layout_state(cls, partitioned_by_date=None) -> dict:
+        """
+        写入后记录到etl状态的目录结构信息（分桶数、日期分区）
+        :param partitioned_by_date: 本次写入的日期分区，None时不记录
+        """
+        state = {'bucket_count': cls.bucket_count} if cls.bucket_count else {}
+        if partitioned_by_date is not None:
+            # 没有日期分区记录为空字符串（None表示未记录）
+            state['partitioned_by_date'] = partitioned_by_date.value if partitioned_by_date else ''
+        return state
+
+    @classmethod
+    def get_partitioned_by_date(cls, state: Optional[dict] = None):
+        """
+        已写入数据的日期分区（读取时按此解析目录），etl状态中未记录时取partitioned_by_date
+        :return: PartitionByDateType，没有日期分区时返回False
+        """
+        state = cls.load_etl_state() if state is None else state
+        value = state.get('partitioned_by_date')
+        if value is None:
+            return cls.partitioned_by_date or False
+        return PartitionByDateType(value) if value else False
+
+    @classmethod
+    def detect_partitioned_by_date(cls):
+        """
+        按已有文件所在目录判断日期分区（etl状态中未记录日期分区的旧数据）
+        :return: (是否已有文件, 日期分区)，没有日期分区目录时日期分区为False
+        """
+        file_path = cls.get_etl_dir()
+        for root, dir_names, file_names in os.walk(file_path):
+            dir_names[:] = sorted(d for d in dir_names if not d.startswith(('.', '_')))
+            if not any(f.endswith('.parquet') and not f.startswith(('.', '_')) for f in file_names):
+                continue
+            names = {segment.split('=', 1)[0] for segment in os.path.relpath(root, file_path).split(os.path.sep)}
+            for partition_type in PartitionByDateType:
+                field = Dimension.TRADE_DATE if partition_type == PartitionByDateType.day else partition_type.value
+                if field in names:
+                    return True, partition_type
+            return True, False
+        return False, False
+
+    @classmethod
+    def get_write_partitioned_by_date(cls, default: Optional[PartitionByDateType] = None):
+        """
+        本次写入的日期分区：已有数据时沿用已有数据的分区（同一目录下不混用两种目录结构），
+        没有数据时取partitioned_by_date，未定义时取default（流式、并发查询按月分区）
+        :return: PartitionByDateType，没有日期分区时返回False
+        """
+        state = cls.load_etl_state()
+        if state.get('partitioned_by_date') is not None:
+            return cls.get_partitioned_by_date(state)
+        has_files, partitioned_by_date = cls.detect_partitioned_by_date()
+        if has_files:
+            return partitioned_by_date
+        return cls.partitioned_by_date or default or False
+
+    @classmethod
+    def get_bucket_count(cls) -> int:
+        """已写入数据的分桶数（读取时按此计算下推的桶），未记录时取bucket_count"""
+        if not cls.bucket_count:
+            return 0
+        return cls.load_etl_state().get('bucket_count') or cls.bucket_count
+
+    @classmethod
+    def check_bucket_count(cls):
+        """分桶数变化后已有数据的桶编号失效，需要重新生成"""
+        if cls.bucket_count and cls.get_bucket_count() != cls.bucket_count:
+            raise QtException(QtError.E_SUCCESS,
+                              msg=f'{cls.__name__} 分桶数由{cls.get_bucket_count()}改为{cls.bucket_count}，'
+                                  f'请使用is_init重新生成')
+
+    @classmethod
+    def get_legacy_partition_dirs(cls) -> dict:
+        """按分桶字段分区的旧目录（{bucket_by}=值），{桶编号: [(值, 目录)]}"""
+        file_path = cls.get_etl_dir()
+        res = defaultdict(list)
+        if not cls.bucket_count or not os.path.isdir(file_path):
+            return res
+        prefix = f'{cls.bucket_by}='
+        for name in sorted(os.listdir(file_path)):
+            dir_path = os.path.join(file_path, name)
+            if name.startswith(prefix) and os.path.isdir(dir_path):
+                value = unquote(name[len(prefix):])
+                res[bucket_of(value, cls.bucket_count)].append((value, dir_path))
+        return res
+
+    @classmethod
+    def migrate_partitions(cls) -> int:
+        """
+        旧目录结构（每个证券一个{bucket_by}=值目录）迁移为分桶目录
+        按桶读取旧文件写入临时目录，全部完成后替换etl目录，迁移中断时原目录不受影响
+        :return: 迁移的行数，无需迁移时返回0
+        """
+        legacy_dirs = cls.get_legacy_partition_dirs()
+        if not legacy_dirs:
+            return 0
+        t1 = time.time()
+        file_path = cls.get_etl_dir()
+        tmp_path = f'{file_path}.migrate-{uuid.uuid4().hex}'
+        partitioned_by_date = cls.get_write_partitioned_by_date()
+        rows = 0
+        try:
+            for bucket in sorted(legacy_dirs):
+                dfs = []
+                for value, dir_path in legacy_dirs[bucket]:
+                    for root, _, file_names in os.walk(dir_path):
+                        for file_name in sorted(file_names):
+                            if not file_name.endswith('.parquet') or file_name.startswith(('.', '_')):
+                                continue
+                            df = cls.decode_dictionary(pq.read_table(os.path.join(root, file_name))).to_pandas()
+                            # 分区字段存储在目录上
+                            df[cls.bucket_by] = value
+                            dfs.append(df)
+                if dfs:
+                    df = pd.concat(dfs, ignore_index=True)
+                    rows += len(df)
+                    cls.save_dataset(df, tmp_path, sign=f'migrate bucket={bucket}', append=True,
+                                     partitioned_by_date=partitioned_by_date)
+            # 已是分桶结构的文件（迁移前写入的）一起移入
+            for name in os.listdir(file_path):
+                if name.startswith(f'{cls.BUCKET_FIELD}='):
+                    src_dir = os.path.join(file_path, name)
+                    for root, _, file_names in os.walk(src_dir):
+                        for file_name in file_names:
+                            src = os.path.join(root, file_name)
+                            os.renames(src, os.path.join(tmp_path, os.path.relpath(src, file_path)))
+            backup_path = f'{tmp_path}.bak'
+            os.rename(file_path, backup_path)
+            os.rename(tmp_path, file_path)
+            shutil.rmtree(backup_path, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        cls.bump_generation(**cls.get_layout_state(partitioned_by_date))
+        cls.invalidate_dataset_cache()
+        logger.info(f'{cls.__name__} 迁移为分桶目录（{cls.bucket_count}个桶），rows:{rows} used time:{time.time() - t1}')
+        return rows
+
+    # --- compaction ---
+    @classmethod
+    def relative_path(cls, path: str) -> str:
+        """文件相对etl目录的路径（etl状态中记录的文件名）"""
+        return os.path.relpath(path, cls.get_etl_dir()).replace(os.path.sep, '/')
+
+    @classmethod
+    def get_excluded_files(cls, state: Optional[dict] = None) -> set:
+        """
+        读取时需要排除的文件：compact写入中的新文件（pending_files）和已被替换的旧文件（tombstones）
+        新旧文件的切换是一次状态文件替换，读取方看到的要么全是旧文件，要么全是新文件
+        """
+        state = cls.load_etl_state() if state is None else state
+        return set(state.get('pending_files') or {}) | set(state.get('tombstones') or {})
+
+    @classmethod
+    def get_partition_files(cls) -> dict:
+        """各分区目录下的parquet文件（不含被排除的文件） {目录: [(文件, 字节数)]}"""
+        file_path = cls.get_etl_dir()
+        excluded = cls.get_excluded_files()
+        res = {}
+        for root, dir_names, file_names in os.walk(file_path):
+            dir_names[:] = sorted(d for d in dir_names if not d.startswith(('.', '_')))
+            files = [os.path.join(root, f) for f in sorted(file_names)
+                     if f.endswith('.parquet') and not f.startswith(('.', '_'))]
+            files = [(f, os.path.getsize(f)) for f in files if cls.relative_path(f) not in excluded]
+            if files:
+                res[root] = files
+        return res
+
+    @classmethod
+    def get_compact_groups(cls, files: list, target_bytes: int) -> list:
+        """
+        同一分区内小于目标大小的文件按顺序累积到目标大小为一组
+        单个文件的row group过小（平均行数不足目标的1/4）时也单独重写
+        """
+        rows_per_group = cls.get_row_group_kwargs()['max_rows_per_group']
+        groups, group, group_bytes = [], [], 0
+        for file_name, size in files:
+            if size >= target_bytes:
+                continue
+            group.append(file_name)
+            group_bytes += size
+            if group_bytes >= target_bytes:
+                groups.append(group)
+                group, group_bytes = [], 0
+        if group:
+            groups.append(group)
+        res = []
+        for group in groups:
+            if len(group) == 1:
+                metadata = pq.ParquetFile(group[0]).metadata
+                if metadata.num_row_groups <= 1 or \
+                        metadata.num_rows / metadata.num_row_groups >= rows_per_group / 4:
+                    continue
+            res.append(group)
+        return res
+
+    @classmethod
+    def read_compact_group(cls, files: list) -> pa.Table:
+        """读取一组文件合并为一个table（统一为当前schema类型，按排序字段重排）"""
+        tables = [cls.decode_dictionary(pq.read_table(file_name)) for file_name in files]
+        present = set().union(*(t.column_names for t in tables))
+        # 分区字段存储在目录上，不在文件中
+        schema = pa.schema([field for field in cls.schema.remove_metadata() if field.name in present])
+        conformed = []
+        for t in tables:
+            for field in schema:
+                if field.name not in t.column_names:
+                    t = t.append_column(field.name, pa.nulls(t.num_rows, field.type))
+            conformed.append(t.select(schema.names).cast(schema))
+        table = cls.sort_table(pa.concat_tables(conformed))
+        return cls.encode_dictionary(table)
+
+    @classmethod
+    def update_file_state(cls, pending_add=(), pending_remove=(), tombstones_add=(), tombstones_remove=(),
+                          bump=False, **values) -> dict:
+        """
+        更新pending_files/tombstones（{相对路径: 时间戳}），bump时同时递增generation
+        :param values: 同时更新的其他状态
+        """
+        now = time.time()
+        with _etl_state_lock:
+            state = cls.load_etl_state()
+            pending = state.get('pending_files') or {}
+            tombstones = state.get('tombstones') or {}
+            pending.update({name: now for name in pending_add})
+            tombstones.update({name: now for name in tombstones_add})
+            for name in pending_remove:
+                pending.pop(name, None)
+            for name in tombstones_remove:
+                tombstones.pop(name, None)
+            values.update(pending_files=pending, tombstones=tombstones)
+            if bump:
+                values['generation'] = (state.get('generation') or 0) + 1
+            return cls.update_etl_state(**values)
+
+    @classmethod
+    def compact(cls, target_bytes: Optional[int] = None) -> dict:
+        """
+        合并分区内的小文件（按排序字段重排），不影响同时进行的读取（不能与同一模型的etl写入同时运行）
+        1.新文件登记为pending后写入（读取时排除）
+        2.一次状态更新：新文件移出pending、旧文件登记为tombstone（读取时排除）、generation+1
+        3.旧文件保留compact_vacuum_grace秒后由vacuum删除，持有旧文件列表的读取方仍可读完
+        :param target_bytes: 目标文件大小，默认settings.compact_target_bytes
+        :return: 统计
+        """
+        t1 = time.time()
+        target_bytes = target_bytes or settings.compact_target_bytes
+        rows_per_group = cls.get_row_group_kwargs()['max_rows_per_group']
+        partition_files = cls.get_partition_files()
+        groups = [(dir_path, group) for dir_path, files in partition_files.items()
+                  for group in cls.get_compact_groups(files, target_bytes)]
+        new_files = [os.path.join(dir_path, f'part-{uuid.uuid4().hex}-compact.parquet') for dir_path, _ in groups]
+        retired_files = [file_name for _, group in groups for file_name in group]
+        res = {'files_before': sum(len(files) for files in partition_files.values()),
+               'compacted_files': len(retired_files), 'new_files': len(new_files)}
+        if groups:
+            cls.update_file_state(pending_add=[cls.relative_path(f) for f in new_files])
+            try:
+                for (dir_path, group), new_file in zip(groups, new_files):
+                    table = cls.read_compact_group(group)
+                    # 先写隐藏文件，完整写入后再改名
+                    tmp_file = os.path.join(dir_path, f'.{os.path.basename(new_file)}.tmp')
+                    pq.write_table(table, tmp_file, row_group_size=rows_per_group)
+                    os.replace(tmp_file, new_file)
+            except BaseException:
+                for new_file in new_files:
+                    if os.path.exists(new_file):
+                        os.remove(new_file)
+                cls.update_file_state(pending_remove=[cls.relative_path(f) for f in new_files])
+                raise
+            cls.update_file_state(pending_remove=[cls.relative_path(f) for f in new_files],
+                                  tombstones_add=[cls.relative_path(f) for f in retired_files], bump=True)
+        res['files_after'] = res['files_before'] - len(retired_files) + len(new_files)
+        res['seconds'] = time.time() - t1
+        logger.info(f'compact {cls.__name__}: {res}')
+        return res
+
+    @classmethod
+    def vacuum(cls, grace_seconds: Optional[int] = None) -> int:
+        """
+        删除超过保留时间的tombstone文件，清理compact中断遗留的pending文件
+        :param grace_seconds: 保留时间，默认settings.compact_vacuum_grace
+        :return: 删除的文件数
+        """
+        grace_seconds = settings.compact_vacuum_grace if grace_seconds is None else grace_seconds
+        deadline = time.time() - grace_seconds
+        state = cls.load_etl_state()
+        expired = {'tombstones': [], 'pending_files': []}
+        for key in expired:
+            expired[key] = [name for name, ts in (state.get(key) or {}).items() if ts <= deadline]
+        removed = 0
+        for name in expired['tombstones'] + expired['pending_files']:
+            path = os.path.join(cls.get_etl_dir(), *name.split('/'))
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        if removed or any(expired.values()):
+            cls.update_file_state(pending_remove=expired['pending_files'], tombstones_remove=expired['tombstones'])
+        return removed
+
+    @classmethod
+    def get_dataset(cls):
+        """
+        获取etl的dataset，同一进程内按etl目录缓存（省去目录扫描、parquet footer解析）
+        etl写入后generation变化，缓存自动失效
+        """
+        file_path = cls.get_etl_dir()
+        # 未生成etl时提示异常
+        if not os.path.exists(file_path):
+            raise QtException(
+                EtlError.E_NOT_EXIST, user_msg=(cls.__name__, cls.__doc__, file_path))
+
+        # generation、日期分区与排除的文件取自同一份状态
+        state = cls.load_etl_state()
+        key = (file_path, cls.get_partitioned_by_date(state))
+        generation = state.get('generation') or 0
+        with _dataset_cache_lock:
+            cached = _dataset_cache.get(key)
+        if cached and cached[0] == generation:
+            return cached[1]
+
+        # 字典编码字段直接按parquet字典页解码为dictionary（兼容按string存储的旧文件）
+        file_format = ds.ParquetFileFormat(
+            read_options=ds.ParquetReadOptions(dictionary_columns=cls.get_dictionary_columns()))
+        dataset = ds.dataset(file_path, schema=cls.get_read_schema(), format=file_format,
+                             partitioning=cls.get_partitioning(partition_columns=cls.get_read_partition_columns()))
+        excluded = cls.get_excluded_files(state)
+        if excluded:
+            # 剔除compact写入中、已被替换的文件
+            fragments = [fragment for fragment in dataset.get_fragments()
+                         if cls.relative_path(fragment.path) not in excluded]
+            dataset = ds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+        with _dataset_cache_lock:
+            _dataset_cache[key] = (generation, dataset)
+        return dataset
+
+    @classmethod
+    def invalidate_dataset_cache(cls):
+        with _dataset_cache_lock:
+            for key in [k for k in _dataset_cache if k[0] == cls.get_etl_dir()]:
+                _dataset_cache.pop(key, None)
+
+    @staticmethod
+    def load_fragment_metadata(dataset, filter_expr=None):
+        """解析并缓存本次扫描涉及文件的parquet footer，缓存的dataset再次扫描时不用重复解析"""
+        for fragment in dataset.get_fragments(filter=filter_expr):
+            if isinstance(fragment, ds.ParquetFileFragment):
+                fragment.ensure_complete_metadata()
+
+    @classmethod
+    def support_incremental(cls):
+        """
+        是否支持增量：需有trade_date字段，且按日期分区（追加写入时不会覆盖历史分区）
+        """
+        if cls.schema is None or Dimension.TRADE_DATE not in cls.schema.names:
+            return False
+        return bool(cls.get_partitioned_by_date() or cls.is_concurrent_query)
+
+    @classmethod
+    def get_watermark(cls) -> Optional[str]:
+        """已写入的最大trade_date"""
+        return cls.load_etl_state().get('watermark')
+
+    @classmethod
+    def advance_watermark(cls, df: pd.DataFrame):
+        """按本次写入的数据推进水位线"""
+        if cls.schema is None or Dimension.TRADE_DATE not in cls.schema.names:
+            return
+        if df is None or df.empty or Dimension.TRADE_DATE not in df.columns:
+            return
+        max_date = df[Dimension.TRADE_DATE].dropna().max()
+        if not isinstance(max_date, str):
+            return
+        cls.update_watermark(max_date)
+
+    @classmethod
+    def can_advance_watermark(cls, secu_codes, start_date: Optional[Union[datetime, date]],
+                              is_full_universe: Optional[bool] = None) -> bool:
+        """
+        本次运行后是否推进水位线：拉取全部证券，且窗口从已有水位线的下一天之前开始（初始化、增量运行都满足）
+        只拉取部分证券或窗口与水位线之间有空档时推进水位线，下次增量会跳过其余证券/空档内的数据
+        """
+        if is_full_universe is None:
+            is_full_universe = not secu_codes
+        if not is_full_universe:
+            return False
+        watermark = cls.get_watermark()
+        if not watermark or not start_date:
+            return True
+        return as_date(start_date) <= as_date(watermark) + timedelta(days=1)
+
+    @classmethod
+    def get_watermark_codes(cls) -> Optional[set]:
+        """水位线覆盖的证券（按证券列表运行全部证券时记录），未记录时返回None（fetch_data自行拉取全部证券）"""
+        codes = cls.load_etl_state().get('watermark_codes')
+        return None if codes is None else set(codes)
+
+    @classmethod
+    def record_watermark_codes(cls, secu_codes):
+        """推进水位线的运行结束后，记录本次运行的证券"""
+        with _etl_state_lock:
+            codes = (cls.get_watermark_codes() or set()) | set(cls.parse_secu_codes(secu_codes))
+            cls.update_etl_state(watermark_codes=sorted(codes))
+
+    @classmethod
+    def get_backfill_codes(cls, secu_codes, is_full_universe: Optional[bool] = None):
+        """
+        增量运行全部证券时，证券范围中不在水位线覆盖范围内的证券
+        证券范围由装饰器按当前持仓填充，新进入持仓的证券没有水位线之前的数据，需要从start_date补齐
+        :return: 与secu_codes形式相同的证券，不需要补齐时返回None
+        """
+        if not (secu_codes and is_full_universe):
+            return None
+        covered = cls.get_watermark_codes()
+        if covered is None:
+            return None
+        codes = [code for code in cls.parse_secu_codes(secu_codes) if code not in covered]
+        return cls.format_secu_codes(secu_codes, codes) if codes else None
+
+    @classmethod
+    def update_watermark(cls, max_date: str):
+        with _etl_state_lock:
+            watermark = cls.get_watermark()
+            if not watermark or max_date > watermark:
+                cls.update_etl_state(watermark=max_date, watermark_time=datetime.now())
+
+    @classmethod
+    def filter_after_watermark(cls, df: pd.DataFrame, watermark: str):
+        if df is None or df.empty or Dimension.TRADE_DATE not in df.columns:
+            return df
+        return df[df[Dimension.TRADE_DATE] > watermark]
 
     @classmethod
     def fetch_data(cls, secu_code: Optional[Union[str, List[str]]] = None,
@@ -272,9 +1379,10 @@ class EntityBase:
 
     @classmethod
     @utils.timing
-    def query(cls, sql, session="default", upper_columns=False, as_format=None):
+    def query(cls, sql, session="default", upper_columns=False, as_format=None, use_cache: Optional[bool] = None):
         """sql query
         INFO_开头的资讯表从demo环境获取，业务表走各自当前环境
+        :param use_cache: 是否使用查询结果缓存，默认settings.enabled_query_cache；缓存的是decoder处理之后的结果
         """
         tb_name = utils.get_tbname_from_sql(sql)
         if tb_name.upper().startswith("INFO_"):
@@ -282,11 +1390,27 @@ class EntityBase:
                 session = "info"
         if tb_name.upper().startswith("INDIC_"):
             cls.support_drill_down_cls.add(cls)
-        try:
-            df = db_manager.pd_read_sql(sql, session, decoder=as_format)
-        except Exception as e:
-            logger.error(f'query error:{traceback.format_exc()}')
-            raise QtException(error=QtError.E_CONNECT, msg=f'query error:{e}')
+        if use_cache is None:
+            use_cache = query_cache.is_enabled()
+
+        def read_sql(decoder=None):
+            # 按session限制并发，并发拆分的查询按模型公平排队
+            with db_governor.slot(session, cls.__name__):
+                return db_manager.pd_read_sql(sql, session, decoder=decoder)
+
+        with metrics.stage('query', cls.__name__, sql=metrics.sql_digest(sql), session=session) as record:
+            try:
+                if use_cache:
+                    # decoder与不使用缓存时一样交给pd_read_sql处理，按decoder区分缓存
+                    df = query_cache.get_or_query(sql, session, lambda: read_sql(as_format),
+                                                  tag=query_cache.decoder_tag(as_format))
+                else:
+                    df = read_sql(as_format)
+            except Exception as e:
+                logger.error(f'query error:{traceback.format_exc()}')
+                raise QtException(error=QtError.E_CONNECT, msg=f'query error:{e}')
+            record.rows = len(df)
+            record.bytes = df.memory_usage(index=False).sum()
         if upper_columns:
             df.columns = map(str.upper, df.columns)
         return df
@@ -338,79 +1462,118 @@ class EntityBase:
                 logger.info(f"Cond update down_flag params:{cond}")
 
     @classmethod
-    def get_data(cls, secu_codes: Optional[list[str]] = None,
-                 start_date: Optional[Union[date, datetime]] = None,
-                 end_date: Optional[Union[date, datetime]] = None,
-                 cond: Optional[dict[Dimension, Union[list, str]]] = None,
-                 columns: Optional[list] = None,
-                 decoder: Optional[Any] = None):
-        filters = []
+    def prepare_scan(cls, secu_codes: Optional[list[str]] = None,
+                     start_date: Optional[Union[date, datetime]] = None,
+                     end_date: Optional[Union[date, datetime]] = None,
+                     cond: Optional[dict[Dimension, Union[list, str]]] = None,
+                     columns: Optional[list] = None):
+        """
+        扫描参数处理
+        :return: (dataset, columns, filter_expr)
+        """
         cond = cond or {}
-        if start_date:
-            start_date = date_to_str(start_date)
-            filters.append(f"(ds.field(Dimension.TRADE_DATE) >= '{start_date}')")
-        if end_date:
-            end_date = date_to_str(end_date)
-            filters.append(f"(ds.field(Dimension.TRADE_DATE) <= '{end_date}')")
-
         if secu_codes:
             cond.update({Dimension.INSTRUMENT_CODE: secu_codes})
         # 下钻参数注入cond
         # cls.into_down_flag_para(  cond)
         # for trip in [None, '', {}, []]:
         #     utils.dict_trip(cond, trip)
-        if cond:
-            for d, l in cond.items():
-                if isinstance(l, list):
-                    filters.append(f"(ds.field('{d}').isin({l}))")
-                else:
-                    filters.append(f"(ds.field('{d}') == '{l}')")
-        if not filters:
-            filters = None
         if columns is not None:
+            columns = list(columns)
             if any([start_date, end_date]):
                 columns.append(Dimension.TRADE_DATE)
             if cond is not None:
                 columns = columns + list(cond.keys())
             columns = list(set(columns))
 
-        start_time = time.time()
-        file_path = cls.get_etl_dir()
-
-        # 未生成etl时提示异常
-        if not os.path.exists(file_path):
-            raise QtException(
-                EtlError.E_NOT_EXIST, user_msg=(cls.__name__, cls.__doc__, file_path))
-
-        dataset = ds.dataset(file_path, schema=cls.schema, format='parquet',
-                             partitioning=cls.get_partitioning())
+        dataset = cls.get_dataset()
         # dataset columns
         dataset_columns = dataset.schema.names
         if columns and Dimension.TRADE_DATE in columns and Dimension.TRADE_DATE not in dataset_columns:
             columns.remove(Dimension.TRADE_DATE)
+        if columns is None and cls.schema is not None:
+            # 不返回日期分区字段
+            columns = cls.schema.names
 
-        # 如果dataset没有trade_date字段，去掉trade_date过滤条件
-        if filters and Dimension.TRADE_DATE not in dataset_columns:
-            new_filters = []
-            for _filter in filters:
-                if 'ds.field(Dimension.TRADE_DATE)' in _filter:
-                    continue
-                else:
-                    new_filters.append(_filter)
-            filters = new_filters
+        # 分桶字段过滤时只读取对应的桶
+        if cls.bucket_count and cls.bucket_by in cond and cls.BUCKET_FIELD in dataset_columns:
+            values = cond[cls.bucket_by]
+            values = values if isinstance(values, (list, tuple, set, frozenset)) else [values]
+            bucket_count = cls.get_bucket_count()
+            cond = dict(cond, **{cls.BUCKET_FIELD: sorted({str(bucket_of(v, bucket_count)) for v in values})})
+        # 如果dataset没有trade_date字段，不加trade_date过滤条件
+        filter_expr = build_filter(dataset_columns, start_date, end_date, cond, cls.get_partitioned_by_date())
+        return dataset, columns, filter_expr
 
+    @classmethod
+    def get_table(cls, secu_codes: Optional[list[str]] = None,
+                  start_date: Optional[Union[date, datetime]] = None,
+                  end_date: Optional[Union[date, datetime]] = None,
+                  cond: Optional[dict[Dimension, Union[list, str]]] = None,
+                  columns: Optional[list] = None,
+                  sort_by: Optional[Union[str, list[tuple[str, str]]]] = None,
+                  keep_dictionary: bool = False) -> pa.Table:
+        """
+        获取etl数据（pyarrow.Table，不转换pandas）
+        :param sort_by: 排序字段，str为升序，或[(字段, 'ascending'|'descending')]
+        :param keep_dictionary: 字典编码字段是否保持dictionary类型，默认解码为string
+        """
+        dataset, columns, filter_expr = cls.prepare_scan(secu_codes, start_date, end_date, cond, columns)
         try:
-            if filters:
-                table = dataset.to_table(columns=columns, filter=eval(' & '.join(filters)))
-            else:
-                table = dataset.to_table(columns=columns)
+            try:
+                cls.load_fragment_metadata(dataset, filter_expr)
+                table = dataset.to_table(columns=columns, filter=filter_expr)
+            except OSError:
+                # 缓存的dataset文件已被并发写入替换，重新扫描目录再读一次
+                cls.invalidate_dataset_cache()
+                dataset = cls.get_dataset()
+                table = dataset.to_table(columns=columns, filter=filter_expr)
         except pa.lib.ArrowInvalid as e:
             raise QtException(QtError.E_SUCCESS, msg=f'请检查etl文件，model:{cls.__name__}，{e.args}')
         except Exception as e:
             raise QtException(QtError.E_SUCCESS, msg=f'dataset to table error:{e}')
+        if sort_by:
+            table = table.sort_by(sort_by)
+        if not keep_dictionary:
+            table = cls.decode_dictionary(table)
+        return table
+
+    @classmethod
+    def scan_batches(cls, secu_codes: Optional[list[str]] = None,
+                     start_date: Optional[Union[date, datetime]] = None,
+                     end_date: Optional[Union[date, datetime]] = None,
+                     cond: Optional[dict[Dimension, Union[list, str]]] = None,
+                     columns: Optional[list] = None,
+                     batch_size: int = 128 * 1024) -> pa.RecordBatchReader:
+        """获取etl数据（流式RecordBatchReader，按批读取，不一次性加载到内存；字典编码字段为dictionary类型）"""
+        dataset, columns, filter_expr = cls.prepare_scan(secu_codes, start_date, end_date, cond, columns)
+        scanner = dataset.scanner(columns=columns, filter=filter_expr, batch_size=batch_size)
+        return scanner.to_reader()
 
-        df = table.to_pandas().sort_index()
-        logger.info('Loading all {} to cache from parquet {} used time:{}'.format(cls.__name__, file_path,
+    @classmethod
+    def get_data(cls, secu_codes: Optional[list[str]] = None,
+                 start_date: Optional[Union[date, datetime]] = None,
+                 end_date: Optional[Union[date, datetime]] = None,
+                 cond: Optional[dict[Dimension, Union[list, str]]] = None,
+                 columns: Optional[list] = None,
+                 decoder: Optional[Any] = None,
+                 string_dtype: Optional[Union[str, StringDtype]] = None):
+        """
+        获取etl数据（pandas.DataFrame，按trade_date降序）
+        :param string_dtype: 字符串字段类型 object|category|pyarrow，默认cls.string_dtype
+        """
+        start_time = time.time()
+        string_dtype = StringDtype(string_dtype or cls.string_dtype)
+        table = cls.get_table(secu_codes, start_date, end_date, cond, columns,
+                              keep_dictionary=string_dtype == StringDtype.category)
+        if string_dtype == StringDtype.category:
+            # 排序字段按string存储，读取后再编码
+            table = cls.encode_dictionary(table, cls.get_dictionary_columns(include_sort_keys=True))
+        if string_dtype == StringDtype.pyarrow:
+            df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get).sort_index()
+        else:
+            df = table.to_pandas().sort_index()
+        logger.info('Loading all {} to cache from parquet {} used time:{}'.format(cls.__name__, cls.get_etl_dir(),
                                                                                   time.time() - start_time))
 
         if Dimension.TRADE_DATE in df.columns:
@@ -423,6 +1586,42 @@ class EntityBase:
         logger.info(f"获取{cls.__name__}数据: start_date={start_date} end_date={end_date} cond:{cond}")
         return df
 
+    @staticmethod
+    def asof_join(left: pd.DataFrame, right: pd.DataFrame,
+                  by: Optional[Union[str, list]] = None,
+                  columns: Optional[list] = None,
+                  on: str = Dimension.TRADE_DATE,
+                  tolerance: Optional[Union[int, timedelta, pd.Timedelta]] = None) -> pd.DataFrame:
+        """
+        as-of关联：left每行关联right中同by键、生效日期 <= left日期 的最新一条（缓慢变化的参考数据，如评级、行业）
+        :param left: 要补充属性的数据
+        :param right: 参考数据（含生效日期on列），同一日期多条时取数据中的最后一条
+        :param by: 关联键
+        :param columns: 要关联的right字段，默认除by、on外的全部字段
+        :param on: 日期字段（left、right同名）
+        :param tolerance: 最大生效天数，超过则不关联
+        :return: 保持left行顺序，未关联到的为空
+        """
+        by = [by] if isinstance(by, str) else list(by or [])
+        if columns is None:
+            columns = [c for c in right.columns if c != on and c not in by]
+        key, position = '__asof_date', '__asof_position'
+        left = left.assign(**{position: range(len(left)), key: pd.to_datetime(left[on])})
+        right = right[by + columns].assign(**{key: pd.to_datetime(right[on])})
+        right = right[right[key].notna()].sort_values(key, kind='stable')
+        if isinstance(tolerance, int):
+            tolerance = pd.Timedelta(days=tolerance)
+
+        valid = left[key].notna()
+        if right.empty or not valid.any():
+            res = left.assign(**{c: None for c in columns})
+        else:
+            merged = pd.merge_asof(left[valid].sort_values(key, kind='stable'), right, on=key, by=by or None,
+                                   tolerance=tolerance, direction='backward')
+            # 日期为空的行不参与关联
+            res = pd.concat([merged, left[~valid]]).sort_values(position)
+        return res.drop(columns=[key, position]).reset_index(drop=True)
+
     @classmethod
     def get_schema_df(cls, *args, **kwargs):
 
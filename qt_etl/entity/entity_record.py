@@ -5,6 +5,7 @@ import copy
 import datetime
 import enum
 import functools
+import importlib
 import uuid
 from typing import Union, List, Any, Tuple
 
@@ -15,20 +16,110 @@ from pydantic import BaseModel
 from qt_common.error import QtError, QtException
 from qt_common.qt_logging import frame_log
 from qt_etl.entity.entity_base import EntityBase
-from qt_etl.entity.factor.factor import Factor
-from qt_etl.entity.instruments.instrument import Instrument
-from qt_etl.entity.market_data.market_data import MarketData
-from qt_etl.entity.portfolio.portfolio import Portfolio
-from qt_etl.entity.trade_info.trade_info import TradeInfo
 
 
 class EtlCategory(enum.Enum):
     """etl 数据分类"""
-    Instrument = Instrument.__name__
-    MarketData = MarketData.__name__
-    Portfolio = Portfolio.__name__
-    Trade = TradeInfo.__name__
-    Factor = Factor.__name__
+    Instrument = 'Instrument'
+    MarketData = 'MarketData'
+    Portfolio = 'Portfolio'
+    Trade = 'TradeInfo'
+    Factor = 'Factor'
+
+
+# 模型清单：分类 -> 分类类所在模块、模型 -> 模型类所在模块
+# 导入本模块时不导入任何模型，使用到的模型才导入（新增模型需登记，check_manifest可检查是否遗漏）
+CATEGORY_MANIFEST = {
+    'Factor': 'qt_etl.entity.factor.factor',
+    'Instrument': 'qt_etl.entity.instruments.instrument',
+    'MarketData': 'qt_etl.entity.market_data.market_data',
+    'Portfolio': 'qt_etl.entity.portfolio.portfolio',
+    'TradeInfo': 'qt_etl.entity.trade_info.trade_info',
+}
+MODEL_MANIFEST = {
+    'Factor': {
+        'BarraLevel1': 'qt_etl.entity.factor.barra_cne6_level1',
+        'BarraLevel2': 'qt_etl.entity.factor.barra_cne6_level2',
+        'BarraLevel2Mean': 'qt_etl.entity.factor.barra_cne6_level2_mean',
+        'BarraLevel2Std': 'qt_etl.entity.factor.barra_cne6_level2_std',
+        'BarraLevel3': 'qt_etl.entity.factor.barra_cne6_level3',
+        'BarraLevel3Mean': 'qt_etl.entity.factor.barra_cne6_level3_mean',
+        'BarraLevel3Std': 'qt_etl.entity.factor.barra_cne6_level3_std',
+        'BarraFactorReturnCne6': 'qt_etl.entity.factor.barra_factor_return_cne6',
+        'FinancialIndicator': 'qt_etl.entity.factor.financial_indicator',
+        'BarraCne5Level1': 'qt_etl.entity.factor.barra_cne5_level1',
+        'BarraFactorReturnCne5': 'qt_etl.entity.factor.barra_factor_return_cne5',
+    },
+    'Instrument': {
+        'BondInfo': 'qt_etl.entity.instruments.bond_info',
+        'FundInfo': 'qt_etl.entity.instruments.fund_info',
+        'StockIndexInfo': 'qt_etl.entity.instruments.stock_index_info',
+        'StockInfo': 'qt_etl.entity.instruments.stock_info',
+        'BenchMarkInfo': 'qt_etl.entity.instruments.benchmark_info',
+    },
+    'MarketData': {
+        'BenchmarkDailyQuote': 'qt_etl.entity.market_data.benchmark_daily_quote',
+        'BondDailyQuote': 'qt_etl.entity.market_data.bond_daily_quote',
+        'BondValCSI': 'qt_etl.entity.market_data.bond_val_csi',
+        'BondValCNBD': 'qt_etl.entity.market_data.bond_val_cnbd',
+        'FundDailyQuote': 'qt_etl.entity.market_data.fund_daily_quote',
+        'IndexRate': 'qt_etl.entity.market_data.index_rate',
+        'IndustryClassificationMktData': 'qt_etl.entity.market_data.industry_classification_mkt_data',
+        'QtCalendar': 'qt_etl.entity.market_data.qt_calendar',
+        'StockDailyQuote': 'qt_etl.entity.market_data.stock_daily_quote',
+        'IssuerRating': 'qt_etl.entity.market_data.issuer_rating',
+        'InstrumentRating': 'qt_etl.entity.market_data.instrument_rating',
+        'BenchmarkDailyIndustryReturn': 'qt_etl.entity.market_data.benchmark_daily_industry_return',
+        'YieldCurveCNBDSample': 'qt_etl.entity.market_data.yield_curve_cnbd_sample',
+        'FxExchRate': 'qt_etl.entity.market_data.fx_exch_rate',
+        'TimeSeries': 'qt_etl.entity.market_data.time_series',
+        'VolatilitySurface': 'qt_etl.entity.market_data.volatility_surface',
+    },
+    'Portfolio': {
+        'CombPosition': 'qt_etl.entity.portfolio.comb_position',
+        'DownRelationPortfolio': 'qt_etl.entity.portfolio.down_relation_info',
+        'StockIndexPortfolio': 'qt_etl.entity.portfolio.stock_index_portfolio',
+        'CombPositionPenetrate': 'qt_etl.entity.portfolio.comb_position_penetrate',
+        'CombAsset': 'qt_etl.entity.portfolio.comb_asset',
+        'BondPosition': 'qt_etl.entity.portfolio.bond_position',
+    },
+    'TradeInfo': {
+        'BondTradeInfo': 'qt_etl.entity.trade_info.bond_trade_info',
+        'BondTradePenetrateInfo': 'qt_etl.entity.trade_info.bond_trade_penetrate',
+        'StockTradeInfo': 'qt_etl.entity.trade_info.stock_trade',
+        'StockTradePenetrateInfo': 'qt_etl.entity.trade_info.stock_trade_penetrate',
+    },
+}
+
+
+def load_category(category_code: str):
+    """导入分类类"""
+    return getattr(importlib.import_module(CATEGORY_MANIFEST[category_code]), category_code)
+
+
+def load_model(category_code: str, model_code: str):
+    """导入模型类"""
+    return getattr(importlib.import_module(MODEL_MANIFEST[category_code][model_code]), model_code)
+
+
+def load_all_models() -> list:
+    """导入清单中的全部模型"""
+    return [load_model(category_code, model_code)
+            for category_code, models in MODEL_MANIFEST.items() for model_code in models]
+
+
+def check_manifest():
+    """
+    检查模型清单与实际的类继承关系是否一致（会导入全部模型）
+    :return: (清单中缺少的模型, 清单中多余的模型)，元素为(分类, 模型)
+    """
+    load_all_models()
+    actual = {(get_cls_attribute(subcls)[0], get_cls_attribute(modelcls)[0])
+              for subcls in get_subclasses(EntityBase) if subcls.__name__ in CATEGORY_MANIFEST
+              for modelcls in get_subclasses(subcls)}
+    manifest = {(category_code, model_code)
+                for category_code, models in MODEL_MANIFEST.items() for model_code in models}
+    return sorted(actual - manifest), sorted(manifest - actual)
 
 
 class EtlModels(BaseModel):
@@ -119,20 +210,14 @@ def get_cls_attribute(cls):
 
 # 注册etl分类和具体模型映射
 ENTITY_MAP = {}
-ENTITY_DF = pandas.DataFrame(
-    columns=[
-        "category_code",
-        "category_name",
-        "category_cls",
-        "model_code",
-        "model_name",
-        "model_cls",
-    ])
 
 
 def build_entity_df():
+    """etl分类和模型DataFrame（导入全部模型），通过模块属性ENTITY_DF首次访问时构建"""
+    load_all_models()
     dataframes = []
-    for subcls in get_subclasses(EntityBase):
+    for category_code in CATEGORY_MANIFEST:
+        subcls = load_category(category_code)
         for modelcls in get_subclasses(subcls):
             record = EtlModels()
             (
@@ -148,9 +233,13 @@ def build_entity_df():
             dataframes.append(record.dict())
     global ENTITY_DF
     ENTITY_DF = pandas.concat([pandas.DataFrame(dataframes)], ignore_index=False, sort=True)
+    return ENTITY_DF
 
 
-build_entity_df()
+def __getattr__(name):
+    if name == 'ENTITY_DF':
+        return build_entity_df()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_schema_info(entity=None):
@@ -173,6 +262,8 @@ def get_schema_info(entity=None):
     ]
     if entity is None:
         entity = EntityBase
+    if entity is EntityBase:
+        load_all_models()
     model_schemas_df = []
     for entity_category_cls in get_subclasses(entity):
         frame_log.info("etl category: {} schema generate", str(entity_category_cls))
@@ -208,21 +299,22 @@ def get_etl_action_callable(
     :param kwargs: 关键字参数
     :return:run_etl or get_data
     """
-    df = copy.deepcopy(ENTITY_DF)
+    # 按清单过滤，只导入选中的模型
+    rows = [(_category_code, _model_code)
+            for _category_code, models in MODEL_MANIFEST.items() for _model_code in models]
     if category_code == "ALL":
-        df = df.loc[df.category_code.isin(EtlCategory.__members__)]
+        rows = [row for row in rows if row[0] in EtlCategory.__members__]
     elif category_code in EtlCategory.__members__:
-        df = df.loc[df.category_code == category_code]
+        rows = [row for row in rows if row[0] == category_code]
     if model_code:
-        df = df.loc[df.model_code == model_code]
-    if df.empty:
+        rows = [row for row in rows if row[1] == model_code]
+    if not rows:
         raise QtException(QtError.E_NOT_EXIST, "etl model not found")
-    if len(df) > 1:
+    if len(rows) > 1:
         return [get_etl_action_callable(
-            row.category_code, row.model_code, action, **kwargs) for _, row in
-            df.iterrows()]
+            _category_code, _model_code, action, **kwargs) for _category_code, _model_code in rows]
     else:
-        model_cls = df.model_cls.iloc[0]
+        model_cls = load_model(*rows[0])
         if not hasattr(model_cls, action.value):
             raise RuntimeError("模型未继承EntityBase, 请检查")
         action_callable = functools.partial(
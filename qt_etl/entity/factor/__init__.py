@@ -1,12 +1,20 @@
-from .barra_cne6_level1 import *
-from .barra_cne6_level2 import *
-from .barra_cne6_level2_mean import *
-from .barra_cne6_level2_std import *
-from .barra_cne6_level3 import *
-from .barra_cne6_level3_mean import *
-from .barra_cne6_level3_std import *
-from .barra_factor_return_cne6 import *
-from .financial_indicator import *
-from .barra_cne5_level1 import *
-from .barra_factor_return_cne5 import *
+# vim set fileencoding=utf-8
+"""因子模型：按需导入，访问模型类时才导入所在模块"""
+from qt_etl.utils import lazy_exports
 
+_EXPORTS = {
+    'BarraLevel1': '.barra_cne6_level1',
+    'BarraLevel2': '.barra_cne6_level2',
+    'BarraLevel2Mean': '.barra_cne6_level2_mean',
+    'BarraLevel2Std': '.barra_cne6_level2_std',
+    'BarraLevel3': '.barra_cne6_level3',
+    'BarraLevel3Mean': '.barra_cne6_level3_mean',
+    'BarraLevel3Std': '.barra_cne6_level3_std',
+    'BarraFactorReturnCne6': '.barra_factor_return_cne6',
+    'FinancialIndicator': '.financial_indicator',
+    'BarraCne5Level1': '.barra_cne5_level1',
+    'BarraFactorReturnCne5': '.barra_factor_return_cne5',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(globals(), _EXPORTS)
@@ -0,0 +1,106 @@
+# vim set fileencoding=utf-8
+"""get_data过滤条件：直接构建pyarrow表达式（可缓存复用，支持分区字段下推）"""
+import functools
+from datetime import date, datetime
+from typing import Optional, Union
+
+import pyarrow.compute as pc
+
+from qt_common.utils import date_to_str
+from qt_etl.constants import PartitionByDateType
+from qt_etl.entity.fields import Dimension
+from qt_etl.utils import deal_date
+
+__all__ = ['build_filter', 'PUSHDOWN_PARTITION_TYPES']
+
+# 可下推的日期分区（按日分区时trade_date本身就是分区字段）
+PUSHDOWN_PARTITION_TYPES = (PartitionByDateType.month, PartitionByDateType.quarter, PartitionByDateType.year)
+
+
+def _freeze(value):
+    """cond值转为可hash的形式，作为缓存key"""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(value)
+    # 与原eval字符串一致，单值按字符串比较
+    return str(value)
+
+
+def _isin(name: str, values: tuple):
+    """
+    列表条件：isin之外再加上min/max范围
+    pyarrow只能用比较表达式和row group统计信息比对，isin不会跳过row group，加上范围后可按统计信息裁剪
+    """
+    field = pc.field(name)
+    expression = field.isin(list(values))
+    if any(value is None or value != value for value in values):
+        # 列表含None/NaN时isin匹配空值行，范围比较会把这些行过滤掉
+        return expression
+    try:
+        low, high = min(values), max(values)
+    except (TypeError, ValueError):
+        # 空列表或类型不可比较时只用isin
+        return expression
+    return expression & (field >= low) & (field <= high)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(dataset_columns: tuple, start_date: Optional[str], end_date: Optional[str],
+             cond_items: tuple, partition_field: Optional[str],
+             partition_start: Optional[str], partition_end: Optional[str]):
+    expressions = []
+    if Dimension.TRADE_DATE in dataset_columns:
+        if start_date:
+            expressions.append(pc.field(Dimension.TRADE_DATE) >= start_date)
+        if end_date:
+            expressions.append(pc.field(Dimension.TRADE_DATE) <= end_date)
+
+    # 分区字段下推：目录不满足的直接跳过，没有分区目录(旧数据)的分区值为空，保留
+    if partition_field and partition_field in dataset_columns:
+        part = pc.field(partition_field)
+        if partition_start:
+            expressions.append((part >= partition_start) | part.is_null())
+        if partition_end:
+            expressions.append((part <= partition_end) | part.is_null())
+
+    for name, value in cond_items:
+        if isinstance(value, tuple):
+            expressions.append(_isin(name, value))
+        else:
+            expressions.append(pc.field(name) == value)
+
+    if not expressions:
+        return None
+    return functools.reduce(lambda x, y: x & y, expressions)
+
+
+def build_filter(dataset_columns: Union[list, tuple],
+                 start_date: Optional[Union[str, date, datetime]] = None,
+                 end_date: Optional[Union[str, date, datetime]] = None,
+                 cond: Optional[dict] = None,
+                 partitioned_by_date: Optional[PartitionByDateType] = None):
+    """
+    构建get_data的过滤表达式
+    :param dataset_columns: dataset字段（含分区字段），不存在trade_date时忽略日期过滤
+    :param start_date:
+    :param end_date:
+    :param cond: {字段: 值/列表}
+    :param partitioned_by_date: 日期分区类型，月/季/年分区时下推分区字段
+    :return: pc.Expression，无过滤条件时返回None
+    """
+    partition_field = partition_start = partition_end = None
+    if partitioned_by_date in PUSHDOWN_PARTITION_TYPES:
+        partition_field = partitioned_by_date.value
+        partition_start = deal_date(start_date, partitioned_by_date) if start_date else None
+        partition_end = deal_date(end_date, partitioned_by_date) if end_date else None
+    cond_items = tuple((name, _freeze(value)) for name, value in (cond or {}).items())
+    return _compile(tuple(dataset_columns),
+                    date_to_str(start_date) if start_date else None,
+                    date_to_str(end_date) if end_date else None,
+                    cond_items, partition_field, partition_start, partition_end)
+
+
+if __name__ == '__main__':
+    print(build_filter([Dimension.TRADE_DATE, Dimension.INSTRUMENT_CODE, 'month'],
+                       start_date=date(2021, 1, 1), end_date=date(2021, 3, 31),
+                       cond={Dimension.INSTRUMENT_CODE: ['000001.SZ', '600000.SH']},
+                       partitioned_by_date=PartitionByDateType.month))
@@ -1,6 +1,14 @@
-from .bond_info import *
-from .fund_info import *
-from .stock_index_info import *
-from .stock_info import *
-from .benchmark_info import *
+# vim set fileencoding=utf-8
+"""证券基础信息模型：按需导入，访问模型类时才导入所在模块"""
+from qt_etl.utils import lazy_exports
 
+_EXPORTS = {
+    'BondInfo': '.bond_info',
+    'FundInfo': '.fund_info',
+    'StockIndexInfo': '.stock_index_info',
+    'StockInfo': '.stock_info',
+    'BenchMarkInfo': '.benchmark_info',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(globals(), _EXPORTS)
@@ -4,15 +4,20 @@ from datetime import date, datetime
 from typing import Optional, Union
 
 import numpy as np
+import pandas as pd
 import pyarrow as pa
 import qtlib
 
 from qt_common.utils import str_to_date, date_to_str
 from qt_etl.entity.fields import InstrumentType, Dimension
 from qt_etl.entity.instruments.instrument import Instrument
+from qt_etl.utils import group_to_list, group_to_map, map_to_json
 
 __all__ = ['BondInfo']
 
+# 日期 -> 数值 的map字段（原为json字符串）
+DATE_VALUE_MAP = pa.map_(pa.string(), pa.float64())
+
 
 class BondInfo(Instrument):
     """债券基本信息"""
@@ -78,17 +83,17 @@ class BondInfo(Instrument):
         pa.field(Dimension.INSTRUMENT_TYPE, pa.string(), metadata={b'table_field': b''}),
         pa.field(Dimension.COUPON_ACCURACY, pa.int64(), metadata={b'table_field': b''}),
         pa.field(Dimension.IS_CREATE_NEW, pa.int64(), metadata={b'table_field': b''}),
-        pa.field(Dimension.NOTIONAL_REDUCE_MAP, pa.string(), metadata={b'table_field': b''}),
-        pa.field(Dimension.CALL_OPTION_MAP, pa.string(), metadata={b'table_field': b''}),
-        pa.field(Dimension.PUT_OPTION_MAP, pa.string(), metadata={b'table_field': b''}),
-        pa.field(Dimension.HIGH_INTEREST_RATE_ADJ, pa.string(), metadata={b'table_field': b''}),
-        pa.field(Dimension.LOW_INTEREST_RATE_ADJ, pa.string(), metadata={b'table_field': b''}),
+        pa.field(Dimension.NOTIONAL_REDUCE_MAP, DATE_VALUE_MAP, metadata={b'table_field': b''}),
+        pa.field(Dimension.CALL_OPTION_MAP, DATE_VALUE_MAP, metadata={b'table_field': b''}),
+        pa.field(Dimension.PUT_OPTION_MAP, DATE_VALUE_MAP, metadata={b'table_field': b''}),
+        pa.field(Dimension.HIGH_INTEREST_RATE_ADJ, DATE_VALUE_MAP, metadata={b'table_field': b''}),
+        pa.field(Dimension.LOW_INTEREST_RATE_ADJ, DATE_VALUE_MAP, metadata={b'table_field': b''}),
         pa.field(Dimension.ADJUST_NUM_FOR_LASTEST, pa.float64(), metadata={b'table_field': b''}),
         pa.field(Dimension.INTEREST_START_DATE, pa.list_(pa.string()), metadata={b'table_field': b''}),
         pa.field(Dimension.INTEREST_END_DATE, pa.list_(pa.string()), metadata={b'table_field': b''}),
         pa.field(Dimension.INTEREST_PERIOD_INTEREST_RATE, pa.list_(pa.float64()),
                  metadata={b'table_field': b''}),
-        pa.field(Dimension.COUPON_CHANGE_MAP, pa.string(), metadata={b'table_field': b''}),
+        pa.field(Dimension.COUPON_CHANGE_MAP, DATE_VALUE_MAP, metadata={b'table_field': b''}),
         pa.field(Dimension.DELIST_DATE, pa.string(), metadata={b'table_field': b'DELIST_DATE'}),
         pa.field(Dimension.FLOAT_RATE_RECORDS, pa.list_(pa.float64()), metadata={b'table_field': b''}),
         pa.field(Dimension.CLS_CODE_1ST, pa.string(), metadata={b'table_field': b'CLS_CODE_1ST', b'table_name': b'INFO_ZG_SEC_CLASSIFICATION'}),
@@ -157,24 +162,27 @@ class BondInfo(Instrument):
         df_bond_basic_data[Dimension.IS_CREATE_NEW] = 1  # 依赖于浮息债基准利率 FLT_BM
 
         df_bond_advance_repay_data = cls.fetch_bond_advance_repay_data(secu_code, start_date, end_date)
-        df_bond_basic_data[Dimension.NOTIONAL_REDUCE_MAP] = df_bond_advance_repay_data.groupby(
-            [Dimension.INSTRUMENT_CODE]).apply(
-            lambda x: json.dumps(dict(zip(x[Dimension.TRADE_DATE], x[Dimension.ADVANCE_REPAY_RATIO]))))
+        # 日期 -> 数值 的map字段，按债券分组向量化构建
+        df_bond_basic_data[Dimension.NOTIONAL_REDUCE_MAP] = group_to_map(
+            df_bond_advance_repay_data, Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE, Dimension.ADVANCE_REPAY_RATIO)
         df_bond_right_data = cls.fetch_bond_right_data(secu_code, start_date, end_date)
-        df_bond_basic_data[Dimension.CALL_OPTION_MAP] = df_bond_right_data.loc[
-            df_bond_right_data[Dimension.RIT_TYPE] == '002'].groupby([Dimension.INSTRUMENT_CODE]).apply(
-            lambda x: json.dumps(dict(zip(x[Dimension.TRADE_DATE], x[Dimension.STRIKE_PRICE]))))
-        df_bond_basic_data[Dimension.PUT_OPTION_MAP] = df_bond_right_data.loc[
-            df_bond_right_data[Dimension.RIT_TYPE] == '001'].groupby([Dimension.INSTRUMENT_CODE]).apply(
-            lambda x: json.dumps(dict(zip(x[Dimension.TRADE_DATE], x[Dimension.STRIKE_PRICE]))))
-        df_bond_right_data[Dimension.HIGH_INTEREST_RATE_ADJ].fillna(100000, inplace=True)
-        df_bond_right_data[Dimension.LOW_INTEREST_RATE_ADJ].fillna(100000, inplace=True)
-        df_bond_basic_data[Dimension.HIGH_INTEREST_RATE_ADJ] = df_bond_right_data.groupby(
-            [Dimension.INSTRUMENT_CODE]).apply(
-            lambda x: json.dumps(dict(zip(x[Dimension.TRADE_DATE], x[Dimension.HIGH_INTEREST_RATE_ADJ]))))
-        df_bond_basic_data[Dimension.LOW_INTEREST_RATE_ADJ] = df_bond_right_data.groupby(
-            [Dimension.INSTRUMENT_CODE]).apply(
-            lambda x: json.dumps(dict(zip(x[Dimension.TRADE_DATE], x[Dimension.LOW_INTEREST_RATE_ADJ]))))
+        if not df_bond_right_data.empty:
+            df_bond_basic_data[Dimension.CALL_OPTION_MAP] = group_to_map(
+                df_bond_right_data.loc[df_bond_right_data[Dimension.RIT_TYPE] == '002'],
+                Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE, Dimension.STRIKE_PRICE)
+            df_bond_basic_data[Dimension.PUT_OPTION_MAP] = group_to_map(
+                df_bond_right_data.loc[df_bond_right_data[Dimension.RIT_TYPE] == '001'],
+                Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE, Dimension.STRIKE_PRICE)
+            df_bond_right_data[Dimension.HIGH_INTEREST_RATE_ADJ].fillna(100000, inplace=True)
+            df_bond_right_data[Dimension.LOW_INTEREST_RATE_ADJ].fillna(100000, inplace=True)
+            df_bond_basic_data[Dimension.HIGH_INTEREST_RATE_ADJ] = group_to_map(
+                df_bond_right_data, Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE, Dimension.HIGH_INTEREST_RATE_ADJ)
+            df_bond_basic_data[Dimension.LOW_INTEREST_RATE_ADJ] = group_to_map(
+                df_bond_right_data, Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE, Dimension.LOW_INTEREST_RATE_ADJ)
+        else:
+            for column in [Dimension.CALL_OPTION_MAP, Dimension.PUT_OPTION_MAP,
+                           Dimension.HIGH_INTEREST_RATE_ADJ, Dimension.LOW_INTEREST_RATE_ADJ]:
+                df_bond_basic_data[column] = None
         df_bond_interest_rate_data = cls.fetch_bond_interest_rate(secu_code, start_date, end_date)
         df_bond_interest_rate_data[Dimension.BASE_INTEREST_RATE].fillna(0, inplace=True)
         df_bond_interest_rate_data[Dimension.INTEREST_PERIOD_INTEREST_RATE].fillna(0, inplace=True)
@@ -186,26 +194,23 @@ class BondInfo(Instrument):
                     Dimension.INTEREST_START_DATE].apply(str_to_date)).apply(
             lambda x: float(x.days))  # TODO: workday
 
-        df_bond_interest_rate_data_instrument = df_bond_interest_rate_data.groupby(
-            [Dimension.INSTRUMENT_CODE])
         df_bond_basic_data[Dimension.ADJUST_NUM_FOR_LASTEST].fillna(0, inplace=True)
-        df_bond_interest_rate_data.set_index(Dimension.INSTRUMENT_CODE, inplace=True)
-
-        df_bond_basic_data[Dimension.INTEREST_START_DATE] = df_bond_interest_rate_data_instrument.apply(
-            lambda x: x[Dimension.INTEREST_START_DATE].to_list())
-        df_bond_basic_data[Dimension.INTEREST_END_DATE] = df_bond_interest_rate_data_instrument.apply(
-            lambda x: x[Dimension.INTEREST_END_DATE].to_list())
-        df_bond_basic_data[
-            Dimension.INTEREST_PERIOD_INTEREST_RATE] = df_bond_interest_rate_data_instrument.apply(
-            lambda x: x[Dimension.INTEREST_PERIOD_INTEREST_RATE].to_list())
-        df_bond_basic_data[Dimension.COUPON_CHANGE_MAP] = df_bond_interest_rate_data_instrument.apply(
-            lambda x: json.dumps(
-                dict(zip(x[Dimension.INTEREST_START_DATE], x[Dimension.INTEREST_PERIOD_INTEREST_RATE]))))
-
-        df_bond_basic_data[Dimension.FLOAT_RATE_RECORDS] = df_bond_basic_data.apply(
-            lambda x: x[[Dimension.COUPON_ACCURACY, Dimension.IS_CREATE_NEW,
-                         Dimension.ADJUST_NUM_FOR_LASTEST, Dimension.FRN_ADJUST_RT,
-                         Dimension.CALC_WAY]].values.tolist(), axis=1)
+
+        df_bond_basic_data[Dimension.INTEREST_START_DATE] = group_to_list(
+            df_bond_interest_rate_data, Dimension.INSTRUMENT_CODE, Dimension.INTEREST_START_DATE, pa.string())
+        df_bond_basic_data[Dimension.INTEREST_END_DATE] = group_to_list(
+            df_bond_interest_rate_data, Dimension.INSTRUMENT_CODE, Dimension.INTEREST_END_DATE, pa.string())
+        df_bond_basic_data[Dimension.INTEREST_PERIOD_INTEREST_RATE] = group_to_list(
+            df_bond_interest_rate_data, Dimension.INSTRUMENT_CODE, Dimension.INTEREST_PERIOD_INTEREST_RATE,
+            pa.float64())
+        df_bond_basic_data[Dimension.COUPON_CHANGE_MAP] = group_to_map(
+            df_bond_interest_rate_data, Dimension.INSTRUMENT_CODE, Dimension.INTEREST_START_DATE,
+            Dimension.INTEREST_PERIOD_INTEREST_RATE)
+
+        float_rate_columns = [Dimension.COUPON_ACCURACY, Dimension.IS_CREATE_NEW, Dimension.ADJUST_NUM_FOR_LASTEST,
+                              Dimension.FRN_ADJUST_RT, Dimension.CALC_WAY]
+        df_bond_basic_data[Dimension.FLOAT_RATE_RECORDS] = list(
+            df_bond_basic_data[float_rate_columns].to_numpy(dtype=float))
         df_bond_basic_data = df_bond_basic_data.reset_index()
 
         df_bond_credit_sector = cls.fetch_bond_credit_sector()
@@ -392,6 +397,40 @@ class BondInfo(Instrument):
 
         return df
 
+    # map字段（原json字符串）
+    map_columns = [Dimension.NOTIONAL_REDUCE_MAP, Dimension.CALL_OPTION_MAP, Dimension.PUT_OPTION_MAP,
+                   Dimension.HIGH_INTEREST_RATE_ADJ, Dimension.LOW_INTEREST_RATE_ADJ, Dimension.COUPON_CHANGE_MAP]
+
+    @classmethod
+    def json_decoder(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """兼容：map字段转回json字符串，get_data(decoder=BondInfo.json_decoder)"""
+        for column in cls.map_columns:
+            if column in df.columns:
+                df[column] = df[column].map(map_to_json)
+        return df
+
+    @classmethod
+    def explode_map(cls, column: str, secu_codes: Optional[list] = None) -> pd.DataFrame:
+        """
+        map字段展开为明细（不解析json）
+        :param column: map字段，如 Dimension.CALL_OPTION_MAP
+        :param secu_codes: 债券代码
+        :return: instrument_code、trade_date、value
+        """
+        table = cls.get_table(secu_codes=secu_codes, columns=[Dimension.INSTRUMENT_CODE, column])
+        res_columns = [Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE, 'value']
+        if not table.num_rows:
+            return pd.DataFrame(columns=res_columns)
+        table = table.combine_chunks()
+        maps = table[column].chunk(0)
+        entries = maps.flatten()
+        codes = table[Dimension.INSTRUMENT_CODE].chunk(0).take(maps.value_parent_indices())
+        return pd.DataFrame({
+            Dimension.INSTRUMENT_CODE: codes.to_pandas(),
+            Dimension.TRADE_DATE: entries.field('key').to_pandas(),
+            'value': entries.field('value').to_pandas(),
+        }, columns=res_columns)
+
     etl_rename_dict = {
         'BOND_CODE': Dimension.INSTRUMENT_CODE,
         'CSNAME': Dimension.INSTRUMENT_NAME,
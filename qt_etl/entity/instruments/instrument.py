@@ -5,6 +5,7 @@ import qtlib
 from qt_common.error import QtException, QtError
 from qt_etl.entity.entity_base import EntityBase
 from qt_etl.entity.fields import InstrumentType, Dimension
+from qt_etl.utils import map_to_json
 
 
 class Instrument(EntityBase):
@@ -67,10 +68,13 @@ class Instrument(EntityBase):
                                        row[Dimension.BENCHMARK_VALUES], row[Dimension.FLOAT_RATE_RECORDS],
                                        interest_start_date_filter, interest_end_date_filter,
                                        interest_period_interest_rate_filter,
-                                       row[Dimension.NOTIONAL_REDUCE_MAP], row[Dimension.COUPON_CHANGE_MAP],
-                                       row[Dimension.CALL_OPTION_MAP], row[Dimension.PUT_OPTION_MAP],
+                                       map_to_json(row[Dimension.NOTIONAL_REDUCE_MAP]),
+                                       map_to_json(row[Dimension.COUPON_CHANGE_MAP]),
+                                       map_to_json(row[Dimension.CALL_OPTION_MAP]),
+                                       map_to_json(row[Dimension.PUT_OPTION_MAP]),
                                        row['forwardMaturityCurve'], row['forwardSpotCurve'],
-                                       row[Dimension.HIGH_INTEREST_RATE_ADJ], row[Dimension.LOW_INTEREST_RATE_ADJ])
+                                       map_to_json(row[Dimension.HIGH_INTEREST_RATE_ADJ]),
+                                       map_to_json(row[Dimension.LOW_INTEREST_RATE_ADJ]))
             except Exception as e:
                 raise QtException(QtError.E_OTHER_BASE, message=e)
 
@@ -1,18 +1,28 @@
-from .benchmark_daily_quote import *
-from .bond_daily_quote import *
-from .bond_val_csi import *
-from .bond_val_cnbd import *
-from .fund_daily_quote import *
-from .index_rate import *
-from .industry_classification_mkt_data import *
-from .qt_calendar import *
-from .stock_daily_quote import *
-from .issuer_rating import *
-from .instrument_rating import *
-from .benchmark_daily_industry_return import BenchmarkDailyIndustryReturn
-from .yield_curve_cnbd_sample import YieldCurveCNBDSample
-from .fx_exch_rate import *
-from .fi_yield_curve import *
-from .time_series import TimeSeries
-from .volatility_surface import VolatilitySurface
+# vim set fileencoding=utf-8
+"""市场数据模型：按需导入，访问模型类时才导入所在模块"""
+from qt_etl.utils import lazy_exports
 
+_EXPORTS = {
+    'BenchmarkDailyQuote': '.benchmark_daily_quote',
+    'BondDailyQuote': '.bond_daily_quote',
+    'BondValCSI': '.bond_val_csi',
+    'BondValCNBD': '.bond_val_cnbd',
+    'FundDailyQuote': '.fund_daily_quote',
+    'IndexRate': '.index_rate',
+    'IndustryClassificationMktData': '.industry_classification_mkt_data',
+    'QtCalendar': '.qt_calendar',
+    'CalendarIndex': '.qt_calendar',
+    'StockDailyQuote': '.stock_daily_quote',
+    'IssuerRating': '.issuer_rating',
+    'InstrumentRating': '.instrument_rating',
+    'BenchmarkDailyIndustryReturn': '.benchmark_daily_industry_return',
+    'YieldCurveCNBDSample': '.yield_curve_cnbd_sample',
+    'FxExchRate': '.fx_exch_rate',
+    'FxRateCube': '.fx_exch_rate',
+    'FiYieldCurve': '.fi_yield_curve',
+    'TimeSeries': '.time_series',
+    'VolatilitySurface': '.volatility_surface',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(globals(), _EXPORTS)
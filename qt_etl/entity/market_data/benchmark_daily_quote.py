@@ -21,8 +21,13 @@ from qt_etl.entity.portfolio import resource_decorator
 
 class BenchmarkDailyQuote(MarketData):
     """基准市场数据"""
+    depends_on = ('CombPosition',)  # fetch_data的resource_decorator未指定证券时读取持仓
     main_table = 'INFO_IDX_EODVALUE'
+    PLAN_DATE_COLUMN = 'TRD_DATE'
+    PLAN_CODE_COLUMN = 'IDX_CODE'
+    plan_split_codes = True
     partitioned_by_date = PartitionByDateType.month
+    CODE_COLUMN = Dimension.INSTRUMENT_CODE
     schema = pa.schema([
         pa.field(Dimension.TRADE_DATE, pa.string(), metadata={b'table_field': b'TRD_DATE'}),
         pa.field(Measure.CLOSE, pa.float64(), metadata={b'table_field': b'CLS_PRC'}),
@@ -71,7 +76,8 @@ class BenchmarkDailyQuote(MarketData):
 
     @classmethod
     def run_etl(cls, **kwargs):
-        # 过滤参数处理, 默认增加沪深300证券过滤
+        # 过滤参数处理, 默认增加沪深300证券过滤（默认证券范围即模型的全部证券，推进水位线）
+        kwargs.setdefault('is_full_universe', 'secu_codes' not in kwargs)
         secu_codes = kwargs.pop('secu_codes', get_config(
             f"etl_{cls.__name__}", "filter_secu_codes", encode=lambda x: x.split(","),
             default=DEF_SEC_CSI))
@@ -15,6 +15,7 @@ __all__ = ['BondDailyQuote']
 
 class BondDailyQuote(MarketData):
     """中国债券日行情表"""
+    depends_on = ('CombPosition',)
     # 查询字段重命名映射关系
     etl_rename_dict = {
         'BOND_CODE': Dimension.INSTRUMENT_CODE,
@@ -36,6 +37,9 @@ class BondDailyQuote(MarketData):
     }
 
     main_table = 'INFO_FI_EODPRICE'
+    PLAN_DATE_COLUMN = 'TRD_DATE'
+    PLAN_CODE_COLUMN = 'BOND_CODE'
+    plan_split_codes = True
     schema = pa.schema([
         pa.field(Dimension.INSTRUMENT_CODE, pa.string(), metadata={b"table_field": b"BOND_CODE"}),
         pa.field(Dimension.TRADE_DATE, pa.string(), metadata={b"table_field": b"TRD_DATE"}),
@@ -16,7 +16,10 @@ __all__ = ["BondValCNBD"]
 
 class BondValCNBD(MarketData):
     """中债登债券估值"""
-    partitioned_cols = [Dimension.INSTRUMENT_CODE]
+    depends_on = ('CombPosition',)
+    # 按证券分桶（原partitioned_cols按证券分区，每只债券一个目录）
+    bucket_by = Dimension.INSTRUMENT_CODE
+    bucket_count = 32
 
     schema = pa.schema([
         pa.field(Dimension.INSTRUMENT_CODE, pa.string(),
@@ -194,7 +197,8 @@ class BondValCNBD(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False):
+                is_init=False,
+                is_incremental=False, **kws):
         """增加secu_code资源过滤"""
         return super(BondValCNBD, cls).run_etl(
             secu_codes=secu_codes,
@@ -202,7 +206,8 @@ class BondValCNBD(MarketData):
             end_date=end_date,
             is_concurrent_query=is_concurrent_query,
             is_concurrent_save=is_concurrent_save,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
@@ -14,7 +14,10 @@ __all__ = ['BondValCSI']
 
 class BondValCSI(MarketData):
     """债券市场数据"""
-    partitioned_cols = [Dimension.INSTRUMENT_CODE]
+    depends_on = ('CombPosition',)
+    # 按证券分桶（原partitioned_cols按证券分区，每只债券一个目录）
+    bucket_by = Dimension.INSTRUMENT_CODE
+    bucket_count = 32
     schema = pa.schema([
         pa.field(Dimension.INSTRUMENT_CODE, pa.string(),
                  metadata={b'table_field': b'BOND_CODE', b'table_name': b'INFO_FI_VAL_CSI'}),
@@ -140,7 +143,8 @@ class BondValCSI(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False):
+                is_init=False,
+                is_incremental=False, **kws):
         """增加secu_code资源过滤"""
         return super(BondValCSI, cls).run_etl(
             secu_codes=secu_codes,
@@ -148,7 +152,8 @@ class BondValCSI(MarketData):
             end_date=end_date,
             is_concurrent_query=is_concurrent_query,
             is_concurrent_save=is_concurrent_save,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
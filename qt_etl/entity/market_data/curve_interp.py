@@ -0,0 +1,111 @@
+# vim set fileencoding=utf-8
+"""曲线插值：曲线按 日期 × 标准期限 转为矩阵，所有日期一次插值到统一的期限网格"""
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from qt_etl.constants import InterpMethod
+from qt_etl.entity.fields import Dimension, Measure
+
+__all__ = ['tenor_grid', 'interp_matrix', 'interp_curves']
+
+
+def tenor_grid(max_tenor: float, days_per_year: int = 365, decimals: int = 2) -> np.ndarray:
+    """
+    按日的期限网格（年），保留两位小数后去重
+    :param max_tenor: 最长期限（年）
+    """
+    return np.array(sorted({round(i / days_per_year, decimals) for i in range(int(max_tenor * days_per_year + 1))}))
+
+
+def _linear(terms: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """按行线性插值，两端外推取端点值（与np.interp一致）"""
+    if len(terms) == 1:
+        return np.repeat(values, len(grid), axis=1)
+    right = np.clip(np.searchsorted(terms, grid, side='right'), 1, len(terms) - 1)
+    left = right - 1
+    weight = np.clip((grid - terms[left]) / (terms[right] - terms[left]), 0, 1)
+    return values[:, left] * (1 - weight) + values[:, right] * weight
+
+
+def _cubic(terms: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """按行三次样条插值，期限范围外取端点值"""
+    if len(terms) < 3:
+        return _linear(terms, values, grid)
+    from scipy.interpolate import CubicSpline
+    spline = CubicSpline(terms, values, axis=1)
+    return spline(np.clip(grid, terms[0], terms[-1]))
+
+
+def _flat_forward(terms: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """按行对 rate * tenor 线性插值（区间内远期利率为常数），期限范围外取端点利率"""
+    res = _linear(terms, values * terms, grid)
+    inner = (grid > terms[0]) & (grid < terms[-1])
+    res[:, inner] /= grid[inner]
+    res[:, grid <= terms[0]] = values[:, [0]]
+    res[:, grid >= terms[-1]] = values[:, [-1]]
+    return res
+
+
+_INTERP_FUNCS = {
+    InterpMethod.linear: _linear,
+    InterpMethod.cubic: _cubic,
+    InterpMethod.flat_forward: _flat_forward,
+}
+
+
+def interp_matrix(terms, values, grid, method: Union[str, InterpMethod] = InterpMethod.linear) -> np.ndarray:
+    """
+    矩阵插值
+    :param terms: 标准期限（升序），shape (n_terms,)
+    :param values: 利率矩阵，shape (n_dates, n_terms)，缺失为nan
+    :param grid: 期限网格，shape (n_grid,)
+    :param method: linear|cubic|flat_forward
+    :return: shape (n_dates, n_grid)，某日期全部缺失时为nan
+    """
+    interp = _INTERP_FUNCS[InterpMethod(method)]
+    terms = np.asarray(terms, dtype=float)
+    values = np.asarray(values, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    res = np.full((len(values), len(grid)), np.nan)
+    # 各日期的期限点可能不同，按缺失情况分组，同组一次插值
+    masks, group_ids = np.unique(~np.isnan(values), axis=0, return_inverse=True)
+    for group_id, mask in enumerate(masks):
+        if not mask.any():
+            continue
+        rows = np.flatnonzero(group_ids.reshape(-1) == group_id)
+        res[rows] = interp(terms[mask], values[np.ix_(rows, mask)], grid)
+    return res
+
+
+def interp_curves(df: pd.DataFrame, method: Union[str, InterpMethod] = InterpMethod.linear) -> pd.DataFrame:
+    """
+    曲线插值到按日的期限网格
+    :param df: 列 index、trade_date、tenor（年）、rate
+    :param method: linear|cubic|flat_forward
+    :return: 每条曲线每个期限一行，列 tenor、index、各交易日
+    """
+    res = []
+    for idx, idx_data in df.groupby(Dimension.INDEX, sort=True):
+        matrix = idx_data.drop_duplicates(subset=[Dimension.TRADE_DATE, Dimension.TENOR], keep='last').pivot(
+            index=Dimension.TRADE_DATE, columns=Dimension.TENOR, values=Measure.RATE).sort_index().sort_index(axis=1)
+        grid = tenor_grid(matrix.columns.max())
+        values = interp_matrix(matrix.columns.to_numpy(), matrix.to_numpy(), grid, method)
+        data = {Dimension.TENOR: grid, Dimension.INDEX: np.full(len(grid), idx, dtype=object)}
+        data.update(zip(matrix.index, values))
+        res.append(pd.DataFrame(data))
+    if not res:
+        return pd.DataFrame()
+    return pd.concat(res, ignore_index=True)
+
+
+if __name__ == '__main__':
+    _df = pd.DataFrame({
+        Dimension.INDEX: ['CBD100222'] * 5,
+        Dimension.TRADE_DATE: ['2022-01-04'] * 3 + ['2022-01-05'] * 2,
+        Dimension.TENOR: [0.0, 1.0, 3.0, 0.0, 3.0],
+        Measure.RATE: [0.015, 0.02, 0.025, 0.016, 0.026],
+    })
+    for _method in InterpMethod:
+        print(_method.value, interp_curves(_df, _method).iloc[[0, 182, 365, 730, -1]], sep='\n')
@@ -7,7 +7,6 @@ from typing import Optional, Union
 import pandas as pd
 import pyarrow as pa
 import json
-from math import log
 
 from qt_common.utils import date_to_str, str_to_date
 from qt_etl.entity.fields import Dimension, Measure
@@ -22,6 +21,7 @@ __all__ = ["FundDailyQuote"]
 
 class FundDailyQuote(MarketData):
     """基金市场数据"""
+    depends_on = ('CombPosition', 'QtCalendar')
     partitioned_by_date = PartitionByDateType.month
     schema = pa.schema([
         pa.field(Dimension.INSTRUMENT_CODE, pa.string(), metadata={b'source_table': json.dumps(
@@ -97,17 +97,8 @@ class FundDailyQuote(MarketData):
         df = pd.concat([df_fund, df_portfolio])
 
         if not df.empty:
-            # t-1日复权单位净值
-            df[Measure.PREV_CLOSE_ADJUSTED] = df.groupby([Dimension.INSTRUMENT_CODE])[Measure.CLOSE_ADJUSTED].shift(1)
-            # t日收益率 =（t日复权单位净值 / t-1日复权单位净值）-1
-            df[Measure.RETURN_PERCENTAGE_ADJUSTED] = df.apply(
-                lambda row: row[Measure.CLOSE_ADJUSTED] / row[Measure.PREV_CLOSE_ADJUSTED] - 1 if (
-                        row[Measure.CLOSE_ADJUSTED] and row[Measure.PREV_CLOSE_ADJUSTED]) else None, axis=1)
-            # 都为null时，存文件会报错
-            df[Measure.RETURN_PERCENTAGE_ADJUSTED] = df[Measure.RETURN_PERCENTAGE_ADJUSTED].astype(float)
-            df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG] = df[Measure.RETURN_PERCENTAGE_ADJUSTED].apply(
-                lambda x: log(x + 1) if x is not None else None)
-            df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG] = df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG].astype(float)
+            # t-1日复权单位净值按产品位移，t日收益率 =（t日复权单位净值 / t-1日复权单位净值）-1
+            df = cls.add_returns(df, group_by=Dimension.INSTRUMENT_CODE)
             df = df.drop(columns=Measure.PREV_CLOSE_ADJUSTED)
         return df
 
@@ -318,14 +309,16 @@ class FundDailyQuote(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False):
-        super(FundDailyQuote, cls).run_etl(
+                is_init=False,
+                is_incremental=False, **kws):
+        return super(FundDailyQuote, cls).run_etl(
             secu_codes=secu_codes,
             start_date=start_date,
             end_date=end_date,
             is_concurrent_save=is_concurrent_save,
             is_concurrent_query=is_concurrent_query,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
@@ -1,16 +1,98 @@
 # vim set fileencoding=utf-8
 """汇率关系表"""
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Optional, Union, List
 
+import numpy as np
+import pandas as pd
 import pyarrow as pa
 
 from qt_common import utils
-from qt_common.utils import PandasMixin
-from qt_etl.entity.fields import Dimension, Measure
+from qt_etl.entity.fields import Dimension, Measure, Currency
 from qt_etl.entity.market_data.market_data import MarketData
 
-__all__ = ["FxExchRate"]
+__all__ = ["FxExchRate", "FxRateCube"]
+
+
+class FxRateCube:
+    """
+    汇率立方：日期 × 币种 的折人民币汇率矩阵，未发布汇率的日期沿用之前最近一次的汇率
+    币种a转换为币种b的倍数 = to_cny[a] / to_cny[b]（直接、反向、经人民币交叉汇率统一处理）
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        :param df: 汇率数据 trade_date、fx_code(如USDCNY)、exch_rate
+        """
+        cny = Currency.CNY.value
+        df = df[df[Measure.EXCH_RATE].notna() & (df[Measure.EXCH_RATE] != 0)]
+        df = df.drop_duplicates(subset=[Dimension.TRADE_DATE, Dimension.FX_CODE])
+        rates = df.pivot(index=Dimension.TRADE_DATE, columns=Dimension.FX_CODE, values=Measure.EXCH_RATE)
+        rates.index = pd.to_datetime(rates.index)
+        rates = rates.sort_index()
+
+        fx_codes = rates.columns.astype(str)
+        currencies = sorted({c for code in fx_codes for c in (code[:3], code[3:]) if len(code) == 6} - {cny})
+        to_cny = pd.DataFrame(np.nan, index=rates.index, columns=currencies)
+        for currency in currencies:
+            # 优先直接汇率 XXXCNY，其次反向汇率 CNYXXX
+            if currency + cny in rates.columns:
+                to_cny[currency] = rates[currency + cny]
+            if cny + currency in rates.columns:
+                to_cny[currency] = to_cny[currency].fillna(1 / rates[cny + currency])
+        to_cny[cny] = 1.0
+        to_cny = to_cny.ffill()
+
+        self.dates = to_cny.index.values.astype('datetime64[D]')
+        self.currencies = pd.Index(to_cny.columns)
+        # 首次发布之前没有汇率，与原逻辑一致按1处理
+        self.to_cny = to_cny.fillna(1.0).to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def factor(self, trade_dates, from_currencies, to_currency: Union[str, Currency]) -> np.ndarray:
+        """
+        汇率换算倍数
+        :param trade_dates: 日期数组
+        :param from_currencies: 持仓币种数组，为空或未知币种时倍数为1
+        :param to_currency: 目标币种
+        """
+        trade_dates = pd.to_datetime(pd.Series(trade_dates)).values.astype('datetime64[D]')
+        from_currencies = pd.Series(from_currencies, dtype=object).to_numpy()
+        res = np.ones(len(trade_dates))
+        if not len(self.dates) or not len(trade_dates):
+            return res
+        # as-of：取日期当日或之前最近一次的汇率
+        rows = np.searchsorted(self.dates, trade_dates, side='right') - 1
+        from_columns = self.currencies.get_indexer(from_currencies)
+        to_column = self.currencies.get_indexer([str(to_currency)])[0]
+        valid = (rows >= 0) & (from_columns >= 0) & (from_currencies != str(to_currency))
+        rates = self.to_cny[rows[valid], from_columns[valid]]
+        if to_column >= 0:
+            rates = rates / self.to_cny[rows[valid], to_column]
+        res[valid] = rates
+        return res
+
+    def convert(self, df: pd.DataFrame, to_currency: Union[str, Currency],
+                columns=(Measure.MARKET_VALUE,),
+                date_column: str = Dimension.TRADE_DATE,
+                currency_column: str = Dimension.CURRENCY) -> pd.DataFrame:
+        """
+        金额字段换算为目标币种
+        :param df: 持仓等数据
+        :param to_currency: 目标币种
+        :param columns: 要换算的金额字段
+        :param date_column: 日期字段
+        :param currency_column: 币种字段
+        """
+        if df.empty:
+            return df
+        factor = self.factor(df[date_column].to_numpy(), df[currency_column].to_numpy(), to_currency)
+        df = df.copy()
+        for column in columns:
+            df[column] = df[column].to_numpy(dtype=float) * factor
+        return df
 
 
 class FxExchRate(MarketData):
@@ -62,17 +144,29 @@ class FxExchRate(MarketData):
         :param end_date: 开始时间，结束时间
         :return: Dict[str, Dict[str, float]]
         """
-        date_df_g = FxExchRate.get_data(
-            start_date=start_date, end_date=end_date,
-            decoder=lambda x: PandasMixin.df_group(x, by=Dimension.TRADE_DATE))
+        df = FxExchRate.get_data(start_date=start_date, end_date=end_date,
+                                 columns=[Dimension.TRADE_DATE, Dimension.FX_CODE, Measure.EXCH_RATE])
+        df = df.drop_duplicates(subset=[Dimension.TRADE_DATE, Dimension.FX_CODE])
         date_fx_rate_g = {}
-        for trd_date, g in date_df_g.items():
-            if trd_date not in date_fx_rate_g:
-                date_fx_rate_g[trd_date] = {}
-            for f, _g in g.groupby(Dimension.FX_CODE):
-                date_fx_rate_g[trd_date][f] = _g[Measure.EXCH_RATE].iloc[0]
+        for trd_date, fx_code, exch_rate in zip(df[Dimension.TRADE_DATE], df[Dimension.FX_CODE],
+                                                df[Measure.EXCH_RATE]):
+            date_fx_rate_g.setdefault(trd_date, {})[fx_code] = exch_rate
         return date_fx_rate_g
 
+    @staticmethod
+    def get_rate_cube(start_date=None, end_date=None, lookback_days: int = 31) -> FxRateCube:
+        """
+        汇率立方
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param lookback_days: 开始日期向前多取的天数，使开始日期附近未发布汇率的日期也能沿用之前的汇率
+        """
+        if start_date:
+            start_date = utils.str_to_date(start_date) - timedelta(days=lookback_days)
+        df = FxExchRate.get_data(start_date=start_date, end_date=end_date,
+                                 columns=[Dimension.TRADE_DATE, Dimension.FX_CODE, Measure.EXCH_RATE])
+        return FxRateCube(df)
+
 
 if __name__ == '__main__':
     FxExchRate.run_etl(is_init=True)
@@ -19,6 +19,7 @@ __all__ = ["IndexRate"]
 
 class IndexRate(MarketData):
     """参考利率"""
+    depends_on = ('YieldCurveCNBDSample',)
     partitioned_by_date = PartitionByDateType.month
     name_source_table = {
         "INFO_FI_CNBD_YIELD_CURV": "CURV_CNAME",
@@ -233,14 +234,16 @@ class IndexRate(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False):
+                is_init=False,
+                is_incremental=False, **kws):
         return super(IndexRate, cls).run_etl(
             secu_codes=secu_codes,
             start_date=start_date,
             end_date=end_date,
             is_concurrent_query=is_concurrent_query,
             is_concurrent_save=is_concurrent_save,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
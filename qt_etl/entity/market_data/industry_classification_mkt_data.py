@@ -111,19 +111,12 @@ class IndustryClassificationMktData(MarketData):
 
     @classmethod
     def append_stock_sector(cls, df_stock, industry_code):
-        # 根据df_stock.issuer_code, and df_stock.trade_date >= df_ind.start_date过滤df_ind，然后选择最后一个（日期最近的）
+        # 根据df_stock.issuer_code, and df_stock.trade_date >= df_ind.start_date，选择日期最近的一条行业分类
         try:
             df_ind = cls.get_all_industry_data()
             df_ind = df_ind[(df_ind[Dimension.INDUSTRY_CODE] == industry_code) & (
                 df_ind[Dimension.ISSUER_CODE].isin(df_stock[Dimension.ISSUER_CODE].tolist()))]
-            dfs = []
-            for d, g in df_stock.groupby(Dimension.TRADE_DATE):
-                df_ind_t = df_ind[df_ind[Dimension.TRADE_DATE] <= d]
-                df_ind_t = df_ind_t.drop_duplicates(subset=[Dimension.ISSUER_CODE], keep='last')
-                df_ind_t = df_ind_t[[Dimension.ISSUER_CODE, Dimension.SECTOR_CODE]]
-                dfs.append(g.merge(df_ind_t, how='left', on=[Dimension.ISSUER_CODE]))
-
-            return pd.concat(dfs)
+            return cls.asof_join(df_stock, df_ind, by=Dimension.ISSUER_CODE, columns=[Dimension.SECTOR_CODE])
         except Exception as e:
             a = e
             return pd.DataFrame()
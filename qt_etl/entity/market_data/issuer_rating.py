@@ -3,8 +3,6 @@
 from datetime import date, datetime
 from typing import Optional, Union
 
-import pandas as pd
-
 from qt_common.qt_logging import frame_log
 from qt_common.utils import date_to_str
 from qt_etl.entity.fields import Dimension
@@ -37,18 +35,11 @@ class IssuerRating(MarketData):
 
     @classmethod
     def append_rating(cls, df):
-        # df.issuer_code, and df.trade_date >= df_issuer_rating.start_date过滤，然后选择最后一个（日期最近的）
+        # df.issuer_code, and df.trade_date >= df_issuer_rating.trade_date，选择日期最近的一条评级
         try:
             if not df.empty and Dimension.TRADE_DATE in df.columns:
-                dfs = []
                 df_issuer_rating = cls.get_data()
-                for d, g in df.groupby(Dimension.TRADE_DATE):
-                    df_t = df_issuer_rating[df_issuer_rating[Dimension.TRADE_DATE] <= d]
-                    df_t = df_t.drop_duplicates(subset=[Dimension.ISSUER_CODE], keep='last')
-                    df_t = df_t[[Dimension.ISSUER_CODE, Dimension.RATING]]
-                    dfs.append(g.merge(df_t, how='left', on=[Dimension.ISSUER_CODE]))
-                if dfs:
-                    return pd.concat(dfs)
+                return cls.asof_join(df, df_issuer_rating, by=Dimension.ISSUER_CODE, columns=[Dimension.RATING])
             else:
                 return df
         except Exception as e:
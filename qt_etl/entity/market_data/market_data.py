@@ -1,8 +1,90 @@
 # vim set fileencoding=utf-8
 
+import numpy as np
+import pandas as pd
+
 from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.fields import Dimension, Measure
 
 
 class MarketData(EntityBase):
     """市场数据"""
     partitioned_by_date = None
+
+    @staticmethod
+    def simple_return(close, prev_close) -> np.ndarray:
+        """
+        收益率 close / prev_close - 1，任一价格为0时为空（空值参与计算结果仍为空）
+        :param close: t日价格
+        :param prev_close: t-1日价格
+        """
+        close = np.asarray(close, dtype=float)
+        prev_close = np.asarray(prev_close, dtype=float)
+        valid = (close != 0) & (prev_close != 0)
+        res = np.full(close.shape, np.nan)
+        np.divide(close, prev_close, out=res, where=valid)
+        res[valid] -= 1
+        return res
+
+    @staticmethod
+    def log_return(returns) -> np.ndarray:
+        """对数收益率 log(1 + r)，r为空或不大于-1时为空"""
+        returns = np.asarray(returns, dtype=float)
+        res = np.full(returns.shape, np.nan)
+        np.log1p(returns, out=res, where=returns > -1)
+        return res
+
+    @staticmethod
+    def group_shift(values, keys, periods: int = 1) -> np.ndarray:
+        """
+        分组位移，等价于 df.groupby(keys)[values].shift(periods)：组内按出现顺序位移，分组键为空时结果为空
+        :param values: 要位移的值
+        :param keys: 分组键
+        :param periods: 位移行数（>0）
+        """
+        values = np.asarray(values, dtype=float)
+        res = np.full(values.shape, np.nan)
+        if periods <= 0 or len(values) <= periods:
+            return res
+        codes, _ = pd.factorize(np.asarray(keys, dtype=object))
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        shifted = np.full(values.shape, np.nan)
+        shifted[periods:] = values[order][:-periods]
+        # 跨组的位移置空
+        same_group = np.zeros(values.shape, dtype=bool)
+        same_group[periods:] = (sorted_codes[periods:] == sorted_codes[:-periods]) & (sorted_codes[periods:] >= 0)
+        shifted[~same_group] = np.nan
+        res[order] = shifted
+        return res
+
+    @classmethod
+    def add_returns(cls, df: pd.DataFrame,
+                    close_column: str = Measure.CLOSE_ADJUSTED,
+                    prev_close_column: str = Measure.PREV_CLOSE_ADJUSTED,
+                    return_column: str = Measure.RETURN_PERCENTAGE_ADJUSTED,
+                    log_return_column: str = Measure.RETURN_PERCENTAGE_ADJUSTED_LOG,
+                    group_by: str = None) -> pd.DataFrame:
+        """
+        计算收益率、对数收益率列
+        :param df:
+        :param close_column: t日价格列
+        :param prev_close_column: t-1日价格列
+        :param return_column: 收益率列
+        :param log_return_column: 对数收益率列，为None时不计算
+        :param group_by: 不为空时按该列分组位移close_column得到prev_close_column
+        """
+        if group_by:
+            df[prev_close_column] = cls.group_shift(df[close_column].to_numpy(), df[group_by].to_numpy())
+        df[return_column] = cls.simple_return(df[close_column].to_numpy(), df[prev_close_column].to_numpy())
+        if log_return_column:
+            df[log_return_column] = cls.log_return(df[return_column].to_numpy())
+        return df
+
+
+if __name__ == '__main__':
+    _df = pd.DataFrame({
+        Dimension.INSTRUMENT_CODE: ['A', 'B', 'A', 'B', None, 'A'],
+        Measure.CLOSE_ADJUSTED: [1.0, 2.0, 1.1, 0.0, 3.0, None],
+    })
+    print(MarketData.add_returns(_df, group_by=Dimension.INSTRUMENT_CODE))
@@ -1,15 +1,78 @@
 # vim set fileencoding=utf-8
 """Calendar etl module"""
+import os
+import threading
 from datetime import datetime, date
 from typing import Optional, Union
 
+import numpy as np
 import pandas
 import pandas as pd
 
 from qt_etl.entity.fields import Dimension
 from qt_etl.entity.market_data.market_data import MarketData
 
-__all__ = ["QtCalendar"]
+__all__ = ["QtCalendar", "CalendarIndex"]
+
+
+DEFAULT_CALENDAR = 'CAL0004'
+# 进程内日历索引缓存 (状态文件修改时间, generation, {日历id: CalendarIndex})
+_calendar_indexes = None
+_calendar_lock = threading.Lock()
+
+
+class CalendarIndex:
+    """单个日历的交易日索引：升序datetime64[D]数组，searchsorted定位"""
+
+    def __init__(self, trade_dates):
+        """
+        :param trade_dates: 交易日（date/datetime/str），返回值保持原类型
+        """
+        trade_dates = pd.Series(trade_dates).dropna().drop_duplicates()
+        keys = self.to_day(trade_dates)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.values = trade_dates.to_numpy(dtype=object)[order]
+
+    @staticmethod
+    def to_day(d):
+        """转为datetime64[D]（标量或数组）"""
+        if isinstance(d, (pd.Series, np.ndarray, list)):
+            return pd.to_datetime(d).values.astype('datetime64[D]')
+        return np.datetime64(pd.Timestamp(d), 'D')
+
+    def __len__(self):
+        return len(self.values)
+
+    def prev(self, trade_date, num=1):
+        """trade_date及之前的第num个交易日，不足时返回第一个交易日"""
+        i = np.searchsorted(self.keys, self.to_day(trade_date), side='right') - 1
+        if i < 0:
+            return None
+        return self.values[max(i - num, 0)]
+
+    def next(self, trade_date, num=0):
+        """trade_date及之后的第num个交易日，不足时返回最后一个交易日"""
+        i = np.searchsorted(self.keys, self.to_day(trade_date), side='left')
+        if i >= len(self.keys):
+            return None
+        return self.values[min(i + num, len(self.keys) - 1)]
+
+    def prev_list(self, trade_date, num=None) -> list:
+        """trade_date及之前的num+1个交易日（倒序），num为空时返回之前的全部"""
+        i = np.searchsorted(self.keys, self.to_day(trade_date), side='right')
+        start = max(i - num - 1, 0) if num else 0
+        return list(self.values[start:i][::-1])
+
+    def between(self, start_date=None, end_date=None) -> np.ndarray:
+        """start_date、end_date之间（含两端）的交易日（升序）"""
+        i = np.searchsorted(self.keys, self.to_day(start_date), side='left') if start_date else 0
+        j = np.searchsorted(self.keys, self.to_day(end_date), side='right') if end_date else len(self.keys)
+        return self.values[i:j]
+
+    def count(self, start_date=None, end_date=None) -> int:
+        """start_date、end_date之间（含两端）的交易日数"""
+        return len(self.between(start_date, end_date))
 
 
 class QtCalendar(MarketData):
@@ -70,44 +133,73 @@ class QtCalendar(MarketData):
             data = data[(data.CALENDAR_DATE <= end_date)]
         return data
 
+    @classmethod
+    def get_calendar_index(cls, calendar_id=DEFAULT_CALENDAR) -> Optional['CalendarIndex']:
+        """
+        日历索引，进程内缓存，etl重新写入(generation变化)后自动重新加载
+        :param calendar_id: 日历id，CAL0004为默认日历
+        :return: 日历不存在时返回None
+        """
+        return cls.load_calendar_indexes().get(calendar_id)
+
+    @classmethod
+    def load_calendar_indexes(cls) -> dict:
+        global _calendar_indexes
+        # 先比较状态文件修改时间，未变化时不读取状态文件
+        state_path = cls.get_etl_state_path()
+        state_mtime = os.stat(state_path).st_mtime_ns if os.path.exists(state_path) else None
+        cached = _calendar_indexes
+        if cached and cached[0] == state_mtime:
+            return cached[2]
+        with _calendar_lock:
+            generation = cls.get_generation()
+            cached = _calendar_indexes
+            if cached and cached[1] == generation:
+                _calendar_indexes = (state_mtime, generation, cached[2])
+                return cached[2]
+            data = cls.get_data()
+            indexes = {}
+            if not data.empty:
+                sections = data.index.get_level_values(0)
+                all_df = data[sections == 'ALL']
+                for calendar_id, g in all_df.groupby('CALENDAR_ID'):
+                    indexes[calendar_id] = CalendarIndex(g['CALENDAR_DATE'])
+                indexes[DEFAULT_CALENDAR] = CalendarIndex(data[sections == DEFAULT_CALENDAR]['CALENDAR_DATE'])
+            _calendar_indexes = (state_mtime, generation, indexes)
+            return indexes
+
     @staticmethod
-    def get_prev_biz_date(trade_date, num=1, calendar_id='CAL0004'):
+    def get_prev_biz_date(trade_date, num=1, calendar_id=DEFAULT_CALENDAR):
+        """
+        前第num个交易日（trade_date为交易日时计为第0个），num<0时为后第|num|个，num=0时为trade_date当日或之后的第一个交易日
+        超出日历范围时返回日历首/末日，没有数据时返回None
+        """
+        index = QtCalendar.get_calendar_index(calendar_id)
+        if index is None:
+            return None
         if num > 0:
-            calendar_df = QtCalendar.get_data(end_date=trade_date)
-        else:
-            calendar_df = QtCalendar.get_data(start_date=trade_date)
-        if calendar_id == 'CAL0004':
-            trade_date_df = calendar_df.loc['CAL0004']
-        else:
-            trade_date_df = calendar_df[calendar_df['CALENDAR_ID'] == calendar_id]
-        if len(trade_date_df):
-            if num >= 0:
-                trade_date_df = trade_date_df.sort_values(by='CALENDAR_DATE', ascending=False)
-            else:
-                trade_date_df = trade_date_df.sort_values(by='CALENDAR_DATE', ascending=True)
-        if num:
-            trade_date_df = trade_date_df.iloc[:abs(num) + 1]
-        trade_date_list = QtCalendar.as_list(trade_date_df)
-        if len(trade_date_list):
-            return trade_date_list[-1]
-        return None
+            return index.prev(trade_date, num)
+        return index.next(trade_date, -num)
 
     @staticmethod
-    def get_prev_biz_date_list(trade_date, num=252, calendar_id='CAL0004'):
-        calendar_df = QtCalendar.get_data(end_date=trade_date)
-        if calendar_id == 'CAL0004':
-            trade_date_df = calendar_df.loc['CAL0004']
-        else:
-            trade_date_df = calendar_df[calendar_df['CALENDAR_ID'] == calendar_id]
-        if len(trade_date_df):
-            trade_date_df = trade_date_df.sort_values(by='CALENDAR_DATE', ascending=False)
-        if num:
-            trade_date_df = trade_date_df.iloc[:num + 1]
-        trade_date_list = QtCalendar.as_list(trade_date_df)
+    def get_prev_biz_date_list(trade_date, num=252, calendar_id=DEFAULT_CALENDAR):
+        """trade_date及之前的num+1个交易日（倒序），num为空时返回之前的全部交易日"""
+        index = QtCalendar.get_calendar_index(calendar_id)
+        if index is None:
+            return None
+        trade_date_list = index.prev_list(trade_date, num)
         if len(trade_date_list):
             return trade_date_list
         return None
 
+    @staticmethod
+    def get_biz_days_between(start_date, end_date, calendar_id=DEFAULT_CALENDAR) -> int:
+        """start_date、end_date之间（含两端）的交易日数"""
+        index = QtCalendar.get_calendar_index(calendar_id)
+        if index is None:
+            return 0
+        return index.count(start_date, end_date)
+
     @staticmethod
     def get_trade_date_by_calendar_id(
             start_date=None, end_date=None, calendar_id="CAL0002"
@@ -3,7 +3,6 @@
 import json
 from datetime import date, datetime
 from typing import Optional, Union, List
-from math import log
 import pyarrow as pa
 
 from qt_common.qt_logging import frame_log as logger
@@ -17,6 +16,10 @@ __all__ = ["StockDailyQuote"]
 
 class StockDailyQuote(MarketData):
     """股票市场数据"""
+    depends_on = ('CombPosition',)
+    # 行情主表按日探测行数；fetch_data会追加指数成分股代码，不按代码拆分
+    PLAN_TABLE = 'INFO_STK_EODPRICE'
+    PLAN_DATE_COLUMN = 'END_DATE'
     party_code_source_table = {
         "INFO_STK_EODPRICE": "PARTY_CODE",
         "INFO_PARTY_SHRSTRUC": "PARTY_CODE",
@@ -130,14 +133,8 @@ class StockDailyQuote(MarketData):
         logger.info(f'length of stock market data after merge with structure change is {len(df_stock)}')
         df[Measure.RETURN_PERCENTAGE] /= 100
         df[Measure.DIVIDEND_YIELD] /= 100
-        df[Measure.RETURN_PERCENTAGE_ADJUSTED] = df.apply(
-            lambda row: row[Measure.CLOSE_ADJUSTED] / row[Measure.PREV_CLOSE_ADJUSTED] - 1 if (
-                    row[Measure.CLOSE_ADJUSTED] and row[Measure.PREV_CLOSE_ADJUSTED]) else None, axis=1)
-        # 都为null时，存文件会报错
-        df[Measure.RETURN_PERCENTAGE_ADJUSTED] = df[Measure.RETURN_PERCENTAGE_ADJUSTED].astype(float)
-        df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG] = df[Measure.RETURN_PERCENTAGE_ADJUSTED].apply(
-            lambda x: log(x + 1) if x is not None else None)
-        df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG] = df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG].astype(float)
+        # 复权收益率、对数收益率
+        df = cls.add_returns(df)
 
         df[Dimension.TRADE_DATE] = df[Dimension.TRADE_DATE].apply(date_to_str)
         df[Dimension.DUE_DATE] = df[Dimension.DUE_DATE].apply(date_to_str)
@@ -267,14 +264,16 @@ class StockDailyQuote(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=True,
                 is_concurrent_save=False,
-                is_init=False):
-        super(StockDailyQuote, cls).run_etl(
+                is_init=False,
+                is_incremental=False, **kws):
+        return super(StockDailyQuote, cls).run_etl(
             secu_codes=secu_codes,
             start_date=start_date,
             end_date=end_date,
             is_concurrent_save=is_concurrent_save,
             is_concurrent_query=is_concurrent_query,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
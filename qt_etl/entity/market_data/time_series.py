@@ -1,11 +1,12 @@
 from datetime import date, datetime
 from typing import Optional, Union
 
-import numpy as np
 import pandas as pd
 
 from qt_common.utils import date_to_str
+from qt_etl.constants import InterpMethod
 from qt_etl.entity.market_data import StockDailyQuote, FundDailyQuote
+from qt_etl.entity.market_data.curve_interp import interp_curves
 from qt_etl.entity.market_data.market_data import MarketData
 from qt_etl.entity.market_data.yield_curve_cnbd_sample import curve_code_decorator
 from qt_etl.entity.fields import Dimension, Measure, InstrumentType, Currency, TimeSeriesType
@@ -13,6 +14,7 @@ from qt_etl.entity.fields import Dimension, Measure, InstrumentType, Currency, T
 
 class TimeSeries(MarketData):
     """曲线插值"""
+    depends_on = ('StockDailyQuote', 'FundDailyQuote', 'YieldCurveCNBDSample')
     model_dict = {
         StockDailyQuote.__name__: StockDailyQuote,
         FundDailyQuote.__name__: FundDailyQuote
@@ -44,8 +46,12 @@ class TimeSeries(MarketData):
         return df
 
     @classmethod
-    def get_curve_time_series(cls, start_date, end_date, curve_codes):
-        # 插值
+    def get_curve_time_series(cls, start_date, end_date, curve_codes,
+                              method: Union[str, InterpMethod] = InterpMethod.linear):
+        """
+        中债收益率曲线插值到按日的期限网格
+        :param method: 插值方法 linear|cubic|flat_forward
+        """
         sql = f"""SELECT CURV_CODE,
                          TRD_DATE,
                          STD_TERM,
@@ -67,18 +73,8 @@ class TimeSeries(MarketData):
             df[Measure.RATE] = df[Measure.RATE].astype(float) / 100
             df[Dimension.TRADE_DATE] = df[Dimension.TRADE_DATE].apply(date_to_str)
             df[Dimension.TENOR] = df[Dimension.TENOR].astype(float)
-            df_interperted = pd.DataFrame()
-            df_interperted = df_interperted.dropna(how='all')
-            for idx, idx_data in df.groupby(Dimension.INDEX):
-                tenor_list = [round(i / 365, 2) for i in range(int(max(idx_data[Dimension.TENOR]) * 365 + 1))]
-                index_interp_data = pd.DataFrame(set(tenor_list), columns=[Dimension.TENOR])
-                index_interp_data[Dimension.INDEX] = idx
-                for trd_date, index_data_day in idx_data.groupby(Dimension.TRADE_DATE):
-                    interp_index_data_day = pd.Series(np.interp(index_interp_data[Dimension.TENOR],
-                                                                index_data_day[Dimension.TENOR],
-                                                                index_data_day[Dimension.RATE]), name=trd_date)
-                    index_interp_data = pd.concat([index_interp_data, interp_index_data_day], axis=1)
-                df_interperted = pd.concat([df_interperted, index_interp_data]).reset_index(drop=True)
+            # 所有日期批量插值到按日的期限网格
+            df_interperted = interp_curves(df, method)
             df_interperted[Dimension.TENOR] = df_interperted[Dimension.TENOR].astype(str) + 'Y'
             df_interperted[Dimension.TIME_SERIES_TYPE] = TimeSeriesType.YIELD_CURVE.name
             return df_interperted
@@ -139,7 +135,10 @@ class TimeSeries(MarketData):
             parms['start_date'] = start_date
         if end_date is not None:
             parms['end_date'] = end_date
-        df = model.get_data(**parms)
+        # 只读取需要的字段，不加载整个行情表
+        parms['columns'] = [Dimension.INSTRUMENT_CODE, Dimension.TRADE_DATE,
+                            Measure.CLOSE_ADJUSTED, Measure.RETURN_PERCENTAGE_ADJUSTED]
+        df = model.get_table(**parms).to_pandas()
         if not df.empty:
             df_price = cls.transform(df, TimeSeriesType.ADJUSTED_PRICE.name)
             df_return = cls.transform(df, TimeSeriesType.ADJUSTED_RETURN.name)
@@ -323,14 +322,16 @@ class TimeSeries(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False):
+                is_init=False,
+                is_incremental=False, **kws):
         return super(TimeSeries, cls).run_etl(
             secu_codes=secu_codes,
             start_date=start_date,
             end_date=end_date,
             is_concurrent_query=is_concurrent_query,
             is_concurrent_save=is_concurrent_save,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
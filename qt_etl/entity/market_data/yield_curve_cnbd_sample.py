@@ -16,6 +16,7 @@ import pyarrow as pa
 
 class YieldCurveCNBDSample(MarketData):
     """债券曲线样本券数据"""
+    depends_on = ('CombPosition',)
     schema = pa.schema([
         pa.field(Dimension.INDEX, pa.string(),
                  metadata={b'table_field': b'CURV_CODE', b'table_name': b'INFO_FI_YC_CNBD_SAMPLE'}),
@@ -83,14 +84,16 @@ class YieldCurveCNBDSample(MarketData):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=True,
                 is_concurrent_save=False,
-                is_init=False):
-        super(YieldCurveCNBDSample, cls).run_etl(
+                is_init=False,
+                is_incremental=False, **kws):
+        return super(YieldCurveCNBDSample, cls).run_etl(
             secu_codes=secu_codes,
             start_date=start_date,
             end_date=end_date,
             is_concurrent_save=is_concurrent_save,
             is_concurrent_query=is_concurrent_query,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 def curve_code_decorator(func):
@@ -103,6 +106,7 @@ def curve_code_decorator(func):
         end_date = call_args.get('end_date') or date.today()
         call_args["start_date"] = start_date
         call_args["end_date"] = end_date
+        is_default_universe = not secu_codes
         if not secu_codes:
             df_curve = YieldCurveCNBDSample.get_data()
             secu_codes = [] if df_curve.empty else df_curve[Dimension.INDEX].unique().tolist()
@@ -125,6 +129,9 @@ def curve_code_decorator(func):
         arg_spec = inspect.getfullargspec(func)
         vargs = []
         kws = call_args.pop(arg_spec.varkw, {})
+        if is_default_universe and func.__name__ == 'run_etl' and arg_spec.varkw:
+            # 默认证券范围（当前持仓）即模型的全部证券，run_etl推进水位线，新进入持仓的证券由run_etl补齐历史数据
+            kws.setdefault('is_full_universe', True)
         for arg in arg_spec.args:
             vargs.append(call_args[arg])
         vargs.extend(call_args.get(arg_spec.varargs, []))
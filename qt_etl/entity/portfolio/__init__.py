@@ -1,6 +1,16 @@
-from .comb_position import *
-from .down_relation_info import *
-from .stock_index_portfolio import *
-from .comb_position_penetrate import CombPositionPenetrate
-from .comb_asset import CombAsset
-from .bond_position import BondPosition
+# vim set fileencoding=utf-8
+"""组合模型：按需导入，访问模型类时才导入所在模块"""
+from qt_etl.utils import lazy_exports
+
+_EXPORTS = {
+    'CombPosition': '.comb_position',
+    'resource_decorator': '.comb_position',
+    'DownRelationPortfolio': '.down_relation_info',
+    'StockIndexPortfolio': '.stock_index_portfolio',
+    'CombPositionPenetrate': '.comb_position_penetrate',
+    'CombAsset': '.comb_asset',
+    'BondPosition': '.bond_position',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(globals(), _EXPORTS)
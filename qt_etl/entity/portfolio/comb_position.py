@@ -8,6 +8,7 @@ from typing import Optional, Union, Dict
 
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
 
 from qt_common.qt_logging import frame_log
 from qt_common.utils import date_to_str, PandasMixin
@@ -207,6 +208,15 @@ class CombPosition(Portfolio):
                 sec_codes.extend(g_sec_codes)
         return sec_codes
 
+    @classmethod
+    def get_secu_code_list(cls, secu_type: Optional[Union[str, typing.Iterable]] = None):
+        """获取持仓中对应证券分类下的证券代码列表（只读取证券代码、分类两个字段）"""
+        cond = None
+        if secu_type:
+            cond = {Dimension.INSTRUMENT_TYPE: [secu_type] if isinstance(secu_type, str) else list(secu_type)}
+        table = cls.get_table(cond=cond, columns=[Dimension.INSTRUMENT_CODE])
+        return pc.drop_null(pc.unique(table[Dimension.INSTRUMENT_CODE])).to_pylist()
+
     @staticmethod
     def filter_bond_secu_type(df: pd.DataFrame):
         return df[df[Dimension.BOND_TYPE].str.contains("A02.02")]
@@ -240,6 +250,26 @@ class CombPosition(Portfolio):
             str(req_cuur), row[Dimension.CURRENCY], exch_rate_map)
         return row
 
+    @staticmethod
+    def convert_curr_exchange(df: pd.DataFrame, req_cuur: Union[str, Currency], fx_cube=None,
+                              columns=(Measure.MARKET_VALUE,)) -> pd.DataFrame:
+        """对持仓市值批量进行汇率换算-多个日期，未发布汇率的日期沿用之前最近一次的汇率
+
+        :param df: 持仓记录
+        :param req_cuur: 请求货币字段
+        :param fx_cube: 汇率立方FxRateCube，默认按持仓日期范围获取
+        :param columns: 要换算的金额字段
+        :return: 换算后的持仓记录
+        """
+        if df.empty:
+            return df
+        if fx_cube is None:
+            # market_data依赖portfolio，这里延迟导入
+            from qt_etl.entity.market_data.fx_exch_rate import FxExchRate
+            fx_cube = FxExchRate.get_rate_cube(start_date=df[Dimension.TRADE_DATE].min(),
+                                               end_date=df[Dimension.TRADE_DATE].max())
+        return fx_cube.convert(df, req_cuur, columns=columns)
+
 
 def resource_decorator(secu_type: Optional[Union[str, typing.Iterable]] = None, **extra):
     """组合证券填充
@@ -265,9 +295,9 @@ def resource_decorator(secu_type: Optional[Union[str, typing.Iterable]] = None,
             end_date = call_args.get('end_date') or date.today()
             call_args["start_date"] = start_date
             call_args["end_date"] = end_date
+            is_default_universe = not secu_codes
             if not secu_codes:
-                secu_codes = CombPosition.get_data(
-                    decoder=lambda df: CombPosition.get_secu_codes(df, secu_type))
+                secu_codes = CombPosition.get_secu_code_list(secu_type)
 
             if secu_codes:
                 # 供sql format直接使用
@@ -282,6 +312,9 @@ def resource_decorator(secu_type: Optional[Union[str, typing.Iterable]] = None,
             arg_spec = inspect.getfullargspec(func)
             vargs = []
             kws = call_args.pop(arg_spec.varkw, {})
+            if is_default_universe and func.__name__ == 'run_etl' and arg_spec.varkw:
+                # 默认证券范围（当前持仓）即模型的全部证券，run_etl推进水位线，新进入持仓的证券由run_etl补齐历史数据
+                kws.setdefault('is_full_universe', True)
             for arg in arg_spec.args:
                 vargs.append(call_args[arg])
             vargs.extend(call_args.get(arg_spec.varargs, []))
@@ -17,6 +17,7 @@ __all__ = ["CombPositionPenetrate"]
 
 class CombPositionPenetrate(Portfolio):
     """穿透后汇总组合持仓"""
+    depends_on = ('DownRelationPortfolio',)
     main_table = 'INDIC_BASE_PORT_POS_DTL'
     schema = pa.schema([
         pa.field(Dimension.BOOK_ID, pa.string(), metadata={b"table_field": b"PRD_CODE"}),
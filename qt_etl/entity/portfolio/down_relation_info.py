@@ -1,14 +1,13 @@
 # coding=utf-8
 """穿透映射关系"""
-import copy
 import os.path
 from datetime import date, datetime
-from functools import lru_cache
 from typing import Optional, Union, List, Tuple
 
 import numpy as np
 import pandas as pd
 import pyarrow as pa
+from scipy import sparse
 
 from qt_common.error import QtException
 from qt_common.qt_logging import frame_log
@@ -128,97 +127,102 @@ class DownRelationPortfolio(Portfolio):
         return df
 
     @classmethod
-    def penetrate_children_apply(cls, group_df):
-        """穿透children"""
-        row = group_df.iloc[0]
-        book_id = row[Dimension.BOOK_ID]
-        trade_date = row[Dimension.TRADE_DATE]
-        return cls.get_pid_list(book_id, trade_date, parent_ids=tuple(), invest_rates=tuple())
-
-    @classmethod
-    def get_penetrate_data(cls, book_ids=None, start_date=None, end_date=None):
+    def get_penetrate_data(cls, book_ids=None, start_date=None, end_date=None, max_depth: Optional[int] = None):
         """
         获取穿透后数据
         :param book_ids: 产品code
         :param start_date: 开始日期
         :param end_date:结束日期
+        :param max_depth: 最大穿透层数，默认穿透到底
         :return:
         """
         cond = {}
         if book_ids:
             cond = {Dimension.BOOK_ID: book_ids}
         # 穿透关系表
-        cls.df = cls.get_data(cond=cond, start_date=start_date, end_date=end_date)
-        if cls.df.empty:
+        df = cls.get_data(cond=cond, start_date=start_date, end_date=end_date)
+        if df.empty:
             frame_log.warning(f'get_penetrate_data获取穿透关系数据为空，book_ids:{book_ids}, start_date:{start_date}, end_date:{end_date}')
             return pd.DataFrame()
+        return cls.penetrate(df, max_depth=max_depth)
 
-        # 穿透
-        group_columns = [Dimension.BOOK_ID, Dimension.TRADE_DATE]
-        show_columns = [Dimension.TRADE_DATE, Dimension.CHILDREN_BOOK_ID, 'real_invest_rate', 'level1_book_id']
-        data = cls.df.groupby(group_columns, group_keys=False).apply(cls.penetrate_children_apply)[show_columns]
-        # invest_rate.sum()
-        group_columns = ['level1_book_id', Dimension.CHILDREN_BOOK_ID, Dimension.TRADE_DATE]
-        data = data.groupby(group_columns, as_index=False)['real_invest_rate'].sum()
-
-        data = data.rename(columns={'real_invest_rate': Measure.INVEST_RATE})
-
-        return data
+    @classmethod
+    def penetrate(cls, df: pd.DataFrame, max_depth: Optional[int] = None) -> pd.DataFrame:
+        """
+        多层穿透：每个日期的投资关系作为稀疏权重矩阵W（各日期构成分块对角矩阵，一次计算全部日期），
+        穿透占比为各路径占比乘积之和 W + W^2 + ... = (I - W)^-1 - I
+        :param df: 穿透关系 book_id、trade_date、children_book_id、invest_rate
+        :param max_depth: 最大穿透层数，默认穿透到底（存在循环投资时报错）
+        :return: level1_book_id、children_book_id、trade_date、invest_rate，
+            每个有下级的产品(level1_book_id)穿透到的全部下级产品(含中间层)
+        """
+        columns = ['level1_book_id', Dimension.CHILDREN_BOOK_ID, Dimension.TRADE_DATE, Measure.INVEST_RATE]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        # 节点：(日期, 产品)
+        trade_dates = df[Dimension.TRADE_DATE].astype(str).to_numpy(dtype=object)
+        node_dates = np.concatenate([trade_dates, trade_dates])
+        node_books = np.concatenate([df[Dimension.BOOK_ID].astype(str).to_numpy(dtype=object),
+                                     df[Dimension.CHILDREN_BOOK_ID].astype(str).to_numpy(dtype=object)])
+        codes, uniques = pd.factorize(node_dates + '\x1f' + node_books)
+        n = len(uniques)
+        nodes = np.empty((2, n), dtype=object)
+        nodes[0, codes], nodes[1, codes] = node_dates, node_books
+        parents, children = codes[:len(df)], codes[len(df):]
+        # 占比为空时按0计算，但穿透关系保留
+        rates = pd.to_numeric(df[Measure.INVEST_RATE], errors='coerce').fillna(0).to_numpy(dtype=float)
+        weight = sparse.csr_matrix((rates, (parents, children)), shape=(n, n))
+        structure = sparse.csr_matrix((np.ones(len(df)), (parents, children)), shape=(n, n))
+
+        if max_depth is None:
+            cls.check_cycle(structure, nodes)
+
+        # 逐层累加 W^k，直到没有更深的路径
+        total_weight, total_structure = weight.copy(), structure.copy()
+        power_weight, power_structure = weight, structure
+        depth = 1
+        while power_structure.nnz and (max_depth is None or depth < max_depth):
+            power_weight = power_weight @ weight
+            power_structure = power_structure @ structure
+            total_weight = total_weight + power_weight
+            total_structure = total_structure + power_structure
+            depth += 1
+
+        total_structure = total_structure.tocoo()
+        # 穿透占比为0的关系也要保留，按结构矩阵取值
+        res_weight = np.asarray(total_weight[total_structure.row, total_structure.col]).reshape(-1)
+        data = pd.DataFrame({
+            'level1_book_id': nodes[1, total_structure.row],
+            Dimension.CHILDREN_BOOK_ID: nodes[1, total_structure.col],
+            Dimension.TRADE_DATE: nodes[0, total_structure.row],
+            Measure.INVEST_RATE: res_weight,
+        }, columns=columns)
+        return data.sort_values(by=columns[:3], ignore_index=True)
 
     @classmethod
-    @lru_cache()
-    def get_pid_list(cls, book_id, trade_date, parent_ids=tuple(), invest_rates=tuple()):
+    def check_cycle(cls, structure, nodes):
         """
-        递归
-        :param book_id: 产品code
-        :param trade_date: 日期
-        :param parent_ids: 父级产品ids
-        :param invest_rate: 占比
-        :return:
+        循环投资检查：可达矩阵倍增（R = R + R·R）至不再变化，对角线非0的节点在环上
+        :param structure: 穿透关系结构矩阵
+        :param nodes: 节点，shape (2, n)：日期、产品
         """
-        if not hasattr(cls, 'df'):
-            cls.df = cls.get_data()
-        tmp_df = cls.df.query(f"{Dimension.BOOK_ID}==@book_id and {Dimension.TRADE_DATE}==@trade_date")
-        if tmp_df.empty:
-            return pd.DataFrame()
-        res_df = pd.DataFrame()
-        dfs = []
-        for _index, row in tmp_df.iterrows():
-            row_trade_date = row[Dimension.TRADE_DATE]
-            row_book_id = row[Dimension.CHILDREN_BOOK_ID]
-
-            new_parent_ids = copy.deepcopy(parent_ids)
-            new_invest_rates = copy.deepcopy(invest_rates)
-            parent_book_id = row[Dimension.BOOK_ID]
-            if parent_book_id in new_parent_ids:
-                raise QtException(msg='穿透后数据异常', book_id=book_id, trade_date=trade_date)
-
-            new_parent_ids += (row[Dimension.BOOK_ID],)
-            new_invest_rates += (row[Measure.INVEST_RATE],)
-
-            pid_df = cls.get_pid_list(book_id=row_book_id, trade_date=row_trade_date, parent_ids=new_parent_ids,
-                                      invest_rates=new_invest_rates, )
-            row_dict = row.to_dict()
-            row_dict['parent_ids'] = new_parent_ids
-            row_dict['rates'] = new_invest_rates
-            row_dict['real_invest_rate'] = np.prod(new_invest_rates)
-            if not pid_df.empty:
-                dfs.append(pid_df)
-            dfs.append(pd.DataFrame([row_dict]))
-
-            # res_df = pd.concat([pid_df, pd.DataFrame([row_dict])], ignore_index=True)
-            # dfs.append(res_df)
-        if dfs:
-            res_df = pd.concat(dfs)
-            res_df.drop(columns=Measure.INVEST_RATE, inplace=True)
-            res_df['level1_book_id'] = book_id
-        return res_df
+        reach = structure.copy()
+        reach.data[:] = 1
+        while True:
+            new_reach = reach + reach @ reach
+            new_reach.data[:] = 1
+            if new_reach.nnz == reach.nnz:
+                break
+            reach = new_reach
+        cycle_nodes = np.flatnonzero(reach.diagonal())
+        if len(cycle_nodes):
+            trade_date, book_id = nodes[:, cycle_nodes[0]]
+            raise QtException(msg='穿透后数据异常', book_id=book_id, trade_date=trade_date)
 
 
 if __name__ == '__main__':
     pd.set_option('display.max_columns', None)
     DownRelationPortfolio.run_etl()
-    # res = DownRelationPortfolio.get_penetrate_data(book_ids='demo4')
-    res = DownRelationPortfolio.get_pid_list(book_id='demo4',trade_date='20220120')
+    res = DownRelationPortfolio.get_penetrate_data(book_ids='demo4')
     print(res)
     print(res.columns)
@@ -1,8 +1,10 @@
 # vim set fileencoding=utf-8
 
 from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.fields import Dimension
 
 
 class Portfolio(EntityBase):
     """组合持仓"""
     partitioned_by_date = False
+    sort_keys = (Dimension.BOOK_ID, Dimension.INSTRUMENT_CODE)  # 按组合、证券聚簇
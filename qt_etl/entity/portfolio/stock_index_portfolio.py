@@ -17,7 +17,11 @@ __all__ = ['StockIndexPortfolio']
 
 class StockIndexPortfolio(Portfolio):
     """股票指数组合持仓"""
+    depends_on = ('CombPosition',)  # fetch_data的resource_decorator未指定证券时读取持仓
     main_table = 'INFO_IDX_WT_STK'
+    PLAN_DATE_COLUMN = 'TRD_DATE'
+    PLAN_CODE_COLUMN = 'IDX_CODE'
+    plan_split_codes = True
     partitioned_by_date = PartitionByDateType.month
     # partitioned_cols = [Dimension.BOOK_ID]
 
@@ -68,7 +72,8 @@ class StockIndexPortfolio(Portfolio):
 
     @classmethod
     def run_etl(cls, **kwargs):
-        # 过滤参数处理, 默认增加沪深300证券过滤
+        # 过滤参数处理, 默认增加沪深300证券过滤（默认证券范围即模型的全部证券，推进水位线）
+        kwargs.setdefault('is_full_universe', 'secu_codes' not in kwargs)
         secu_codes = kwargs.pop('secu_codes', get_config(
             f"etl_{cls.__name__}", "filter_secu_codes", encode=lambda x: x.split(","),
             default=DEF_SEC_CSI))
@@ -1,11 +1,13 @@
-from .bond_trade_info import *
-from .bond_trade_penetrate import *
-from .stock_trade import *
-from .stock_trade_penetrate import *
+# vim set fileencoding=utf-8
+"""交易模型：按需导入，访问模型类时才导入所在模块"""
+from qt_etl.utils import lazy_exports
 
-__all__ = [
-    "BondTradeInfo",
-    "StockTradeInfo",
-    "StockTradePenetrateInfo",
-    "BondTradePenetrateInfo"
-]
+_EXPORTS = {
+    'BondTradeInfo': '.bond_trade_info',
+    'BondTradePenetrateInfo': '.bond_trade_penetrate',
+    'StockTradeInfo': '.stock_trade',
+    'StockTradePenetrateInfo': '.stock_trade_penetrate',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(globals(), _EXPORTS)
@@ -15,6 +15,7 @@ __all__ = ["BondTradeInfo"]
 
 class BondTradeInfo(TradeInfo):
     """债券交易数据"""
+    depends_on = ('CombPosition',)
     main_table = 'INDIC_BASE_TX_BOND'
     schema = pa.schema([
         pa.field(Dimension.BOOK_ID, pa.string(), metadata={b"table_field": b"PRD_CODE"}),
@@ -104,14 +105,16 @@ class BondTradeInfo(TradeInfo):
                 end_date: Optional[Union[datetime, date]] = date.today(),
                 is_concurrent_query=False,
                 is_concurrent_save=False,
-                is_init=False):
-        super(BondTradeInfo, cls).run_etl(
+                is_init=False,
+                is_incremental=False, **kws):
+        return super(BondTradeInfo, cls).run_etl(
             secu_codes=secu_codes,
             start_date=start_date,
             end_date=end_date,
             is_concurrent_save=is_concurrent_save,
             is_concurrent_query=is_concurrent_query,
-            is_init=is_init)
+            is_init=is_init,
+            is_incremental=is_incremental, **kws)
 
 
 if __name__ == '__main__':
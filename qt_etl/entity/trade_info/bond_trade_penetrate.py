@@ -13,6 +13,7 @@ __all__ = ["BondTradePenetrateInfo"]
 
 class BondTradePenetrateInfo(TradeInfo):
     """债券交易穿透后数据"""
+    depends_on = ('CombPositionPenetrate',)
 
     @classmethod
     def fetch_data(cls, secu_code: str = None,
@@ -12,6 +12,7 @@ __all__ = ["StockTradePenetrateInfo"]
 
 class StockTradePenetrateInfo(TradeInfo):
     """股票交易穿透后数据"""
+    depends_on = ('CombPositionPenetrate',)
 
     @classmethod
     def fetch_data(cls, secu_code: str = None,
@@ -0,0 +1,99 @@
+# vim set fileencoding=utf-8
+"""etl执行器：线程/进程/串行，进程间的df通过Arrow IPC传递"""
+import concurrent.futures
+import multiprocessing
+import time
+from typing import Callable, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+
+from qt_common.qt_logging import frame_log as logger
+from qt_etl.constants import ExecutorType
+
+__all__ = ['SerialExecutor', 'get_executor', 'frame_to_ipc', 'ipc_to_frame', 'map_frames', 'timed_call']
+
+
+class SerialExecutor(concurrent.futures.Executor):
+    """串行执行器，submit时直接运行"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def get_executor(executor_type: Union[str, ExecutorType] = ExecutorType.thread,
+                 max_workers: Optional[int] = None) -> concurrent.futures.Executor:
+    """
+    :param executor_type: thread|process|serial
+    :param max_workers: 并发数
+    """
+    executor_type = ExecutorType(executor_type)
+    if executor_type == ExecutorType.process:
+        # spawn启动，避免fork继承父进程的数据库连接
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    if executor_type == ExecutorType.serial:
+        return SerialExecutor()
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+
+def frame_to_ipc(df: pd.DataFrame) -> bytes:
+    """df序列化为Arrow IPC stream"""
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_frame(buf: bytes) -> pd.DataFrame:
+    with pa.ipc.open_stream(buf) as reader:
+        return reader.read_all().to_pandas()
+
+
+def _call_to_ipc(fn: Callable, *args, **kwargs):
+    """子进程中运行，返回的df按Arrow IPC传回；Arrow不支持的类型(混合类型object列等)退回pickle"""
+    df = fn(*args, **kwargs)
+    if not isinstance(df, pd.DataFrame):
+        return 'object', df
+    try:
+        return 'ipc', frame_to_ipc(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logger.warning(f'df转换Arrow IPC失败，使用pickle传递：{e}')
+        return 'object', df
+
+
+def timed_call(fn: Callable, *args, **kwargs):
+    """
+    运行并记录开始、结束时间（子进程中运行时同样有效）
+    :return: (结果, 开始时间, 结束时间)
+    """
+    start = time.time()
+    result = fn(*args, **kwargs)
+    return result, start, time.time()
+
+
+def map_frames(fns: list, executor_type: Union[str, ExecutorType] = ExecutorType.thread,
+               max_workers: Optional[int] = None) -> list:
+    """
+    并发运行返回df的函数，结果按fns顺序返回
+    :param fns: 无参可调用对象列表（functools.partial），进程池时需可pickle
+    :param executor_type: thread|process|serial
+    :param max_workers: 并发数
+    """
+    executor_type = ExecutorType(executor_type)
+    with get_executor(executor_type, max_workers) as executor:
+        if executor_type == ExecutorType.process:
+            futures = [executor.submit(_call_to_ipc, fn) for fn in fns]
+            results = []
+            for future in futures:
+                kind, value = future.result()
+                results.append(ipc_to_frame(value) if kind == 'ipc' else value)
+            return results
+        futures = [executor.submit(fn) for fn in fns]
+        return [future.result() for future in futures]
@@ -0,0 +1,320 @@
+# vim set fileencoding=utf-8
+"""
+etl运行指标：每次run_etl按阶段记录行数、字节数、写入文件/分区数、耗时、CPU时间、峰值RSS
+    query      每条sql（EntityBase.query）
+    fetch      fetch_data整体（含query）
+    transform  fetch中query之外的耗时（fetch - query，query并发执行时为近似值）
+    arrow      df转Arrow table
+    write      写入parquet
+    total      run_etl整体
+运行结束时追加写入JSON lines（settings.metrics_path/etl_metrics.jsonl），
+并按模型重写Prometheus文本格式文件（settings.metrics_path/{model}.prom，可由node_exporter textfile采集）
+"""
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import psutil
+
+from qt_common.qt_logging import frame_log as logger
+from qt_etl.config import settings
+
+__all__ = ['StageRecord', 'RunMetrics', 'run', 'track_run', 'stage', 'current_run', 'sql_digest', 'file_visitor',
+           'write_jsonl', 'write_prometheus']
+
+JSONL_FILE = 'etl_metrics.jsonl'
+PROM_PREFIX = 'qt_etl_stage'
+
+
+class StageRecord:
+    """单个阶段的指标，rows/bytes/files/partitions由调用方在阶段内填写"""
+
+    def __init__(self, model: str, stage: str, run_id: str, **labels):
+        self.model = model
+        self.stage = stage
+        self.run_id = run_id
+        self.labels = labels
+        self.rows = 0
+        self.bytes = 0
+        self.files = 0
+        self.partitions = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_bytes = 0
+        self.started_at = time.time()
+        self.status = 'ok'
+
+    def to_dict(self) -> dict:
+        return {
+            'run_id': self.run_id,
+            'model': self.model,
+            'stage': self.stage,
+            'status': self.status,
+            'started_at': round(self.started_at, 3),
+            'rows': int(self.rows or 0),
+            'bytes': int(self.bytes or 0),
+            'files': int(self.files or 0),
+            'partitions': int(self.partitions or 0),
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'peak_rss_bytes': int(self.peak_rss_bytes),
+            **self.labels,
+        }
+
+
+class _RssSampler:
+    """进程RSS采样：有阶段在执行时后台线程定时采样，更新各阶段的峰值（全部阶段共用一个线程）"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._process = psutil.Process()
+        self._active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def rss(self) -> int:
+        return self._process.memory_info().rss
+
+    def _update(self, records):
+        rss = self.rss()
+        for record in records:
+            if rss > record.peak_rss_bytes:
+                record.peak_rss_bytes = rss
+
+    def register(self, record: StageRecord):
+        self._update([record])
+        with self._lock:
+            self._active.add(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='etl-rss-sampler', daemon=True)
+                self._thread.start()
+
+    def unregister(self, record: StageRecord):
+        self._update([record])
+        with self._lock:
+            self._active.discard(record)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                records = list(self._active)
+            self._update(records)
+            time.sleep(self.interval)
+
+
+_sampler = _RssSampler()
+
+
+class RunMetrics:
+    """单个模型一次run_etl的指标"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.run_id = uuid.uuid4().hex
+        self.records: List[StageRecord] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: StageRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def finalize(self):
+        """补充transform：fetch耗时扣除其中的query耗时"""
+        fetches = [r for r in self.records if r.stage == 'fetch']
+        if not fetches:
+            return
+        queries = [r for r in self.records if r.stage == 'query']
+        record = StageRecord(self.model, 'transform', self.run_id)
+        record.started_at = min(r.started_at for r in fetches)
+        record.rows = sum(r.rows for r in fetches)
+        record.wall_seconds = max(sum(r.wall_seconds for r in fetches) - sum(r.wall_seconds for r in queries), 0.0)
+        record.cpu_seconds = max(sum(r.cpu_seconds for r in fetches) - sum(r.cpu_seconds for r in queries), 0.0)
+        record.peak_rss_bytes = max(r.peak_rss_bytes for r in fetches)
+        self.add(record)
+
+    def summary(self) -> Dict[str, dict]:
+        """按阶段汇总（query等多次执行的阶段累加，峰值RSS取最大）"""
+        res = {}
+        for record in self.records:
+            item = res.setdefault(record.stage, {
+                'count': 0, 'rows': 0, 'bytes': 0, 'files': 0, 'partitions': 0,
+                'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_bytes': 0, 'errors': 0})
+            item['count'] += 1
+            item['errors'] += record.status != 'ok'
+            for key in ('rows', 'bytes', 'files', 'partitions', 'wall_seconds', 'cpu_seconds'):
+                item[key] += getattr(record, key) or 0
+            item['peak_rss_bytes'] = max(item['peak_rss_bytes'], record.peak_rss_bytes)
+        return res
+
+
+_current_run: ContextVar[Optional[RunMetrics]] = ContextVar('etl_metrics_run', default=None)
+# 按模型登记进行中的run：asyncio/线程池中执行的查询拿不到ContextVar时按模型名找到所属run
+_active_runs: Dict[str, RunMetrics] = {}
+_active_runs_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return bool(settings.enabled_metrics)
+
+
+def get_metrics_dir() -> str:
+    return settings.metrics_path or os.path.join(settings.etl_save_path, '.metrics')
+
+
+def current_run(model: Optional[str] = None) -> Optional[RunMetrics]:
+    run_metrics = _current_run.get()
+    if run_metrics is None and model:
+        run_metrics = _active_runs.get(model)
+    return run_metrics
+
+
+@contextlib.contextmanager
+def run(model: str):
+    """
+    一次run_etl的指标，结束时（含异常）写入指标文件
+        with metrics.run(cls.__name__):
+            ...
+    """
+    if not is_enabled():
+        yield None
+        return
+    run_metrics = RunMetrics(model)
+    token = _current_run.set(run_metrics)
+    with _active_runs_lock:
+        _active_runs[model] = run_metrics
+    try:
+        with stage('total', model=model) as record:
+            yield run_metrics
+            record.rows = sum(r.rows for r in run_metrics.records if r.stage == 'write')
+    finally:
+        _current_run.reset(token)
+        with _active_runs_lock:
+            if _active_runs.get(model) is run_metrics:
+                del _active_runs[model]
+        run_metrics.finalize()
+        try:
+            write_jsonl(run_metrics)
+            write_prometheus(run_metrics)
+        except OSError as e:
+            logger.warning(f'写入etl指标文件失败：{e}')
+
+
+def track_run(func):
+    """run_etl装饰器：classmethod的第一个参数为模型类"""
+
+    @functools.wraps(func)
+    def _wrapper(cls, *args, **kwargs):
+        with run(cls.__name__):
+            return func(cls, *args, **kwargs)
+
+    return _wrapper
+
+
+@contextlib.contextmanager
+def stage(name: str, model: Optional[str] = None, **labels):
+    """
+    记录一个阶段，不在run_etl中（或未启用指标）时不记录
+        with metrics.stage('arrow', cls.__name__) as record:
+            table = ...
+            record.rows, record.bytes = table.num_rows, table.nbytes
+    :param name: 阶段名
+    :param model: 模型名，用于在线程池中找到所属run
+    :param labels: 附加字段（如sql摘要）
+    """
+    run_metrics = current_run(model)
+    if run_metrics is None:
+        # 调用方可以照常给record赋值
+        yield StageRecord(model or '', name, '', **labels)
+        return
+    record = StageRecord(run_metrics.model, name, run_metrics.run_id, **labels)
+    _sampler.register(record)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    except BaseException:
+        record.status = 'error'
+        raise
+    finally:
+        # CPU时间为进程级，模型并发运行时包含其他线程的消耗
+        record.wall_seconds = time.perf_counter() - wall
+        record.cpu_seconds = time.process_time() - cpu
+        _sampler.unregister(record)
+        run_metrics.add(record)
+
+
+def sql_digest(sql: str) -> str:
+    """sql摘要（用于区分同一模型的多条query）"""
+    return hashlib.md5(' '.join(sql.split()).encode('utf-8')).hexdigest()[:12]
+
+
+def file_visitor(record: StageRecord):
+    """ds.write_dataset的file_visitor：统计写入的文件数、字节数、分区目录数"""
+    part_dirs = set()
+
+    def visit(written_file):
+        record.files += 1
+        part_dirs.add(os.path.dirname(written_file.path))
+        record.partitions = len(part_dirs)
+        try:
+            record.bytes += os.path.getsize(written_file.path)
+        except OSError:
+            pass
+
+    return visit
+
+
+def write_jsonl(run_metrics: RunMetrics):
+    """每个阶段一行追加写入"""
+    metrics_dir = get_metrics_dir()
+    os.makedirs(metrics_dir, exist_ok=True)
+    lines = ''.join(json.dumps(r.to_dict(), ensure_ascii=False, default=str) + '\n' for r in run_metrics.records)
+    with open(os.path.join(metrics_dir, JSONL_FILE), 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def write_prometheus(run_metrics: RunMetrics):
+    """模型最近一次运行的各阶段汇总，按模型一个文件（先写临时文件再替换）"""
+    metrics_dir = get_metrics_dir()
+    os.makedirs(metrics_dir, exist_ok=True)
+    summary = run_metrics.summary()
+    helps = {
+        'count': 'stage executions in the last run',
+        'rows': 'rows processed in the last run',
+        'bytes': 'bytes processed in the last run',
+        'files': 'files written in the last run',
+        'partitions': 'partitions written in the last run',
+        'wall_seconds': 'wall time in the last run',
+        'cpu_seconds': 'process cpu time in the last run',
+        'peak_rss_bytes': 'peak process rss in the last run',
+        'errors': 'failed stage executions in the last run',
+    }
+    lines = []
+    for key, help_text in helps.items():
+        metric = f'{PROM_PREFIX}_{key}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for stage_name, item in summary.items():
+            lines.append(f'{metric}{{model="{_escape(run_metrics.model)}",stage="{_escape(stage_name)}"}} '
+                         f'{item[key]}')
+    lines.append(f'# HELP {PROM_PREFIX}_last_run_timestamp_seconds finish time of the last run')
+    lines.append(f'# TYPE {PROM_PREFIX}_last_run_timestamp_seconds gauge')
+    lines.append(f'{PROM_PREFIX}_last_run_timestamp_seconds{{model="{_escape(run_metrics.model)}"}} {time.time():.3f}')
+    path = os.path.join(metrics_dir, f'{run_metrics.model}.prom')
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
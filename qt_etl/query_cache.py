@@ -0,0 +1,210 @@
+# vim set fileencoding=utf-8
+"""
+源sql查询结果缓存：按 规范化sql + session + decoder 的哈希存为本地Arrow IPC文件，按有效期、占用空间(LRU)淘汰
+缓存decoder处理之后的结果，Arrow往返后与原结果不一致的（Decimal精度、object列中的NaN等）不缓存
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from qt_common.qt_logging import frame_log as logger
+from qt_etl.config import settings
+
+__all__ = ['normalize_sql', 'cache_key', 'decoder_tag', 'is_enabled', 'get', 'put', 'get_or_query', 'evict',
+           'clear']
+
+CACHE_SUFFIX = '.arrow'
+
+# sql中的字符串常量，规范化时保持原样
+_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+def normalize_sql(sql: str) -> str:
+    """规范化sql：字符串常量之外的连续空白合并为一个空格，去掉首尾空白和结尾分号"""
+    parts = _LITERAL_RE.split(sql)
+    # split后奇数位置为字符串常量
+    parts = [part if i % 2 else _WHITESPACE_RE.sub(' ', part) for i, part in enumerate(parts)]
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def cache_key(sql: str, session: str = 'default', tag: str = '') -> str:
+    return hashlib.sha256(f'{session}\0{tag}\0{normalize_sql(sql)}'.encode('utf-8')).hexdigest()
+
+
+def decoder_tag(decoder: Optional[Callable]) -> str:
+    """decoder的标识（绑定方法带上所属的类），不同decoder处理的同一sql分别缓存"""
+    if decoder is None:
+        return ''
+    owner = getattr(decoder, '__self__', None)
+    if owner is not None:
+        owner = owner if isinstance(owner, type) else type(owner)
+        return f'{owner.__module__}.{owner.__qualname__}.{decoder.__name__}'
+    return f'{getattr(decoder, "__module__", "")}.{getattr(decoder, "__qualname__", repr(decoder))}'
+
+
+def is_enabled() -> bool:
+    return bool(settings.enabled_query_cache)
+
+
+def get_cache_dir() -> str:
+    return settings.query_cache_path or os.path.join(settings.etl_save_path, '.query_cache')
+
+
+def get_cache_path(key: str) -> str:
+    return os.path.join(get_cache_dir(), key[:2], key + CACHE_SUFFIX)
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def get(sql: str, session: str = 'default', ttl: Optional[int] = None, tag: str = '') -> Optional[pd.DataFrame]:
+    """
+    读取缓存
+    :param ttl: 有效期（秒），默认settings.query_cache_ttl
+    :param tag: 区分同一sql不同处理结果的标识，见decoder_tag
+    :return: 未命中或已过期时返回None
+    """
+    path = get_cache_path(cache_key(sql, session, tag))
+    ttl = settings.query_cache_ttl if ttl is None else ttl
+    try:
+        stat = os.stat(path)
+        if time.time() - stat.st_mtime > ttl:
+            return None
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        # 更新访问时间用于LRU淘汰，修改时间保持为写入时间用于判断有效期
+        os.utime(path, (time.time(), stat.st_mtime))
+    except FileNotFoundError:
+        return None
+    except (OSError, pa.ArrowInvalid) as e:
+        logger.warning(f'读取查询缓存失败 {path}：{e}')
+        return None
+    return table.to_pandas()
+
+
+def put(sql: str, session: str, df: pd.DataFrame, tag: str = '') -> bool:
+    """
+    写入缓存（先写临时文件再替换，并发读不会读到不完整的文件）
+    :return: 是否写入成功，Arrow不支持或往返后不一致的数据(混合类型列、Decimal精度不同等)不缓存
+    """
+    path = get_cache_path(cache_key(sql, session, tag))
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logger.debug(f'查询结果不支持Arrow缓存：{e}')
+        return False
+    if not _round_trips(df.reset_index(drop=True), table.to_pandas()):
+        logger.debug(f'查询结果Arrow往返后不一致，不缓存：{list(df.columns)}')
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f'写入查询缓存失败 {path}：{e}')
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    evict()
+    return True
+
+
+def get_or_query(sql: str, session: str, query_fn: Callable[[], pd.DataFrame],
+                 ttl: Optional[int] = None, tag: str = '') -> pd.DataFrame:
+    """
+    命中缓存直接返回，否则查询后写入缓存；同一进程内相同的sql并发时只查询一次
+    :param query_fn: 实际查询数据库的函数（含decoder处理）
+    :param tag: 区分同一sql不同处理结果的标识，见decoder_tag
+    """
+    df = get(sql, session, ttl, tag)
+    if df is not None:
+        return df
+    with _key_lock(cache_key(sql, session, tag)):
+        df = get(sql, session, ttl, tag)
+        if df is not None:
+            return df
+        df = query_fn()
+        put(sql, session, df, tag)
+        return df
+
+
+def evict(max_bytes: Optional[int] = None, ttl: Optional[int] = None):
+    """
+    淘汰缓存：删除过期文件，超过占用空间时按最近访问时间(LRU)删除
+    :param max_bytes: 最大占用空间，默认settings.query_cache_max_bytes
+    :param ttl: 有效期（秒），默认settings.query_cache_ttl
+    """
+    max_bytes = settings.query_cache_max_bytes if max_bytes is None else max_bytes
+    ttl = settings.query_cache_ttl if ttl is None else ttl
+    cache_dir = get_cache_dir()
+    if not os.path.exists(cache_dir):
+        return
+    with _evict_lock:
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(cache_dir):
+            for file in files:
+                if not file.endswith(CACHE_SUFFIX):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > ttl:
+                    _remove(path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def clear():
+    """清空缓存"""
+    evict(max_bytes=0)
+
+
+def _round_trips(df: pd.DataFrame, restored: pd.DataFrame) -> bool:
+    """Arrow往返后的数据与原数据一致：列、类型相同，值相同（Decimal按字符串比较精度，object列区分None与NaN）"""
+    if list(df.columns) != list(restored.columns) or not df.dtypes.equals(restored.dtypes):
+        return False
+    for column in df.columns:
+        left, right = df[column], restored[column]
+        if left.dtype == object:
+            left, right = left.map(_value_repr), right.map(_value_repr)
+        if not left.equals(right):
+            return False
+    return True
+
+
+def _value_repr(value):
+    # Decimal('1.5')与Decimal('1.50')、None与NaN相等但格式化结果不同
+    return type(value), str(value)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
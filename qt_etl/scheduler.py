@@ -0,0 +1,164 @@
+# vim set fileencoding=utf-8
+"""etl依赖调度：按模型声明的depends_on构建DAG，上游完成即启动下游，并统计关键路径"""
+import concurrent.futures
+import time
+from typing import Callable, Iterable, Optional, Union
+
+from qt_common.error import QtException
+from qt_common.qt_logging import frame_log as logger
+from qt_etl import db_governor
+from qt_etl.constants import ExecutorType
+from qt_etl.executor import get_executor, timed_call
+
+__all__ = ['EtlScheduler']
+
+
+class EtlScheduler:
+    """etl模型DAG调度"""
+
+    def __init__(self, models: Iterable, run_fn: Callable, max_workers: int = 5,
+                 executor_type: Union[str, ExecutorType] = ExecutorType.thread):
+        """
+        :param models: 要运行etl的模型
+        :param run_fn: 单个模型的运行函数 run_fn(model)，进程池时需可pickle（模块级函数）
+        :param max_workers: 并发数
+        :param executor_type: thread|process|serial，模型转换计算较重时使用process绕开GIL
+        """
+        self.models = {model.__name__: model for model in models}
+        self.run_fn = run_fn
+        self.max_workers = max_workers
+        self.executor_type = ExecutorType(executor_type)
+        self.upstreams = self.build_graph()
+        self.downstreams = {name: set() for name in self.models}
+        for name, upstreams in self.upstreams.items():
+            for upstream in upstreams:
+                self.downstreams[upstream].add(name)
+        self.order = self.topological_order()
+        self.results = {}
+        self.errors = {}
+        self.skipped = set()
+        self.timings = {}
+
+    def build_graph(self) -> dict:
+        """模型依赖关系 {模型: 上游模型}，不在本次运行范围内的上游视为已完成"""
+        graph = {}
+        for name, model in self.models.items():
+            depends_on = set(getattr(model, 'depends_on', ()) or ())
+            outside = depends_on - set(self.models)
+            if outside:
+                logger.debug(f'{name} 上游模型{sorted(outside)}不在本次运行范围内，视为已完成')
+            graph[name] = depends_on & set(self.models)
+        return graph
+
+    def topological_order(self) -> list:
+        """拓扑排序，存在循环依赖时报错"""
+        in_degree = {name: len(upstreams) for name, upstreams in self.upstreams.items()}
+        ready = [name for name, degree in in_degree.items() if not degree]
+        order = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for downstream in sorted(self.downstreams[name]):
+                in_degree[downstream] -= 1
+                if not in_degree[downstream]:
+                    ready.append(downstream)
+        if len(order) != len(self.models):
+            cycle = sorted(set(self.models) - set(order))
+            raise QtException(msg=f'etl模型存在循环依赖：{cycle}')
+        return order
+
+    def skip_downstreams(self, name):
+        """上游失败，下游不再运行"""
+        for downstream in self.downstreams[name]:
+            if downstream not in self.skipped:
+                self.skipped.add(downstream)
+                logger.warning(f'{downstream} 上游模型{name}运行失败，跳过')
+                self.skip_downstreams(downstream)
+
+    def run(self) -> dict:
+        """运行全部模型，无依赖的并发运行"""
+        start_time = time.time()
+        pending = {name: set(upstreams) for name, upstreams in self.upstreams.items()}
+        submitted = {}
+        with get_executor(self.executor_type, self.max_workers) as executor:
+            futures = {}
+
+            def submit_ready():
+                for name in self.order:
+                    if name in submitted or name in self.skipped or pending[name]:
+                        continue
+                    submitted[name] = time.time()
+                    # 计时在执行端完成，进程池时不含排队、传输时间
+                    futures[executor.submit(timed_call, self.run_fn, self.models[name])] = name
+
+            submit_ready()
+            while futures:
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        self.results[name], start, end = future.result()
+                    except Exception as exc:
+                        logger.error('%r generated an exception: %s' % (name, exc))
+                        self.errors[name] = exc
+                        self.timings[name] = (submitted[name], time.time())
+                        self.skip_downstreams(name)
+                    else:
+                        self.timings[name] = (start, end)
+                        for downstream in self.downstreams[name]:
+                            pending[downstream].discard(name)
+                submit_ready()
+
+        critical_path, critical_path_time = self.critical_path()
+        return {
+            "success_models": [name for name in self.order if name in self.results],
+            "error_models": [name for name in self.order if name in self.errors],
+            "skipped_models": [name for name in self.order if name in self.skipped],
+            "critical_path": critical_path,
+            "critical_path_time": critical_path_time,
+            "total_time": time.time() - start_time,
+            # 进程池时各子进程独立计数，这里只有本进程的统计
+            "db_queue_stats": db_governor.get_stats(),
+        }
+
+    def critical_path(self, durations: Optional[dict] = None):
+        """
+        关键路径：按依赖关系累计耗时最长的链路
+        :param durations: {模型: 耗时}，默认使用本次运行耗时
+        :return: (模型列表, 耗时)
+        """
+        if durations is None:
+            durations = {name: end - start for name, (start, end) in self.timings.items()}
+        finish, previous = {}, {}
+        for name in self.order:
+            if name not in durations:
+                continue
+            upstream = max((u for u in self.upstreams[name] if u in finish),
+                           key=lambda u: finish[u], default=None)
+            finish[name] = durations[name] + (finish[upstream] if upstream else 0)
+            previous[name] = upstream
+        if not finish:
+            return [], 0
+        name = max(finish, key=lambda n: finish[n])
+        path_time = finish[name]
+        path = []
+        while name:
+            path.append(name)
+            name = previous[name]
+        return list(reversed(path)), path_time
+
+
+if __name__ == '__main__':
+    class A:
+        depends_on = ()
+
+    class B:
+        depends_on = ('A',)
+
+    class C:
+        depends_on = ('A',)
+
+    class D:
+        depends_on = ('B', 'C')
+
+    print(EtlScheduler([A, B, C, D], run_fn=lambda model: time.sleep(0.1)).run())
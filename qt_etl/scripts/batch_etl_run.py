@@ -1,30 +1,32 @@
 # vim set fileencoding=utf-8
 """运行模型etl-并发"""
 
-import concurrent.futures
 import functools
 import time
 from datetime import date
 
-from qt_common.qt_logging import frame_log
 from qt_etl.entity.factor import *
-from qt_etl.entity.fields import Dimension, InstrumentType
 from qt_etl.entity.instruments import *
 from qt_etl.entity.market_data import *
 from qt_etl.entity.portfolio import *
 from qt_etl.entity.trade_info import *
+from qt_etl.scheduler import EtlScheduler
 
 year_2020 = date(2020, 1, 1)
 year_2015 = date(2015, 1, 1)
 
 # 需要定义每个模型的运行参数
 model_params_data = {
-    "StockTradePenetrate": {},
-    "BondTrade": {"start_date": year_2020, },
-    "StockTrade": {"start_date": year_2020, },
+    "StockTradePenetrateInfo": {},
+    "BondTradeInfo": {"start_date": year_2020, },
+    "StockTradeInfo": {"start_date": year_2020, },
     "StockIndexPortfolio": {"start_date": year_2020, "is_concurrent_query": True,
                             'is_concurrent_save': True},
     "CombPosition": {"start_date": year_2020, },
+    "DownRelationPortfolio": {},
+    "BondValCSI": {"start_date": year_2020, },
+    "BondValCNBD": {"start_date": year_2020, },
+    "IssuerRating": {},
     "BondPosition": {"start_date": year_2020, },
     "IndustryClassificationMktData": {"start_date": year_2020},
     "StockDailyQuote": {"start_date": year_2015, "is_concurrent_query": True},
@@ -51,69 +53,44 @@ protfolio_models = [StockIndexPortfolio, CombPosition,
                     DownRelationPortfolio]
 mkt_models = [BenchmarkDailyQuote, IndustryClassificationMktData, StockDailyQuote, IndexRate,
               QtCalendar,
-              BondDailyQuote, FundDailyQuote]
+              BondDailyQuote, FundDailyQuote, BondValCSI, BondValCNBD]
 instruments_models = [BondInfo, FundInfo, StockIndexInfo, IssuerRating, BenchMarkInfo]
 
 total_models = finacial_models + trade_models + protfolio_models + mkt_models + instruments_models
 
 
-def bond_mkt_etl(is_init):
-    """
-    bond_mkt elt(BondValCSI依赖 CombPosition etl, 单独定义函数)
-    :param is_init: 是否初始化（true：删除原来的文件）
-    :return:
-    """
-    CombPosition.run_etl(start_date=year_2020)
-    df_position = CombPosition.get_data(start_date=year_2020)
-    bond_code_list = df_position[df_position[Dimension.INSTRUMENT_TYPE]==InstrumentType.BOND.name][Dimension.INSTRUMENT_CODE].unique().tolist()
-    BondValCSI.run_etl(secu_codes=bond_code_list, start_date=year_2020, is_init=is_init)
-    BondValCNBD.run_etl(secu_codes=bond_code_list, start_date=year_2020, is_init=is_init)
-
-
-def run_model_etl(model, is_init):
+def run_model_etl(model, is_init, is_incremental=False):
     """
     运行单个模型etl
     :param model: 要运行etl的模型
     :param is_init: 是否初始化（true：删除原来的文件）
+    :param is_incremental: 是否增量（只拉取水位线之后的数据）
     :return:
     """
     model_name = model.__name__
-    if model_name == CombPosition.__name__:
-        return bond_mkt_etl(is_init=is_init)
+    run_params = model_params_data.get(model_name, None)
+    if run_params is None:
+        raise Exception(f'{model} model未定义 etl param')
     else:
-        run_params = model_params_data.get(model_name, None)
-        if run_params is None:
-            raise Exception(f'{model} model未定义 etl param')
-        else:
-            run_params['is_init'] = is_init
-        return functools.partial(getattr(model, 'run_etl'), **run_params)()
+        run_params = dict(run_params, is_init=is_init, is_incremental=is_incremental)
+    return functools.partial(getattr(model, 'run_etl'), **run_params)()
 
 
-def run_etl(is_init=False):
+def run_etl(is_init=False, is_incremental=False, max_workers=5, executor_type='thread'):
     """
-    运行etl
+    运行etl，按模型depends_on依赖关系调度：无依赖的并发运行，上游完成后立即运行下游
     :param is_init: bool 是否初始化（true：删除原来的文件）
+    :param is_incremental: bool 是否增量（只拉取水位线之后的数据）
+    :param max_workers: 并发数
+    :param executor_type: thread|process|serial，process时每个模型在独立进程中运行
     :return:
     """
-    error_models = []
-    success_models = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future_tasks = {executor.submit(run_model_etl, _model, is_init): _model.__name__ for _model in
-                        total_models}
-        for futrue in concurrent.futures.as_completed(future_tasks):
-            model_name = future_tasks[futrue]
-            try:
-                data = futrue.result()
-                print(f'model res:{data}')
-            except Exception as exc:
-                frame_log.error('%r generated an exception: %s' % (model_name, exc))
-                error_models.append(model_name)
-            else:
-                success_models.append(model_name)
-    return {
-        "success_models": success_models,
-        "error_models": error_models
-    }
+    scheduler = EtlScheduler(
+        total_models,
+        run_fn=functools.partial(run_model_etl, is_init=is_init, is_incremental=is_incremental),
+        max_workers=max_workers,
+        executor_type=executor_type)
+    return scheduler.run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,2 @@
+# vim set fileencoding=utf-8
+"""etl性能基准测试脚本"""
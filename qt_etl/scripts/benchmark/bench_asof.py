@@ -0,0 +1,79 @@
+# vim set fileencoding=utf-8
+"""
+as-of关联基准：原按日期循环过滤+merge vs EntityBase.asof_join（5年 × 5000个主体）
+
+评级按get_data的顺序（trade_date降序）输入。原实现drop_duplicates(keep='last')在降序数据上取到的是
+最早生效的评级，asof_join取最近生效的评级（append_rating注释描述的行为），两者结果不同：
+校验原实现与"只保留每个主体最早一条评级"的asof_join一致，并输出两种结果不同的行占比
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.fields import Dimension
+
+
+def make_frames(years=5, issuers=5000, changes=4, seed=0):
+    """
+    合成数据
+    :return: (持仓：每个交易日每个主体一行, 评级：每个主体若干次评级变动，按trade_date降序)
+    """
+    rng = np.random.default_rng(seed)
+    trade_dates = pd.bdate_range('2018-01-01', periods=years * 250).strftime('%Y-%m-%d')
+    issuer_codes = np.array([f'P{i:08d}' for i in range(issuers)], dtype=object)
+    left = pd.DataFrame({
+        Dimension.TRADE_DATE: np.repeat(trade_dates.to_numpy(dtype=object), issuers),
+        Dimension.ISSUER_CODE: np.tile(issuer_codes, len(trade_dates)),
+    })
+    rating_dates = pd.to_datetime('2016-01-01') + pd.to_timedelta(
+        rng.integers(0, (years + 2) * 365, issuers * changes), unit='D')
+    right = pd.DataFrame({
+        Dimension.ISSUER_CODE: np.repeat(issuer_codes, changes),
+        Dimension.TRADE_DATE: rating_dates.strftime('%Y-%m-%d'),
+        Dimension.RATING: rng.choice(['AAA', 'AA+', 'AA', 'AA-', 'A+'], issuers * changes),
+    }).sort_values(Dimension.TRADE_DATE, ascending=False, kind='stable', ignore_index=True)
+    return left, right
+
+
+def legacy_join(left, right):
+    """原IssuerRating.append_rating的方式（right为get_data返回的顺序）"""
+    dfs = []
+    for d, g in left.groupby(Dimension.TRADE_DATE):
+        df_t = right[right[Dimension.TRADE_DATE] <= d]
+        df_t = df_t.drop_duplicates(subset=[Dimension.ISSUER_CODE], keep='last')
+        df_t = df_t[[Dimension.ISSUER_CODE, Dimension.RATING]]
+        dfs.append(g.merge(df_t, how='left', on=[Dimension.ISSUER_CODE]))
+    return pd.concat(dfs)
+
+
+def bench(years, issuers):
+    left, right = make_frames(years, issuers)
+    t1 = time.perf_counter()
+    res = EntityBase.asof_join(left, right, by=Dimension.ISSUER_CODE, columns=[Dimension.RATING])
+    asof = time.perf_counter() - t1
+    t1 = time.perf_counter()
+    expected = legacy_join(left, right)
+    legacy = time.perf_counter() - t1
+    columns = [Dimension.TRADE_DATE, Dimension.ISSUER_CODE]
+    res = res.sort_values(columns, ignore_index=True)
+    expected = expected.sort_values(columns, ignore_index=True)[res.columns]
+    changed = (res[Dimension.RATING].fillna('') != expected[Dimension.RATING].fillna('')).mean()
+    print(f'rows={len(left)} ratings={len(right)}  loop:{legacy:8.3f}s  asof_join:{asof:8.3f}s  '
+          f'speed-up:{legacy / asof:8.1f}x  changed:{changed:.1%}')
+
+    # 原实现的结果即每个主体最早一条评级（降序数据中的最后一条）的as-of关联
+    oldest = right.drop_duplicates(subset=[Dimension.ISSUER_CODE], keep='last')
+    legacy_semantics = EntityBase.asof_join(left, oldest, by=Dimension.ISSUER_CODE, columns=[Dimension.RATING])
+    legacy_semantics = legacy_semantics.sort_values(columns, ignore_index=True)
+    pd.testing.assert_frame_equal(legacy_semantics, expected)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='as-of关联基准测试')
+    parser.add_argument('-y', '--years', type=int, default=5, help='年数')
+    parser.add_argument('-i', '--issuers', type=int, default=5000, help='主体数')
+    args = parser.parse_args()
+    bench(args.years, args.issuers)
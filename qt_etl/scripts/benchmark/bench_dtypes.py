@@ -0,0 +1,140 @@
+# vim set fileencoding=utf-8
+"""
+get_data字符串字段类型内存对比：按模型schema合成数据写入临时目录（维度字段取值重复度高），
+分别以 object / category / pyarrow 读取，输出耗时、DataFrame内存（deep）和进程RSS增量
+
+    python -m qt_etl.scripts.benchmark.bench_dtypes -m CombPosition StockDailyQuote -n 1000000
+    python -m qt_etl.scripts.benchmark.bench_dtypes --real   # 读取settings.etl_save_path下已有的etl数据
+"""
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import psutil
+import pyarrow as pa
+
+from qt_etl.constants import StringDtype
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.entity_record import MODEL_MANIFEST, load_model
+from qt_etl.entity.fields import Dimension
+
+DEFAULT_MODELS = ('CombPosition', 'StockDailyQuote')
+
+
+def synth_frame(model, rows: int, codes: int = 3000, days: int = 250, seed: int = 0) -> pd.DataFrame:
+    """按schema合成数据：字典编码字段取少量不同值，其他字符串字段取值较分散"""
+    rng = np.random.default_rng(seed)
+    dictionary_columns = set(model.get_dictionary_columns(include_sort_keys=True))
+    trade_dates = pd.bdate_range('2021-01-04', periods=days).strftime('%Y-%m-%d').to_numpy(dtype=object)
+    data = {}
+    for field in model.schema:
+        if field.name == Dimension.TRADE_DATE:
+            data[field.name] = trade_dates[rng.integers(0, days, rows)]
+        elif pa.types.is_string(field.type):
+            if field.name == Dimension.INSTRUMENT_CODE:
+                cardinality = codes
+            elif field.name in dictionary_columns:
+                cardinality = 20
+            else:
+                cardinality = max(rows // 10, 1)
+            values = np.array([f'{field.name}_{i}' for i in range(cardinality)], dtype=object)
+            data[field.name] = values[rng.integers(0, cardinality, rows)]
+        elif pa.types.is_boolean(field.type):
+            data[field.name] = rng.integers(0, 2, rows).astype(bool)
+        elif pa.types.is_integer(field.type):
+            data[field.name] = rng.integers(0, 1000, rows)
+        else:
+            data[field.name] = rng.random(rows) * 1000
+    return pd.DataFrame(data)
+
+
+def measure(model, string_dtype: StringDtype) -> dict:
+    """读取一次，返回耗时、DataFrame内存、RSS增量"""
+    gc.collect()
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    t1 = time.perf_counter()
+    df = model.get_data(string_dtype=string_dtype)
+    used = time.perf_counter() - t1
+    res = {
+        'rows': len(df),
+        'seconds': used,
+        'df_mb': df.memory_usage(deep=True).sum() / 1024 ** 2,
+        'rss_delta_mb': (process.memory_info().rss - rss) / 1024 ** 2,
+    }
+    del df
+    gc.collect()
+    return res
+
+
+def resolve_models(names) -> list:
+    category_codes = {model_code: category_code
+                      for category_code, models in MODEL_MANIFEST.items() for model_code in models}
+    unknown = set(names) - set(category_codes)
+    if unknown:
+        raise SystemExit(f'未知模型：{sorted(unknown)}')
+    return [load_model(category_codes[name], name) for name in names]
+
+
+def bench_model(model) -> dict:
+    # 每种类型读取前清空dataset缓存，避免相互影响
+    res = {}
+    for string_dtype in StringDtype:
+        model.invalidate_dataset_cache()
+        res[string_dtype.value] = measure(model, string_dtype)
+    return res
+
+
+def run(names, rows: int = 1000000, codes: int = 3000, real: bool = False) -> dict:
+    """
+    :param names: 模型名
+    :param rows: 合成数据行数
+    :param codes: instrument_code不同值个数
+    :param real: 读取已有etl数据，不合成
+    """
+    models = resolve_models(names)
+    if real:
+        return {model.__name__: bench_model(model) for model in models}
+
+    output_dir = tempfile.mkdtemp(prefix='qt_etl_dtypes_')
+    origin_save_path = EntityBase.etl_save_path
+    EntityBase.etl_save_path = output_dir
+    try:
+        results = {}
+        for model in models:
+            df = synth_frame(model, rows, codes=codes)
+            file_path = model.get_etl_dir()
+            os.makedirs(file_path, exist_ok=True)
+            model.save_dataset(df, file_path)
+            del df
+            results[model.__name__] = bench_model(model)
+        return results
+    finally:
+        EntityBase.etl_save_path = origin_save_path
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def print_results(results: dict):
+    print(f"{'model':<24}{'string_dtype':<14}{'rows':>10}{'seconds':>10}{'df_mb':>10}{'rss_delta_mb':>14}"
+          f"{'vs object':>11}")
+    for name, items in results.items():
+        base = items[StringDtype.object.value]['df_mb']
+        for string_dtype, item in items.items():
+            ratio = item['df_mb'] / base if base else 0
+            print(f"{name:<24}{string_dtype:<14}{item['rows']:>10}{item['seconds']:>10.3f}{item['df_mb']:>10.1f}"
+                  f"{item['rss_delta_mb']:>14.1f}{ratio:>10.0%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='get_data字符串字段类型内存对比')
+    parser.add_argument('-m', '--models', nargs='*', default=list(DEFAULT_MODELS), help='模型名')
+    parser.add_argument('-n', '--rows', type=int, default=1000000, help='合成数据行数')
+    parser.add_argument('-c', '--codes', type=int, default=3000, help='instrument_code不同值个数')
+    parser.add_argument('--real', action='store_true', help='读取已有etl数据，不合成')
+    args = parser.parse_args()
+    print_results(run(args.models, rows=args.rows, codes=args.codes, real=args.real))
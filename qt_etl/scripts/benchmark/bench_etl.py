@@ -0,0 +1,225 @@
+# vim set fileencoding=utf-8
+"""
+端到端etl基准：源库为本地SQLite合成数据（source_db），按模型分阶段统计耗时、行/秒、峰值内存
+    fetch      fetch_data中执行sql的耗时（源库查询）
+    transform  fetch_data中sql之外的耗时（合并、类型转换、计算等）
+    save       save_dataset写入parquet
+    read       get_data读取全部数据
+结果可保存为json，与基线比较，行/秒下降超过阈值的阶段判定为性能回退
+
+    python -m qt_etl.scripts.benchmark.bench_etl -m StockDailyQuote BondInfo -c 500 -d 250 -o res.json
+    python -m qt_etl.scripts.benchmark.bench_etl -b res.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import psutil
+
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.scheduler import EtlScheduler
+from qt_etl.scripts.benchmark.source_db import SourceDb, patch_db_manager
+
+PHASES = ('fetch', 'transform', 'save', 'read')
+
+
+class PeakRss:
+    """后台线程采样进程RSS，统计区间内的峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._process = psutil.Process()
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._peak = self._process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, self._process.memory_info().rss)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self._process.memory_info().rss)
+
+    @property
+    def peak_mb(self) -> float:
+        return self._peak / 1024 ** 2
+
+
+def _phase(seconds, rows, peak_mb):
+    return {
+        'seconds': round(seconds, 4),
+        'rows': rows,
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': round(peak_mb, 1),
+    }
+
+
+def resolve_secu_codes(model, start_date: date, end_date: date):
+    """
+    run_etl（resource_decorator等装饰器）填充后传给EntityBase.run_etl的secu_codes，
+    fetch_data直接传None时部分模型拼出的sql无效（BOND_CODE in (None)）
+    """
+    captured = {}
+
+    def capture(cls, *args, **kwargs):
+        captured.update(kwargs)
+
+    origin_run_etl = EntityBase.__dict__['run_etl']
+    EntityBase.run_etl = classmethod(capture)
+    try:
+        model.run_etl(start_date=start_date, end_date=end_date)
+    finally:
+        EntityBase.run_etl = origin_run_etl
+    return captured.get('secu_codes')
+
+
+def bench_model(model, source_db: SourceDb, start_date: date, end_date: date) -> dict:
+    """单个模型：fetch/transform/save/read 各阶段统计"""
+    res = {}
+    secu_codes = resolve_secu_codes(model, start_date, end_date)
+    source_db.reset_stats()
+    with PeakRss() as rss:
+        t1 = time.perf_counter()
+        df = model.fetch_data(secu_codes, start_date=start_date, end_date=end_date)
+        fetch_used = time.perf_counter() - t1
+    res['fetch'] = _phase(source_db.query_time, source_db.query_rows, rss.peak_mb)
+    res['transform'] = _phase(max(fetch_used - source_db.query_time, 0.0), len(df), rss.peak_mb)
+
+    file_path = model.get_etl_dir()
+    os.makedirs(file_path, exist_ok=True)
+    rows = len(df)
+    with PeakRss() as rss:
+        t1 = time.perf_counter()
+        model.save_dataset(df, file_path)
+        save_used = time.perf_counter() - t1
+    del df
+    res['save'] = _phase(save_used, rows, rss.peak_mb)
+
+    with PeakRss() as rss:
+        t1 = time.perf_counter()
+        df = model.get_data()
+        read_used = time.perf_counter() - t1
+    res['read'] = _phase(read_used, len(df), rss.peak_mb)
+    res['queries'] = source_db.query_count
+    return res
+
+
+def run(models, codes=500, days=250, db_path=':memory:', etl_save_path=None, keep=False) -> dict:
+    """
+    :param models: 要测试的模型，按depends_on依赖顺序运行（下游读取上游的etl数据）
+    :param codes: 每个源表的编码数
+    :param days: 日频源表的交易日数
+    :param db_path: SQLite文件路径
+    :param etl_save_path: etl输出目录，默认临时目录
+    :param keep: 是否保留etl输出目录
+    """
+    models = {model.__name__: model for model in models}
+    order = EtlScheduler(models.values(), run_fn=None).order
+    source_db = SourceDb(db_path, codes=codes, days=days)
+    source_db.add_models(models.values())
+    t1 = time.perf_counter()
+    source_db.build()
+    build_used = time.perf_counter() - t1
+
+    start_date = date.fromisoformat(source_db.trade_dates[0])
+    end_date = date.fromisoformat(source_db.trade_dates[-1]) + timedelta(days=1)
+    output_dir = etl_save_path or tempfile.mkdtemp(prefix='qt_etl_bench_')
+    origin_save_path = EntityBase.etl_save_path
+    EntityBase.etl_save_path = output_dir
+    results = {}
+    try:
+        with patch_db_manager(source_db):
+            for name in order:
+                try:
+                    results[name] = bench_model(models[name], source_db, start_date, end_date)
+                except Exception as e:
+                    results[name] = {'error': f'{type(e).__name__}: {e}'}
+    finally:
+        EntityBase.etl_save_path = origin_save_path
+        source_db.close()
+        if not keep and not etl_save_path:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    return {
+        'params': {'codes': codes, 'days': days, 'source_build_seconds': round(build_used, 2)},
+        'models': results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    与基线比较
+    :param tolerance: 行/秒下降超过该比例判定为回退
+    :return: [(模型, 阶段, 基线行/秒, 本次行/秒)]
+    """
+    regressions = []
+    for name, phases in results['models'].items():
+        base_phases = baseline.get('models', {}).get(name) or {}
+        for phase in PHASES:
+            current = (phases.get(phase) or {}).get('rows_per_sec')
+            base = (base_phases.get(phase) or {}).get('rows_per_sec')
+            if current and base and current < base * (1 - tolerance):
+                regressions.append((name, phase, base, current))
+    return regressions
+
+
+def print_results(results: dict):
+    print(f"{'model':<32}{'phase':<10}{'seconds':>10}{'rows':>12}{'rows/s':>14}{'peak_rss_mb':>14}")
+    for name, phases in results['models'].items():
+        if 'error' in phases:
+            print(f"{name:<32}{'error':<10}  {phases['error']}")
+            continue
+        for phase in PHASES:
+            item = phases[phase]
+            print(f"{name:<32}{phase:<10}{item['seconds']:>10.3f}{item['rows']:>12}"
+                  f"{item['rows_per_sec'] or 0:>14.0f}{item['peak_rss_mb']:>14.1f}")
+
+
+def resolve_models(names):
+    from qt_etl.scripts.batch_etl_run import total_models
+
+    if not names:
+        return total_models
+    models = {model.__name__: model for model in total_models}
+    unknown = set(names) - set(models)
+    if unknown:
+        raise SystemExit(f'未知模型：{sorted(unknown)}')
+    return [models[name] for name in names]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='端到端etl基准测试（SQLite合成源库）')
+    parser.add_argument('-m', '--models', nargs='*', help='模型名，默认batch_etl_run中的全部模型')
+    parser.add_argument('-c', '--codes', type=int, default=500, help='每个源表的编码数')
+    parser.add_argument('-d', '--days', type=int, default=250, help='日频源表的交易日数')
+    parser.add_argument('--db', default=':memory:', help='SQLite文件路径，默认内存库')
+    parser.add_argument('-o', '--output', help='结果保存为json')
+    parser.add_argument('-b', '--baseline', help='基线结果json，比较行/秒')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2, help='行/秒下降超过该比例判定为回退')
+    args = parser.parse_args()
+
+    res = run(resolve_models(args.models), codes=args.codes, days=args.days, db_path=args.db)
+    print_results(res)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(res, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            _regressions = compare(res, json.load(f), args.tolerance)
+        for _name, _phase_name, _base, _current in _regressions:
+            print(f'回退 {_name}.{_phase_name}: {_base:.0f} -> {_current:.0f} rows/s')
+        sys.exit(1 if _regressions else 0)
@@ -0,0 +1,103 @@
+# vim set fileencoding=utf-8
+"""get_data过滤条件基准：原eval字符串 vs pyarrow表达式（构建耗时、按月分区扫描耗时）"""
+import argparse
+import shutil
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from qt_etl.constants import PartitionByDateType
+from qt_etl.entity.fields import Dimension
+from qt_etl.entity.filters import build_filter, _compile
+
+
+def legacy_filter(start_date, end_date, cond):
+    """原get_data中的过滤条件构建方式"""
+    filters = [f"(ds.field(Dimension.TRADE_DATE) >= '{start_date}')",
+               f"(ds.field(Dimension.TRADE_DATE) <= '{end_date}')"]
+    for d, l in cond.items():
+        if isinstance(l, list):
+            filters.append(f"(ds.field('{d}').isin({l}))")
+        else:
+            filters.append(f"(ds.field('{d}') == '{l}')")
+    return eval(' & '.join(filters))
+
+
+def timeit(fn, number):
+    t1 = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - t1) / number
+
+
+def bench_build(code_nums=(10, 1000, 5000), number=20):
+    """过滤条件构建耗时"""
+    columns = [Dimension.TRADE_DATE, Dimension.INSTRUMENT_CODE, PartitionByDateType.month.value]
+    for code_num in code_nums:
+        codes = [f'SEC{i:09d}' for i in range(code_num)]
+        cond = {Dimension.INSTRUMENT_CODE: codes}
+        legacy = timeit(lambda: legacy_filter('2021-01-01', '2021-01-31', cond), number)
+
+        def cold():
+            _compile.cache_clear()
+            build_filter(columns, date(2021, 1, 1), date(2021, 1, 31), cond, PartitionByDateType.month)
+
+        compiled = timeit(cold, number)
+        cached = timeit(lambda: build_filter(columns, date(2021, 1, 1), date(2021, 1, 31), cond,
+                                             PartitionByDateType.month), number)
+        print(f'build codes={code_num:>5}  eval:{legacy * 1000:8.2f}ms  '
+              f'expression:{compiled * 1000:8.2f}ms  cached:{cached * 1000:8.3f}ms')
+
+
+def write_dataset(path, months=36, codes=2000):
+    """按月分区的合成行情数据"""
+    trade_dates = [d.strftime('%Y-%m-%d') for d in
+                   np.arange(np.datetime64('2019-01-01'), np.datetime64('2019-01-01') + months * 30).astype(object)]
+    n = len(trade_dates) * codes
+    table = pa.table({
+        Dimension.TRADE_DATE: np.repeat(trade_dates, codes),
+        Dimension.INSTRUMENT_CODE: np.tile([f'SEC{i:09d}' for i in range(codes)], len(trade_dates)),
+        'close': np.random.rand(n),
+        'month': [d[:4] + d[5:7] for d in np.repeat(trade_dates, codes)],
+    })
+    ds.write_dataset(table, path, format='parquet', max_rows_per_group=64 * 1024,
+                     partitioning=ds.partitioning(pa.schema([pa.field('month', pa.string())]), flavor='hive'))
+    return n
+
+
+def bench_scan(number=5):
+    """一个月窗口的扫描耗时，表达式下推月分区后跳过其他目录"""
+    path = tempfile.mkdtemp()
+    try:
+        rows = write_dataset(path)
+        schema = pa.schema([pa.field(Dimension.TRADE_DATE, pa.string()),
+                            pa.field(Dimension.INSTRUMENT_CODE, pa.string()),
+                            pa.field('close', pa.float64())])
+        cond = {Dimension.INSTRUMENT_CODE: [f'SEC{i:09d}' for i in range(0, 2000, 4)]}
+
+        legacy_dataset = ds.dataset(path, schema=schema, format='parquet')
+        legacy = timeit(lambda: legacy_dataset.to_table(
+            filter=legacy_filter('2020-06-01', '2020-06-30', cond)), number)
+
+        part_schema = pa.schema([pa.field('month', pa.string())])
+        dataset = ds.dataset(path, schema=schema.append(part_schema.field(0)), format='parquet',
+                             partitioning=ds.partitioning(part_schema, flavor='hive'))
+        pushdown = timeit(lambda: dataset.to_table(
+            columns=schema.names,
+            filter=build_filter(dataset.schema.names, date(2020, 6, 1), date(2020, 6, 30), cond,
+                                PartitionByDateType.month)), number)
+        print(f'scan rows={rows}  eval:{legacy * 1000:8.2f}ms  expression+pushdown:{pushdown * 1000:8.2f}ms')
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='get_data过滤条件基准测试')
+    parser.add_argument('-n', '--number', type=int, default=20, help='重复次数')
+    args = parser.parse_args()
+    bench_build(number=args.number)
+    bench_scan()
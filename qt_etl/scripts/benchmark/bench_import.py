@@ -0,0 +1,66 @@
+# vim set fileencoding=utf-8
+"""导入耗时基准：每个场景在新的子进程中执行，取多次运行的中位数（可选输出 -X importtime 耗时最多的模块）"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# 场景名 -> 执行的代码
+SCENARIOS = {
+    'import entity_record': 'import qt_etl.entity.entity_record',
+    'get_etl_action_callable(BondInfo)':
+        'from qt_etl.entity.entity_record import get_etl_action_callable\n'
+        'get_etl_action_callable("Instrument", "BondInfo")',
+    'get_etl_action_callable(QtCalendar)':
+        'from qt_etl.entity.entity_record import get_etl_action_callable\n'
+        'get_etl_action_callable("MarketData", "QtCalendar")',
+    'ENTITY_DF': 'from qt_etl.entity import entity_record\nentity_record.ENTITY_DF',
+    'import all models': 'from qt_etl.entity.entity_record import load_all_models\nload_all_models()',
+}
+
+_TIMER = '''import time
+_t1 = time.perf_counter()
+{code}
+print(time.perf_counter() - _t1)
+'''
+
+
+def time_scenario(code: str, number: int = 5) -> list:
+    """在新进程中执行code，返回每次的耗时（秒）"""
+    res = []
+    for _ in range(number):
+        output = subprocess.run([sys.executable, '-c', _TIMER.format(code=code)],
+                                check=True, capture_output=True, text=True).stdout
+        res.append(float(output.strip().splitlines()[-1]))
+    return res
+
+
+def top_imports(code: str, top: int = 15) -> list:
+    """-X importtime 累计耗时最多的模块 [(累计耗时us, 模块)]"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            check=True, capture_output=True, text=True).stderr
+    items = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        items.append((int(cumulative), module.strip()))
+    return sorted(items, reverse=True)[:top]
+
+
+def bench(number=5, show_top=False):
+    for name, code in SCENARIOS.items():
+        used = time_scenario(code, number)
+        print(f'{name:<40} median:{statistics.median(used) * 1000:9.1f}ms  '
+              f'min:{min(used) * 1000:9.1f}ms  max:{max(used) * 1000:9.1f}ms')
+        if show_top:
+            for cumulative, module in top_imports(code):
+                print(f'    {cumulative / 1000:9.1f}ms  {module}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='qt_etl导入耗时基准测试')
+    parser.add_argument('-n', '--number', type=int, default=5, help='每个场景运行次数')
+    parser.add_argument('--top', action='store_true', help='输出-X importtime累计耗时最多的模块')
+    args = parser.parse_args()
+    bench(args.number, show_top=args.top)
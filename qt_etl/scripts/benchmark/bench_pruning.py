@@ -0,0 +1,117 @@
+# vim set fileencoding=utf-8
+"""
+row group过滤基准：同一份合成数据分别按原方式（不排序、1M行row group）和按模型排序字段聚簇写入，
+按排序字段过滤读取，统计扫描涉及/跳过的row group数、字节数和读取耗时
+
+    python -m qt_etl.scripts.benchmark.bench_pruning -m CombPosition StockDailyQuote -n 2000000 -k 5
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.scripts.benchmark.bench_dtypes import DEFAULT_MODELS, resolve_models, synth_frame
+
+# 变体名 -> 覆盖的类属性
+VARIANTS = {
+    'unsorted': {'sort_keys': (), 'rows_per_group': None},
+    'clustered': {},
+}
+
+
+def scan_stats(model, filter_expr) -> dict:
+    """按parquet footer统计：全部row group与过滤后需要读取的row group"""
+    dataset = model.get_dataset()
+    res = {'row_groups': 0, 'bytes': 0, 'scanned_row_groups': 0, 'scanned_bytes': 0}
+    for fragment in dataset.get_fragments():
+        fragment.ensure_complete_metadata()
+        res['row_groups'] += fragment.num_row_groups
+        res['bytes'] += sum(rg.total_byte_size for rg in fragment.row_groups)
+    # 分区过滤后的文件再按row group统计信息过滤
+    for fragment in dataset.get_fragments(filter=filter_expr):
+        for sub_fragment in fragment.split_by_row_group(filter_expr):
+            res['scanned_row_groups'] += sub_fragment.num_row_groups
+            res['scanned_bytes'] += sum(rg.total_byte_size for rg in sub_fragment.row_groups)
+    res['skipped_bytes'] = res['bytes'] - res['scanned_bytes']
+    return res
+
+
+def bench_variant(model, key: str, queries: list) -> dict:
+    res = {'row_groups': 0, 'bytes': 0, 'scanned_row_groups': 0, 'scanned_bytes': 0, 'skipped_bytes': 0,
+           'rows': 0, 'seconds': 0.0}
+    for values in queries:
+        _, _, filter_expr = model.prepare_scan(cond={key: values})
+        for name, value in scan_stats(model, filter_expr).items():
+            res[name] += value
+        t1 = time.perf_counter()
+        res['rows'] += model.get_table(cond={key: values}).num_rows
+        res['seconds'] += time.perf_counter() - t1
+    return res
+
+
+def run(names, rows: int = 2000000, codes: int = 3000, values_per_query: int = 5, queries: int = 10,
+        seed: int = 0) -> dict:
+    """
+    :param names: 模型名
+    :param rows: 合成数据行数
+    :param codes: instrument_code不同值个数
+    :param values_per_query: 每次过滤的取值个数
+    :param queries: 每个字段的查询次数
+    """
+    rng = np.random.default_rng(seed)
+    output_dir = tempfile.mkdtemp(prefix='qt_etl_pruning_')
+    origin_save_path = EntityBase.etl_save_path
+    EntityBase.etl_save_path = output_dir
+    results = {}
+    try:
+        for model in resolve_models(names):
+            df = synth_frame(model, rows, codes=codes)
+            keys = model.get_sort_keys()
+            # 过滤取值从合成数据中抽样
+            key_queries = {}
+            for key in keys:
+                distinct = df[key].unique()
+                key_queries[key] = [sorted(rng.choice(distinct, min(values_per_query, len(distinct)), replace=False))
+                                    for _ in range(queries)]
+            # 子类名不同，etl目录不同
+            variants = {name: type(f'{model.__name__}_{name}', (model,), attrs) for name, attrs in VARIANTS.items()}
+            for variant in variants.values():
+                file_path = variant.get_etl_dir()
+                os.makedirs(file_path, exist_ok=True)
+                variant.save_dataset(df, file_path)
+            del df
+            results[model.__name__] = {
+                key: {name: bench_variant(variant, key, values) for name, variant in variants.items()}
+                for key, values in key_queries.items()}
+    finally:
+        EntityBase.etl_save_path = origin_save_path
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+
+def print_results(results: dict):
+    print(f"{'model':<20}{'filter':<18}{'variant':<12}{'row_groups':>12}{'scanned':>10}{'scanned_mb':>12}"
+          f"{'skipped_mb':>12}{'skipped':>9}{'seconds':>10}")
+    for model_name, keys in results.items():
+        for key, variants in keys.items():
+            for name, item in variants.items():
+                ratio = item['skipped_bytes'] / item['bytes'] if item['bytes'] else 0
+                print(f"{model_name:<20}{key:<18}{name:<12}{item['row_groups']:>12}{item['scanned_row_groups']:>10}"
+                      f"{item['scanned_bytes'] / 1024 ** 2:>12.1f}{item['skipped_bytes'] / 1024 ** 2:>12.1f}"
+                      f"{ratio:>9.0%}{item['seconds']:>10.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='按排序字段过滤时的row group跳过统计')
+    parser.add_argument('-m', '--models', nargs='*', default=list(DEFAULT_MODELS), help='模型名')
+    parser.add_argument('-n', '--rows', type=int, default=2000000, help='合成数据行数')
+    parser.add_argument('-c', '--codes', type=int, default=3000, help='instrument_code不同值个数')
+    parser.add_argument('-k', '--values', type=int, default=5, help='每次过滤的取值个数')
+    parser.add_argument('-q', '--queries', type=int, default=10, help='每个字段的查询次数')
+    args = parser.parse_args()
+    print_results(run(args.models, rows=args.rows, codes=args.codes, values_per_query=args.values,
+                      queries=args.queries))
@@ -0,0 +1,66 @@
+# vim set fileencoding=utf-8
+"""收益率计算基准：原逐行apply vs MarketData向量化计算（合成行情数据）"""
+import argparse
+import time
+from math import log
+
+import numpy as np
+import pandas as pd
+
+from qt_etl.entity.fields import Dimension, Measure
+from qt_etl.entity.market_data.market_data import MarketData
+
+
+def make_frame(rows, codes=5000, seed=0):
+    """合成行情：部分价格为0或空"""
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(0.5, 100, rows)
+    close[rng.random(rows) < 0.01] = 0
+    close[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        Dimension.INSTRUMENT_CODE: np.tile([f'SEC{i:09d}' for i in range(codes)], rows // codes + 1)[:rows],
+        Measure.CLOSE_ADJUSTED: close,
+    })
+
+
+def legacy_returns(df):
+    """原StockDailyQuote/FundDailyQuote中的计算方式"""
+    df[Measure.PREV_CLOSE_ADJUSTED] = df.groupby([Dimension.INSTRUMENT_CODE])[Measure.CLOSE_ADJUSTED].shift(1)
+    df[Measure.RETURN_PERCENTAGE_ADJUSTED] = df.apply(
+        lambda row: row[Measure.CLOSE_ADJUSTED] / row[Measure.PREV_CLOSE_ADJUSTED] - 1 if (
+                row[Measure.CLOSE_ADJUSTED] and row[Measure.PREV_CLOSE_ADJUSTED]) else None, axis=1)
+    df[Measure.RETURN_PERCENTAGE_ADJUSTED] = df[Measure.RETURN_PERCENTAGE_ADJUSTED].astype(float)
+    df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG] = df[Measure.RETURN_PERCENTAGE_ADJUSTED].apply(
+        lambda x: log(x + 1) if x is not None else None)
+    df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG] = df[Measure.RETURN_PERCENTAGE_ADJUSTED_LOG].astype(float)
+    return df
+
+
+def vectorized_returns(df):
+    return MarketData.add_returns(df, group_by=Dimension.INSTRUMENT_CODE)
+
+
+def bench(rows, skip_legacy=False):
+    df = make_frame(rows)
+    t1 = time.perf_counter()
+    res = vectorized_returns(df.copy())
+    vectorized = time.perf_counter() - t1
+    print(f'rows={rows}  vectorized:{vectorized:8.3f}s')
+    if skip_legacy:
+        return
+    t1 = time.perf_counter()
+    expected = legacy_returns(df.copy())
+    legacy = time.perf_counter() - t1
+    print(f'rows={rows}  apply:{legacy:8.3f}s  speed-up:{legacy / vectorized:8.1f}x')
+    # 结果（含空值位置）一致
+    for column in (Measure.PREV_CLOSE_ADJUSTED, Measure.RETURN_PERCENTAGE_ADJUSTED,
+                   Measure.RETURN_PERCENTAGE_ADJUSTED_LOG):
+        np.testing.assert_allclose(res[column].to_numpy(), expected[column].to_numpy(), equal_nan=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='收益率计算基准测试')
+    parser.add_argument('-r', '--rows', type=int, default=5_000_000, help='行数')
+    parser.add_argument('--skip-legacy', action='store_true', help='不运行原apply方式（耗时较长）')
+    args = parser.parse_args()
+    bench(args.rows, skip_legacy=args.skip_legacy)
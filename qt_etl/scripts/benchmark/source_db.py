@@ -0,0 +1,391 @@
+# vim set fileencoding=utf-8
+"""
+源库替身：按模型schema中的table_name/table_field生成合成数据写入本地SQLite，
+并替换db_manager.pd_read_sql把EntityBase.query路由到该库，用于离线基准测试
+
+数据规则（编码列跨表取值一致，关联查询、按上游模型的证券列表过滤都能匹配上）：
+    第i行 *_CODE/*_ID 列取 codes 中第 i % codes 个编码，日期列取第 (i // codes) % days 个交易日，
+    即日频表为 编码 × 交易日 的笛卡尔积；COLUMN_VALUES中的列按给定取值循环
+sql中引用到但schema中没有的表、列在首次查询报错时按列名规则补齐后重试；
+sql中与常量比较的非编码、日期列（如 DOWN_FLAG='0'、IS_TRADING_DAY=1）改为该常量，保证过滤后有数据
+每个线程使用单独的连接，查询可以并发执行
+"""
+import contextlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from qt_common import db_manager
+from qt_common.qt_logging import frame_log as logger
+
+__all__ = ['SourceDb', 'translate_sql', 'patch_db_manager']
+
+_DATE_RE = re.compile(r'(^|_)(DATE|DT|DAY)$|DATE$')
+_CODE_RE = re.compile(r'(_CODE|_ID|CODE|^ID)$')
+_FLAG_RE = re.compile(r'^(IS_?VALID|IS_?DEL(ETED)?|ISVALID)$')
+_NUMBER_RE = re.compile(r'(PRC|PRICE|RAT|RATE|AMT|VOL|_IR|IR$|VALUE|VAL$|PCT|YLD|^MV$|^CV$|^SHR|WT$|WEIGHT|'
+                        r'_NUM|QTY|CAP|YIELD|DUR|CNV|SPRD|BAL|MKT_VAL|COST|PRFT)')
+# 行数按 编码 × 交易日 生成的表（schema中有日期列的表也按日频处理）
+_DAILY_TABLE_RE = re.compile(r'(EOD|PRICE|VAL|VALUATION|QUO|CURV|POS|TX_|TRD|IDX|RATE|EXCHRATE|SHRSTRUC|FIN_)')
+
+_NO_SUCH_TABLE_RE = re.compile(r'no such table: (?:\w+\.)?(\w+)')
+_NO_SUCH_COLUMN_RE = re.compile(r'no such column: (?:(\w+)\.)?(\w+)')
+_FROM_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_SQL_KEYWORDS = {'WHERE', 'ON', 'LEFT', 'RIGHT', 'INNER', 'JOIN', 'GROUP', 'ORDER', 'LIMIT', 'UNION', 'AND', 'AS'}
+_LOCKED_RE = re.compile(r'database (table )?is locked')
+# 与常量比较：COL = 'x' / COL = 1 / COL in ('x', 'y')
+_LITERAL_PREDICATE_RE = re.compile(
+    r"(?:\b(\w+)\.)?\b(\w+)\s*(?:=\s*('[^']*'|-?\d+(?:\.\d+)?)|IN\s*\(\s*((?:'[^']*'|-?\d+(?:\.\d+)?)"
+    r"(?:\s*,\s*(?:'[^']*'|-?\d+(?:\.\d+)?))*)\s*\))",
+    re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'([^']*)'|(-?\d+(?:\.\d+)?)")
+
+# 按给定取值循环生成的列（上游模型按这些取值过滤，如 CombPosition.get_secu_code_list(secu_type='BOND')）
+COLUMN_VALUES = {
+    'AST_BIG_CLS_CODE': ('BOND', 'STOCK', 'FUND', 'CASH_OTHER'),
+}
+
+# MySQL写法 -> SQLite写法
+_SQL_REWRITES = [
+    (re.compile(r'\bCONVERT\s*\(([^,()]+),\s*(\w+(?:\(\d+(?:,\s*\d+)?\))?)\s*\)', re.IGNORECASE), r'CAST(\1 AS \2)'),
+    (re.compile(r'\bCURDATE\s*\(\s*\)', re.IGNORECASE), "date('now')"),
+    (re.compile(r'\bSYSDATE\s*\(\s*\)', re.IGNORECASE), 'NOW()'),
+    (re.compile(r'\bIF\s*\(', re.IGNORECASE), 'IIF('),
+]
+
+
+def translate_sql(sql: str) -> str:
+    """常用MySQL函数改写为SQLite可执行的形式，其余函数通过SourceDb注册的自定义函数支持"""
+    for pattern, repl in _SQL_REWRITES:
+        sql = pattern.sub(repl, sql)
+    return sql
+
+
+def _str_to_date(value, fmt=None):
+    """STR_TO_DATE：统一返回 YYYY-MM-DD"""
+    if value is None:
+        return None
+    value = str(value)
+    digits = re.sub(r'\D', '', value)
+    if len(digits) >= 8:
+        return f'{digits[:4]}-{digits[4:6]}-{digits[6:8]}'
+    return value
+
+
+def _concat(*args):
+    if any(arg is None for arg in args):
+        return None
+    return ''.join(str(arg) for arg in args)
+
+
+class SourceDb:
+    """本地SQLite源库替身"""
+
+    def __init__(self, path: str = ':memory:', codes: int = 500, days: int = 250,
+                 start_date: date = date(2021, 1, 4), seed: int = 0,
+                 table_rows: Optional[Dict[str, int]] = None):
+        """
+        :param path: SQLite文件路径，默认内存库
+        :param codes: 每个表的编码数
+        :param days: 日频表的交易日数
+        :param start_date: 第一个交易日
+        :param seed: 随机种子
+        :param table_rows: 按表指定行数 {table_name: rows}
+        """
+        self.path = path
+        self.codes = codes
+        self.days = days
+        self.seed = seed
+        self.table_rows = {k.upper(): v for k, v in (table_rows or {}).items()}
+        self.trade_dates = pd.bdate_range(start_date, periods=days).strftime('%Y-%m-%d').to_numpy(dtype=object)
+        self.specs: Dict[str, Dict[str, str]] = defaultdict(dict)  # table -> {column: kind}
+        self.literal_columns = set()  # 已按sql常量改写的 (table, column)
+        # 内存库使用共享缓存，各线程的连接访问同一个库
+        self._memory_uri = f'file:qt_etl_source_{uuid.uuid4().hex}?mode=memory&cache=shared' \
+            if path == ':memory:' else None
+        self._lock = threading.RLock()  # 建表、补列等写操作
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        # 主连接：保持内存库存在
+        self._main_conn = self._conn
+        # 统计
+        self.query_count = 0
+        self.query_time = 0.0
+        self.query_rows = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._memory_uri:
+            conn = sqlite3.connect(self._memory_uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.create_function('CONCAT', -1, _concat)
+        conn.create_function('STR_TO_DATE', 2, _str_to_date)
+        conn.create_function('NOW', 0, lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with self._stats_lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ----------------------------------------------------------------
+    # 表结构
+    # ----------------------------------------------------------------
+    @staticmethod
+    def column_kind(column: str, arrow_type=None) -> str:
+        """
+        按列名(和schema类型)推断合成数据类型
+        :return: flag|date|code|number|category
+        """
+        column = column.upper()
+        if _FLAG_RE.match(column):
+            return 'flag'
+        if _DATE_RE.search(column):
+            return 'date'
+        if _CODE_RE.search(column):
+            return 'code'
+        if arrow_type is not None and str(arrow_type).startswith(('double', 'float', 'int', 'decimal')):
+            return 'number'
+        if arrow_type is not None and str(arrow_type) in ('string', 'large_string'):
+            # schema为字符串的列不按列名规则生成数值（如 RCM_DIR 匹配 IR$）
+            return 'category'
+        if _NUMBER_RE.search(column):
+            return 'number'
+        return 'category'
+
+    def add_model(self, model):
+        """按模型schema的table_name/table_field登记源表列"""
+        from qt_etl.entity.entity_record import export_model_schema
+
+        df = export_model_schema(model)
+        if df.empty or 'table_name' not in df or 'table_field' not in df:
+            return
+        for table, column, arrow_type in df[['table_name', 'table_field', 'field_type']].itertuples(index=False):
+            if not isinstance(table, str) or not table or not isinstance(column, str) or not column:
+                continue
+            # 日期等维度在schema中通常登记为string，按列名规则优先
+            self.specs[table.upper()].setdefault(column.upper(), self.column_kind(column, arrow_type))
+
+    def add_models(self, models: Iterable):
+        for model in models:
+            self.add_model(model)
+
+    def table_row_count(self, table: str) -> int:
+        if table in self.table_rows:
+            return self.table_rows[table]
+        kinds = self.specs.get(table, {}).values()
+        if 'date' in kinds and _DAILY_TABLE_RE.search(table):
+            return self.codes * self.days
+        return self.codes
+
+    def _values(self, table: str, column: str, kind: str, rows: int) -> np.ndarray:
+        index = np.arange(rows)
+        if kind == 'flag':
+            return np.ones(rows, dtype=np.int64)
+        if kind == 'date':
+            return self.trade_dates[(index // self.codes) % len(self.trade_dates)]
+        if column in COLUMN_VALUES:
+            values = np.array(COLUMN_VALUES[column], dtype=object)
+            return values[index % len(values)]
+        if kind == 'code':
+            # 编码列在各表取值一致（不同列名也一致，如持仓SECU_CODE与行情BOND_CODE）
+            return np.char.add('C', np.char.zfill((index % self.codes).astype(str), 8)).astype(object)
+        # 每个表、列独立的随机序列，重复生成时结果不变
+        rng = np.random.default_rng([self.seed, sum(map(ord, table)), sum(map(ord, column))])
+        if kind == 'number':
+            return np.round(rng.uniform(0.01, 200, rows), 4)
+        return np.char.add(f'{column[:8]}_', rng.integers(0, 8, rows).astype(str)).astype(object)
+
+    def create_table(self, table: str):
+        """按登记的列生成数据建表"""
+        table = table.upper()
+        columns = self.specs.get(table) or {'ID': 'code'}
+        rows = self.table_row_count(table)
+        t1 = time.perf_counter()
+        with self._lock:
+            df = pd.DataFrame({column: self._values(table, column, kind, rows) for column, kind in columns.items()})
+            df.to_sql(table, self._conn, index=False, if_exists='replace', chunksize=100_000)
+            for column, kind in columns.items():
+                if kind in ('code', 'date'):
+                    self._conn.execute(f'CREATE INDEX IF NOT EXISTS "IX_{table}_{column}" ON "{table}" ("{column}")')
+            self._conn.commit()
+        logger.debug(f'source db create {table} rows:{rows} columns:{len(columns)} '
+                     f'used:{time.perf_counter() - t1:.2f}s')
+
+    def add_column(self, table: str, column: str):
+        """sql中引用了未登记的列：按列名规则生成后补到表中"""
+        table, column = table.upper(), column.upper()
+        kind = self.column_kind(column)
+        self.specs[table][column] = kind
+        with self._lock:
+            rowids = [r[0] for r in self._conn.execute(f'SELECT rowid FROM "{table}" ORDER BY rowid')]
+            values = self._values(table, column, kind, len(rowids))
+            self._conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}"')
+            self._conn.executemany(f'UPDATE "{table}" SET "{column}" = ? WHERE rowid = ?',
+                                   zip(values.tolist(), rowids))
+            self._conn.commit()
+
+    def _table_columns(self, table: str) -> set:
+        return {r[1].upper() for r in self._conn.execute(f'PRAGMA table_info("{table}")')}
+
+    def apply_literals(self, sql: str):
+        """
+        sql中与常量比较的列（标志、分类等，不含编码、日期列）改为按这些常量循环取值，保证过滤后有数据；
+        每个列只改写一次
+        """
+        for alias, column, value, values in _LITERAL_PREDICATE_RE.findall(sql):
+            column = column.upper()
+            if column in _SQL_KEYWORDS or self.column_kind(column) in ('code', 'date') or column in COLUMN_VALUES:
+                continue
+            table = self._resolve_column_table(sql, alias or None, column, missing=False)
+            if not table or (table, column) in self.literal_columns:
+                continue
+            literals = [text if number == '' else float(number) if '.' in number else int(number)
+                        for text, number in _LITERAL_RE.findall(value or values)]
+            with self._lock:
+                self.literal_columns.add((table, column))
+                if column not in self._table_columns(table):
+                    continue
+                self._conn.execute(
+                    f'UPDATE "{table}" SET "{column}" = '
+                    f'CASE (rowid - 1) % {len(literals)} {" ".join(f"WHEN {i} THEN ?" for i in range(len(literals)))} '
+                    f'END', literals)
+                self._conn.commit()
+
+    def build(self, tables: Optional[Iterable[str]] = None):
+        """
+        生成全部（或指定）已登记的表
+        :param tables: 为空时生成全部登记的表
+        """
+        for table in tables or list(self.specs):
+            self.create_table(table)
+
+    def _table_exists(self, table: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table.upper(),)).fetchone() is not None
+
+    def _resolve_column_table(self, sql: str, alias: Optional[str], column: str = None,
+                              missing: bool = True) -> Optional[str]:
+        """
+        列所属的表：有前缀时按 表名/别名 查找；
+        否则取sql中第一个（缺少该列 missing=True / 已有该列 missing=False）的已建表
+        """
+        tables = [(t.upper(), (a or '').upper()) for t, a in _FROM_TABLE_RE.findall(sql)]
+        tables = [(t, a if a not in _SQL_KEYWORDS else '') for t, a in tables]
+        if alias:
+            alias = alias.upper()
+            for table, table_alias in tables:
+                if alias in (table, table_alias):
+                    return table
+            return None
+        if column is None:
+            return tables[0][0] if tables else None
+        for table, _ in tables:
+            if self._table_exists(table) and (column.upper() in self._table_columns(table)) != missing:
+                return table
+        return None
+
+    # ----------------------------------------------------------------
+    # 查询
+    # ----------------------------------------------------------------
+    def read_sql(self, sql: str, max_repairs: int = 64) -> pd.DataFrame:
+        """执行查询（不加锁，各线程的查询并发执行），缺失的表、列补齐后重试"""
+        sql = translate_sql(sql)
+        repairs = 0
+        while repairs < max_repairs:
+            try:
+                self.apply_literals(sql)
+                t1 = time.perf_counter()
+                df = pd.read_sql_query(sql, self._conn)
+                used = time.perf_counter() - t1
+                with self._stats_lock:
+                    self.query_time += used
+                    self.query_count += 1
+                    self.query_rows += len(df)
+                return df
+            except (pd.io.sql.DatabaseError, sqlite3.OperationalError) as e:
+                message = str(e)
+                if _LOCKED_RE.search(message):
+                    # 其他线程正在建表、补列
+                    time.sleep(0.01)
+                    continue
+                repairs += 1
+                match = _NO_SUCH_TABLE_RE.search(message)
+                if match:
+                    self.create_table(match.group(1))
+                    continue
+                match = _NO_SUCH_COLUMN_RE.search(message)
+                if match:
+                    table = self._resolve_column_table(sql, match.group(1), match.group(2))
+                    if table and self._table_exists(table):
+                        self.add_column(table, match.group(2))
+                        continue
+                raise
+        raise RuntimeError(f'source db 补齐表结构次数超过{max_repairs}: {sql}')
+
+    def pd_read_sql(self, sql, session='default', decoder=None, **kwargs) -> pd.DataFrame:
+        """与db_manager.pd_read_sql相同的签名，session忽略（全部表在同一个库）"""
+        df = self.read_sql(sql)
+        # 源库驱动返回的日期为date类型，这里与之一致
+        for column in df.columns:
+            if self.column_kind(column) == 'date' and pd.api.types.is_string_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], errors='coerce').dt.date
+        if decoder:
+            df = decoder(df)
+        return df
+
+    def reset_stats(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.query_rows = 0
+
+    def close(self):
+        with self._stats_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+@contextlib.contextmanager
+def patch_db_manager(source_db: SourceDb):
+    """
+    把db_manager.pd_read_sql替换为source_db.pd_read_sql；
+    通过 from qt_common.db_manager import pd_read_sql 导入的模块一并替换
+    """
+    original = db_manager.pd_read_sql
+    patched = [db_manager]
+    for module in list(sys.modules.values()):
+        if module is not db_manager and getattr(module, 'pd_read_sql', None) is original:
+            patched.append(module)
+    for module in patched:
+        module.pd_read_sql = source_db.pd_read_sql
+    try:
+        yield source_db
+    finally:
+        for module in patched:
+            module.pd_read_sql = original
+
+
+if __name__ == '__main__':
+    from qt_etl.entity.market_data import StockDailyQuote
+
+    _db = SourceDb(codes=10, days=20)
+    _db.add_model(StockDailyQuote)
+    with patch_db_manager(_db):
+        print(StockDailyQuote.fetch_data(start_date=date(2021, 1, 1), end_date=date(2021, 1, 31)))
+    print(_db.query_count, _db.query_rows, f'{_db.query_time:.3f}s')
@@ -216,7 +216,8 @@ class Api:
                  start_date=None, end_date=date.today().strftime("%Y-%m-%d"),
                  is_concurrent_query=False,
                  is_concurrent_save=False,
-                 is_init=False):
+                 is_init=False,
+                 is_incremental=False):
         """etl运行后台任务"""
         rest = "/qt-quant/etl/task"
         headers = {"Content-Type": "application/json"}
@@ -228,7 +229,8 @@ class Api:
             "model_code": model_code,
             "is_concurrent_query": is_concurrent_query,
             "is_concurrent_save": is_concurrent_save,
-            "is_init": is_init
+            "is_init": is_init,
+            "is_incremental": is_incremental
         }
         # 请求参数去除为空的字段
         for strip in ["", None, []]:
@@ -293,6 +295,7 @@ def parse_args():
     parse.add_argument('--concurrent_query', action='store_true', help='是否通过执行数据查询')
     parse.add_argument('--concurrent_save', action='store_true', help='是否通过并发进行数据存储')
     parse.add_argument('--init', action='store_true', help='是否初始化操作，会覆盖更新etl')
+    parse.add_argument('--incremental', action='store_true', help='是否增量操作，只拉取水位线之后的数据')
     return parse.parse_args()
 
 
@@ -318,7 +321,8 @@ def run():
         secu_codes=secu_codes, start_date=start_date,
         end_date=end_date, is_concurrent_query=args.concurrent_query,
         is_concurrent_save=args.concurrent_save,
-        is_init=args.init)
+        is_init=args.init,
+        is_incremental=args.incremental)
     task_id = result.get("task_id")
     status = result.get("status")
     message = result.get("message")
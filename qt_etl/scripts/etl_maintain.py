@@ -0,0 +1,162 @@
+# vim set fileencoding=utf-8
+"""
+etl目录维护
+    migrate  按证券分区的旧目录（每只证券一个目录）迁移为分桶目录
+    compact  合并分区内的小文件并按排序字段重排，之后执行vacuum（可与get_data同时运行，不能与同一模型的etl写入同时运行）
+    vacuum   删除compact替换下且超过保留时间的旧文件
+    plan     输出并发查询的工作单元规划（按探测/历史行数切分）
+
+    python -m qt_etl.scripts.etl_maintain migrate -m BondValCNBD BondValCSI
+    python -m qt_etl.scripts.etl_maintain compact --measure
+    python -m qt_etl.scripts.etl_maintain compact -m StockDailyQuote --interval 3600   # 后台定时执行
+    python -m qt_etl.scripts.etl_maintain plan -m StockDailyQuote --start 2015-01-01 --rows 300000
+"""
+import argparse
+import os
+import time
+from datetime import date
+
+from qt_common.qt_logging import frame_log as logger
+from qt_etl.entity.entity_base import as_date
+from qt_etl.entity.entity_record import MODEL_MANIFEST, load_all_models, load_model
+
+__all__ = ['resolve_models', 'migrate', 'measure_scan', 'compact', 'vacuum', 'plan']
+
+
+def resolve_models(names=None, predicate=None) -> list:
+    """
+    :param names: 模型名，默认全部模型
+    :param predicate: 模型过滤条件
+    """
+    if names:
+        # 只导入指定的模型
+        category_codes = {model_code: category_code
+                          for category_code, models in MODEL_MANIFEST.items() for model_code in models}
+        unknown = set(names) - set(category_codes)
+        if unknown:
+            raise SystemExit(f'未知模型：{sorted(unknown)}')
+        models = [load_model(category_codes[name], name) for name in names]
+    else:
+        models = load_all_models()
+    return [model for model in models if predicate is None or predicate(model)]
+
+
+def migrate(models) -> dict:
+    """:return: {模型名: 迁移的行数}"""
+    res = {}
+    for model in models:
+        t1 = time.time()
+        res[model.__name__] = rows = model.migrate_partitions()
+        logger.info(f'migrate {model.__name__} rows:{rows} used time:{time.time() - t1}')
+    return res
+
+
+def measure_scan(model) -> float:
+    """全量读取耗时（重新扫描目录）"""
+    model.invalidate_dataset_cache()
+    t1 = time.perf_counter()
+    model.get_table()
+    return time.perf_counter() - t1
+
+
+def compact(models, target_bytes=None, measure=False, grace_seconds=None) -> dict:
+    """
+    :param target_bytes: 目标文件大小，默认settings.compact_target_bytes
+    :param measure: 是否统计compact前后的全量读取耗时
+    :param grace_seconds: 旧文件保留时间，默认settings.compact_vacuum_grace
+    :return: {模型名: 统计}
+    """
+    res = {}
+    for model in models:
+        if not os.path.isdir(model.get_etl_dir()):
+            continue
+        scan_before = measure_scan(model) if measure else None
+        item = model.compact(target_bytes)
+        item['vacuumed_files'] = model.vacuum(grace_seconds)
+        if measure:
+            item['scan_seconds_before'] = scan_before
+            item['scan_seconds_after'] = measure_scan(model)
+        res[model.__name__] = item
+    return res
+
+
+def vacuum(models, grace_seconds=None) -> dict:
+    """:return: {模型名: 删除的文件数}"""
+    return {model.__name__: model.vacuum(grace_seconds) for model in models if os.path.isdir(model.get_etl_dir())}
+
+
+def plan(models, start_date, end_date=None, secu_codes=None, rows_per_unit=None) -> dict:
+    """
+    :param secu_codes: 证券代码列表
+    :param rows_per_unit: 每个工作单元的目标行数，默认取模型的plan_rows_per_unit
+    :return: {模型名: [(secu_codes, start_date, end_date, 估计行数)]}
+    """
+    res = {}
+    for model in models:
+        origin_rows_per_unit = model.plan_rows_per_unit
+        model.plan_rows_per_unit = rows_per_unit or origin_rows_per_unit
+        try:
+            res[model.__name__] = model.plan_work_units(secu_codes, as_date(start_date),
+                                                        as_date(end_date or date.today()))
+        finally:
+            model.plan_rows_per_unit = origin_rows_per_unit
+    return res
+
+
+def print_plan(res: dict):
+    print(f"{'model':<32}{'start_date':<12}{'end_date':<12}{'rows':>12}  secu_codes")
+    for name, units in res.items():
+        for secu_codes, s_date, e_date, rows in units:
+            print(f"{name:<32}{str(s_date):<12}{str(e_date):<12}{'' if rows is None else rows:>12}  "
+                  f"{secu_codes or ''}")
+
+
+def print_compact(res: dict):
+    print(f"{'model':<32}{'files_before':>14}{'files_after':>13}{'compacted':>11}{'seconds':>10}"
+          f"{'scan_before':>13}{'scan_after':>12}")
+    for name, item in res.items():
+        scan_before, scan_after = item.get('scan_seconds_before'), item.get('scan_seconds_after')
+        print(f"{name:<32}{item['files_before']:>14}{item['files_after']:>13}{item['compacted_files']:>11}"
+              f"{item['seconds']:>10.2f}"
+              f"{'' if scan_before is None else f'{scan_before:.3f}':>13}"
+              f"{'' if scan_after is None else f'{scan_after:.3f}':>12}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='etl目录维护')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help='按证券分区的旧目录迁移为分桶目录')
+    migrate_parser.add_argument('-m', '--models', nargs='*', help='模型名，默认全部分桶模型')
+    compact_parser = subparsers.add_parser('compact', help='合并小文件')
+    compact_parser.add_argument('-m', '--models', nargs='*', help='模型名，默认全部模型')
+    compact_parser.add_argument('--target-mb', type=int, help='目标文件大小(MB)，默认settings.compact_target_bytes')
+    compact_parser.add_argument('--measure', action='store_true', help='统计compact前后的全量读取耗时')
+    compact_parser.add_argument('--grace', type=int, help='旧文件保留时间(秒)，默认settings.compact_vacuum_grace')
+    compact_parser.add_argument('--interval', type=int, help='按间隔(秒)循环执行')
+    vacuum_parser = subparsers.add_parser('vacuum', help='删除compact替换下的旧文件')
+    vacuum_parser.add_argument('-m', '--models', nargs='*', help='模型名，默认全部模型')
+    vacuum_parser.add_argument('--grace', type=int, help='旧文件保留时间(秒)，默认settings.compact_vacuum_grace')
+    plan_parser = subparsers.add_parser('plan', help='输出并发查询的工作单元规划')
+    plan_parser.add_argument('-m', '--models', nargs='*', help='模型名，默认全部并发查询的模型（配置了PLAN_DATE_COLUMN）')
+    plan_parser.add_argument('--start', required=True, help='开始日期 yyyy-mm-dd')
+    plan_parser.add_argument('--end', help='结束日期 yyyy-mm-dd，默认今天')
+    plan_parser.add_argument('--codes', nargs='*', help='证券代码，与run_etl的secu_codes一致')
+    plan_parser.add_argument('--rows', type=int, help='每个工作单元的目标行数，默认settings.plan_rows_per_unit')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        for _name, _rows in migrate(resolve_models(args.models, lambda m: m.bucket_count)).items():
+            print(f'{_name:<32}{_rows:>12}')
+    elif args.command == 'compact':
+        _models = resolve_models(args.models)
+        while True:
+            print_compact(compact(_models, args.target_mb and args.target_mb * 1024 ** 2, args.measure, args.grace))
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    elif args.command == 'vacuum':
+        for _name, _removed in vacuum(resolve_models(args.models), args.grace).items():
+            print(f'{_name:<32}{_removed:>12}')
+    elif args.command == 'plan':
+        print_plan(plan(resolve_models(args.models, lambda m: m.PLAN_DATE_COLUMN), args.start, args.end,
+                        secu_codes=args.codes, rows_per_unit=args.rows))
@@ -82,6 +82,18 @@ def etl_asset():
     AssetClassification.run_etl(is_init=True)
     AssetClassificationRelation.run_etl(is_init=True)
 
+@timing
+def etl_incremental():
+    """按日期分区的行情数据增量更新（只拉取水位线之后的数据）"""
+    BenchmarkDailyQuote.run_etl(start_date=year_2015, is_concurrent_query=True, is_concurrent_save=True,
+                                is_incremental=True)
+    StockDailyQuote.run_etl(start_date=year_2015, is_concurrent_query=True, is_incremental=True)
+    BondDailyQuote.run_etl(start_date=year_2020, is_concurrent_query=True, is_incremental=True)
+    StockIndexPortfolio.run_etl(start_date=year_2020, is_concurrent_query=True, is_concurrent_save=True,
+                                is_incremental=True)
+    IndexRate.run_etl(start_date=year_2020, is_incremental=True)
+
+
 @timing
 def run_etl():
     # 需要先跑etl_protfolio
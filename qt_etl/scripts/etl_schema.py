@@ -169,6 +169,7 @@ def check_etl():
             "model": model.__name__,
             "partitioned_by_date": '' if isinstance(partitioned_by_date, bool) else partitioned_by_date,
             "partitioned_cols": partitioned_cols,
+            "bucket_count": model.bucket_count or '',
         }
         data.append(item)
     df = pd.DataFrame(data)
@@ -1,8 +1,15 @@
 # vim set fileencoding=utf-8
 """entity utils"""
+import importlib
+import json
+import math
 from datetime import date, datetime
 from typing import Union, Dict
 
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
 from qt_common.protoc.db.event import EventStatus
 from qt_common.utils import str_to_date, date_to_str
 from qt_etl.constants import PartitionByDateType
@@ -112,3 +119,80 @@ class CurrExchRateTools:
             req_exch_rate: float = exch_rate_map.get(req_curr + Currency.CNY.value)
             req_reverse_exch_rate: float = exch_rate_map.get(Currency.CNY.value + req_curr)
             return CurrExchRateTools.cny_to_other_cuur(s_value, req_exch_rate, req_reverse_exch_rate)
+
+
+def _group_offsets(df: pd.DataFrame, by: str):
+    """按by稳定排序（组内保持原顺序），返回 (排序后的df, 分组值, offsets)"""
+    df = df.sort_values(by, kind='stable')
+    codes, uniques = pd.factorize(df[by], sort=False)
+    offsets = np.zeros(len(uniques) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(codes, minlength=len(uniques)), out=offsets[1:])
+    return df, uniques, offsets
+
+
+def group_to_list(df: pd.DataFrame, by: str, value: str, value_type: pa.DataType) -> pd.Series:
+    """
+    分组转为列表（向量化构建pa.ListArray，不逐组apply）
+    :return: index为分组值，值为每组value的数组
+    """
+    if df.empty:
+        return pd.Series(dtype=object)
+    df, uniques, offsets = _group_offsets(df[df[by].notna()], by)
+    array = pa.ListArray.from_arrays(pa.array(offsets), pa.array(df[value], type=value_type, from_pandas=True))
+    # to_pandas()返回带RangeIndex的Series，直接指定index会按标签对齐（全部为NaN），取numpy数组
+    return pd.Series(array.to_pandas().to_numpy(), index=uniques)
+
+
+def group_to_map(df: pd.DataFrame, by: str, key: str, value: str,
+                 key_type: pa.DataType = pa.string(), value_type: pa.DataType = pa.float64()) -> pd.Series:
+    """
+    分组转为map（向量化构建pa.MapArray），与dict(zip(key, value))一致：
+    同一组内key重复时取最后一条的value，key保持第一次出现的顺序
+    :return: index为分组值，值为每组[(key, value)]
+    """
+    df = df[df[by].notna() & df[key].notna()]
+    if df.empty:
+        return pd.Series(dtype=object)
+    if df.duplicated(subset=[by, key]).any():
+        # 重复的key：第一次出现的行取最后一条的value
+        group_ids = df.groupby([by, key], sort=False).ngroup().to_numpy()
+        last_positions = pd.Series(np.arange(len(df))).groupby(group_ids).transform('max').to_numpy()
+        df = df.assign(**{value: df[value].to_numpy()[last_positions]})
+        df = df[~df.duplicated(subset=[by, key], keep='first')]
+    df, uniques, offsets = _group_offsets(df, by)
+    array = pa.MapArray.from_arrays(pa.array(offsets), pa.array(df[key], type=key_type),
+                                    pa.array(df[value], type=value_type, from_pandas=True))
+    return pd.Series(array.to_pandas().to_numpy(), index=uniques)
+
+
+def map_to_json(value):
+    """map字段（[(key, value)]）转为原json字符串格式，兼容按json读取的代码"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return json.dumps(dict(value))
+
+
+def lazy_exports(module_globals: dict, exports: Dict[str, str]):
+    """
+    包按需导入：访问导出名称时才导入所在模块（PEP 562），用于替代__init__中的 from .x import *
+        __getattr__, __dir__ = lazy_exports(globals(), {'BondInfo': '.bond_info'})
+    :param module_globals: 包__init__的globals()
+    :param exports: {导出名称: 相对模块路径}
+    :return: (__getattr__, __dir__)
+    """
+    package = module_globals['__name__']
+
+    def __getattr__(name):
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f'module {package!r} has no attribute {name!r}')
+        value = getattr(importlib.import_module(module, package), name)
+        module_globals[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(module_globals) | set(exports))
+
+    return __getattr__, __dir__
@@ -0,0 +1,51 @@
+# vim set fileencoding=utf-8
+"""测试公共fixture：etl目录指向临时目录，关闭指标记录"""
+import pytest
+
+from qt_etl.config import settings
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.market_data.bond_val_csi import BondValCSI
+from tests.helpers import bond_val_frame, make_model, quote_frame, trade_dates
+
+
+@pytest.fixture(autouse=True)
+def etl_save_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(EntityBase, 'etl_save_path', str(tmp_path))
+    monkeypatch.setattr(settings, 'enabled_metrics', False)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def quote_model():
+    """
+    按证券、日期区间生成行情数据的测试模型
+    quote_model(codes, start_date, end_date, value=1.0, **attrs)，attrs为覆盖的类属性
+    """
+
+    def _quote_model(codes=('A', 'B'), start_date='2021-01-04', end_date='2021-03-31', value=1.0, **attrs):
+        return make_model(source=quote_frame(codes, trade_dates(start_date, end_date), value), **attrs)
+
+    return _quote_model
+
+
+@pytest.fixture
+def bond_val_csi(monkeypatch):
+    """
+    BondValCSI，fetch_data按bond_codes、bond_value生成估值数据（按secu_code过滤），调用记录在calls
+    run_etl会修改的类属性在测试后还原
+    """
+    calls = []
+
+    def fetch_data(cls, secu_code=None, start_date=None, end_date=None):
+        calls.append((secu_code, start_date, end_date))
+        codes = cls.parse_secu_codes(secu_code) or cls.bond_codes
+        return bond_val_frame(cls.schema, [code for code in cls.bond_codes if code in codes],
+                              trade_dates(start_date, end_date), cls.bond_value)
+
+    monkeypatch.setattr(BondValCSI, 'fetch_data', classmethod(fetch_data))
+    monkeypatch.setattr(BondValCSI, 'calls', calls, raising=False)
+    monkeypatch.setattr(BondValCSI, 'bond_codes', ['B1', 'B2'], raising=False)
+    monkeypatch.setattr(BondValCSI, 'bond_value', 1.0, raising=False)
+    for name in ('is_concurrent_query', 'is_concurrent_save', 'partitioned_by_date'):
+        monkeypatch.setattr(BondValCSI, name, getattr(BondValCSI, name))
+    return BondValCSI
@@ -0,0 +1,63 @@
+# vim set fileencoding=utf-8
+"""测试用的合成数据和模型"""
+import pandas as pd
+import pyarrow as pa
+
+from qt_etl.constants import PartitionByDateType
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.fields import Dimension, Measure
+
+__all__ = ['trade_dates', 'quote_frame', 'bond_val_frame', 'make_model']
+
+
+def trade_dates(start_date, end_date) -> list:
+    """区间内的工作日 yyyy-mm-dd"""
+    return [d.strftime('%Y-%m-%d') for d in pd.bdate_range(start_date, end_date)]
+
+
+def quote_frame(codes, dates, value=1.0) -> pd.DataFrame:
+    """codes x dates 的行情数据"""
+    return pd.DataFrame([{Dimension.INSTRUMENT_CODE: code, Dimension.TRADE_DATE: d, Measure.CLOSE: value}
+                         for code in codes for d in dates])
+
+
+def bond_val_frame(schema: pa.Schema, codes, dates, value=1.0) -> pd.DataFrame:
+    """codes x dates 的债券估值数据，数值字段取value"""
+    df = pd.DataFrame([{Dimension.INSTRUMENT_CODE: code, Dimension.TRADE_DATE: d} for code in codes for d in dates])
+    for field in schema:
+        if field.name not in df.columns:
+            df[field.name] = 'B' if field.name == Measure.RCM_DIR else value
+    return df
+
+
+def make_model(name='QuoteModel', source: pd.DataFrame = None, **attrs):
+    """
+    测试模型：fetch_data从source中按证券、日期过滤
+    :param attrs: 覆盖的类属性
+    """
+
+    @classmethod
+    def fetch_data(cls, secu_code=None, start_date=None, end_date=None, **kwargs):
+        cls.fetch_calls.append((secu_code, start_date, end_date))
+        df = cls.source
+        if df is None or df.empty:
+            return pd.DataFrame()
+        mask = (df[Dimension.TRADE_DATE] >= str(start_date)) & (df[Dimension.TRADE_DATE] <= str(end_date))
+        if secu_code:
+            mask &= df[Dimension.INSTRUMENT_CODE].isin(secu_code)
+        return df[mask].reset_index(drop=True)
+
+    namespace = {
+        'schema': pa.schema([
+            pa.field(Dimension.INSTRUMENT_CODE, pa.string()),
+            pa.field(Dimension.TRADE_DATE, pa.string()),
+            pa.field(Measure.CLOSE, pa.float64()),
+        ]),
+        'partitioned_by_date': PartitionByDateType.month,
+        'CODE_COLUMN': Dimension.INSTRUMENT_CODE,
+        'source': source,
+        'fetch_calls': [],
+        'fetch_data': fetch_data,
+    }
+    namespace.update(attrs)
+    return type(name, (EntityBase,), namespace)
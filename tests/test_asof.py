@@ -0,0 +1,52 @@
+# vim set fileencoding=utf-8
+"""asof_join：取不晚于左表日期的最近一条评级，同一日期多条时取数据中的最后一条"""
+import pandas as pd
+import pytest
+
+from qt_etl.entity.entity_base import EntityBase
+from qt_etl.entity.fields import Dimension
+from qt_etl.scripts.benchmark.bench_asof import legacy_join
+
+
+@pytest.fixture
+def frames():
+    left = pd.DataFrame({
+        Dimension.TRADE_DATE: ['2021-03-02', '2020-12-31', '2021-01-01', '2021-02-15', '2021-03-01', None],
+        Dimension.ISSUER_CODE: ['P2', 'P1', 'P1', 'P1', 'P1', 'P1'],
+    })
+    # get_data的顺序：trade_date降序；P1在2021-01-01有两条评级
+    right = pd.DataFrame({
+        Dimension.ISSUER_CODE: ['P1', 'P2', 'P1', 'P1'],
+        Dimension.TRADE_DATE: ['2021-03-01', '2021-02-01', '2021-01-01', '2021-01-01'],
+        Dimension.RATING: ['AA', 'AAA', 'A', 'A+'],
+    })
+    return left, right
+
+
+def join(left, right):
+    return EntityBase.asof_join(left, right, by=Dimension.ISSUER_CODE, columns=[Dimension.RATING])
+
+
+def test_latest_rating(frames):
+    left, right = frames
+    res = join(left, right)
+    # 左表顺序不变；日期相等可关联；同日多条取最后一条；空日期不关联
+    assert res[Dimension.TRADE_DATE].tolist() == left[Dimension.TRADE_DATE].tolist()
+    assert res[Dimension.RATING].fillna('').tolist() == ['AAA', '', 'A+', 'A+', 'AA', '']
+
+
+def test_latest_rating_regardless_of_order(frames):
+    left, right = frames
+    expected = join(left, right)
+    # 日期不同的评级与输入顺序无关
+    ascending = right.iloc[[2, 3, 1, 0]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(join(left, ascending), expected)
+
+
+def test_differs_from_legacy(frames):
+    left, right = frames
+    res = join(left, right).set_index([Dimension.TRADE_DATE, Dimension.ISSUER_CODE])
+    legacy = legacy_join(left.dropna(), right).set_index([Dimension.TRADE_DATE, Dimension.ISSUER_CODE])
+    # 原实现在降序数据上取最早生效的评级，评级变动之后两者不同
+    assert legacy.loc[('2021-03-01', 'P1'), Dimension.RATING] == 'A+'
+    assert res.loc[('2021-03-01', 'P1'), Dimension.RATING] == 'AA'
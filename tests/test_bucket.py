@@ -0,0 +1,37 @@
+# vim set fileencoding=utf-8
+"""分桶：同一个桶内有多个证券时，只拉取部分证券的运行不影响桶内其他证券"""
+from datetime import date
+
+import pytest
+
+from qt_etl.entity.entity_base import bucket_of
+from qt_etl.entity.fields import Dimension, Measure
+from tests.helpers import trade_dates
+
+
+@pytest.fixture
+def same_bucket_codes(bond_val_csi):
+    codes = [f'B{i}' for i in range(1, 200)]
+    bucket = bucket_of(codes[0], bond_val_csi.bucket_count)
+    return [code for code in codes if bucket_of(code, bond_val_csi.bucket_count) == bucket][:2]
+
+
+@pytest.mark.parametrize('run_kwargs', [{'is_concurrent_query': True, 'executor': 'serial'}, {'is_stream': True}])
+def test_partial_run_keeps_bucket_mates(bond_val_csi, same_bucket_codes, monkeypatch, run_kwargs):
+    code, mate = same_bucket_codes
+    monkeypatch.setattr(bond_val_csi, 'bond_codes', same_bucket_codes)
+    bond_val_csi.run_etl(secu_codes=same_bucket_codes, start_date=date(2021, 1, 1), end_date=date(2021, 3, 31),
+                         is_init=True, **run_kwargs)
+    rows = len(trade_dates('2021-01-01', '2021-03-31'))
+    df = bond_val_csi.get_data()
+    assert (df[Dimension.INSTRUMENT_CODE] == mate).sum() == rows
+
+    # 只刷新一个证券3月的数据
+    monkeypatch.setattr(bond_val_csi, 'bond_value', 2.0)
+    bond_val_csi.run_etl(secu_codes=[code], start_date=date(2021, 3, 1), end_date=date(2021, 3, 31), **run_kwargs)
+    df = bond_val_csi.get_data()
+    assert (df[Dimension.INSTRUMENT_CODE] == mate).sum() == rows
+    assert (df[Dimension.INSTRUMENT_CODE] == code).sum() == rows
+    refreshed = df[df[Dimension.INSTRUMENT_CODE] == code]
+    assert set(refreshed[refreshed[Dimension.TRADE_DATE] >= '2021-03-01'][Measure.YIELD]) == {2.0}
+    assert set(df[df[Dimension.INSTRUMENT_CODE] == mate][Measure.YIELD]) == {1.0}
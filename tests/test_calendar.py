@@ -0,0 +1,53 @@
+# vim set fileencoding=utf-8
+"""交易日历：进程内CalendarIndex缓存与原按get_data查找的结果一致"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from qt_etl.entity.market_data.qt_calendar import CalendarIndex, QtCalendar
+from tests.helpers import trade_dates
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    dates = [d.date() for d in pd.to_datetime(trade_dates('2021-01-01', '2021-03-31'))]
+    # CAL0002每周一休市
+    calendar_dates = pd.concat([
+        pd.DataFrame({'CALENDAR_DATE': dates, 'CALENDAR_ID': 'CAL0001'}),
+        pd.DataFrame({'CALENDAR_DATE': [d for d in dates if d.weekday()], 'CALENDAR_ID': 'CAL0002'}),
+    ]).sort_values('CALENDAR_DATE', kind='stable', ignore_index=True)
+    monkeypatch.setattr(QtCalendar, 'get_calendar', classmethod(
+        lambda cls: pd.DataFrame({'CALENDAR_ID': ['CAL0001']})))
+    monkeypatch.setattr(QtCalendar, 'get_calendar_date', classmethod(lambda cls: calendar_dates.copy()))
+    QtCalendar.run_etl(is_init=True)
+    return dates
+
+
+def test_cache_holds_calendar_indexes(calendar):
+    indexes = QtCalendar.load_calendar_indexes()
+    assert set(indexes) == {'CAL0001', 'CAL0002', 'CAL0004'}
+    assert all(isinstance(index, CalendarIndex) for index in indexes.values())
+    # 不存在的日历（含None）没有索引，查找返回None
+    assert QtCalendar.get_calendar_index(None) is None
+    assert QtCalendar.get_prev_biz_date(date(2021, 2, 10), calendar_id=None) is None
+
+
+@pytest.mark.parametrize('calendar_id', ['CAL0002', None])
+def test_trade_date_by_calendar_id(calendar, calendar_id):
+    start_date, end_date = date(2021, 2, 1), date(2021, 2, 28)
+    df = QtCalendar.get_trade_date_by_calendar_id(start_date, end_date, calendar_id=calendar_id)
+    # 返回ALL分区中的原始行（含原索引），按索引排序
+    expected = QtCalendar.get_data(start_date=start_date, end_date=end_date).loc['ALL'].sort_index()
+    if calendar_id:
+        expected = expected[expected.CALENDAR_ID == calendar_id]
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(df) == (16 if calendar_id else 16 + 20)
+
+
+def test_prev_biz_date(calendar):
+    # 2021-02-08为周一，CAL0002休市
+    assert QtCalendar.get_prev_biz_date(date(2021, 2, 8), num=1) == date(2021, 2, 5)
+    assert QtCalendar.get_prev_biz_date(date(2021, 2, 8), num=1, calendar_id='CAL0002') == date(2021, 2, 4)
+    assert QtCalendar.get_prev_biz_date(date(2021, 2, 8), num=0, calendar_id='CAL0002') == date(2021, 2, 9)
+    assert QtCalendar.get_biz_days_between(date(2021, 2, 1), date(2021, 2, 28), calendar_id='CAL0002') == 16
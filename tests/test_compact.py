@@ -0,0 +1,50 @@
+# vim set fileencoding=utf-8
+"""compact/vacuum：compact之后再次写入的文件不会被tombstone排除或删除"""
+from datetime import date
+
+from qt_etl.constants import PartitionByDateType
+from tests.helpers import quote_frame, trade_dates
+
+
+def test_save_after_compact_then_vacuum(quote_model):
+    codes, dates = [f'C{i}' for i in range(10)], trade_dates('2021-01-04', '2021-02-12')
+    # 按年分区，每个文件100行：一次写入产生多个小文件
+    model = quote_model(codes, dates[0], dates[-1], partitioned_by_date=PartitionByDateType.year,
+                        partition_max_rows_per_file=100)
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 12, 31), is_init=True)
+    assert len(model.get_data()) == 300
+
+    res = model.compact()
+    assert res['compacted_files'] == 3 and res['new_files'] == 1
+    assert len(model.get_data()) == 300
+
+    # 非合并写入整体替换分区目录，新文件不能与tombstone同名
+    model.source = quote_frame(codes, dates, value=2.0)
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 12, 31))
+    df = model.get_data()
+    assert len(df) == 300 and (df['close'] == 2.0).all()
+
+    model.vacuum(grace_seconds=0)
+    assert not model.load_etl_state().get('tombstones')
+    df = model.get_data()
+    assert len(df) == 300 and (df['close'] == 2.0).all()
+
+
+def test_merge_rewrite_keeps_retired_files_for_readers(quote_model):
+    model = quote_model(['A', 'B'], '2021-01-04', '2021-02-26')
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 2, 28), is_init=True)
+    # 读取方持有合并写入前的dataset
+    dataset = model.get_dataset()
+
+    model.source = quote_frame(['A'], trade_dates('2021-02-01', '2021-02-26'), value=2.0)
+    model.run_etl(secu_codes=['A'], start_date=date(2021, 2, 1), end_date=date(2021, 2, 28))
+    # 被重写的旧文件登记为tombstone，旧dataset仍可读完
+    assert dataset.to_table().num_rows == 2 * len(trade_dates('2021-01-04', '2021-02-26'))
+    assert model.load_etl_state().get('tombstones')
+    df = model.get_data()
+    assert len(df) == 2 * len(trade_dates('2021-01-04', '2021-02-26'))
+    assert (df[df['close'] == 2.0]['instrument_code'] == 'A').all()
+
+    assert model.vacuum(grace_seconds=0) > 0
+    assert not model.load_etl_state().get('tombstones')
+    assert len(model.get_data()) == len(df)
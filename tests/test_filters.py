@@ -0,0 +1,46 @@
+# vim set fileencoding=utf-8
+"""build_filter：列表条件在isin之外带上min/max范围，可按row group统计信息裁剪"""
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from qt_etl.entity.fields import Dimension
+from qt_etl.entity.filters import build_filter
+
+
+def make_dataset(path, nulls: int = 0) -> ds.Dataset:
+    # 按证券排序写入，每个row group一个证券；nulls为证券、数值为空的行数
+    codes = [f'C{i:03d}' for i in range(10) for _ in range(100)] + [None] * nulls
+    values = [float(i) for i in range(len(codes) - nulls)] + [float('nan')] * nulls
+    table = pa.table({Dimension.INSTRUMENT_CODE: codes, 'value': values})
+    pq.write_table(table, str(path / 'part-0.parquet'), row_group_size=100)
+    return ds.dataset(str(path), format='parquet')
+
+
+def scanned_row_groups(dataset, expression) -> int:
+    return sum(sub.num_row_groups for fragment in dataset.get_fragments(filter=expression)
+               for sub in fragment.split_by_row_group(expression))
+
+
+def test_list_cond_prunes_row_groups(tmp_path):
+    dataset = make_dataset(tmp_path)
+    expression = build_filter(dataset.schema.names, cond={Dimension.INSTRUMENT_CODE: ['C003', 'C005']})
+    assert '>=' in str(expression) and '<=' in str(expression)
+    # 范围C003~C005内的row group才需要读取
+    assert scanned_row_groups(dataset, expression) <= 3
+    # 范围内不在列表中的证券仍由isin过滤
+    codes = dataset.to_table(filter=expression)[Dimension.INSTRUMENT_CODE].to_pylist()
+    assert sorted(set(codes)) == ['C003', 'C005'] and len(codes) == 200
+
+
+def test_list_cond_with_none(tmp_path):
+    dataset = make_dataset(tmp_path, nulls=10)
+    # 列表含None/NaN时不加范围，空值行与原isin一样匹配
+    for name, values in [(Dimension.INSTRUMENT_CODE, ['C001', None]), ('value', [1.0, float('nan')])]:
+        expression = build_filter(dataset.schema.names, cond={name: values})
+        assert '>=' not in str(expression)
+        expected = dataset.to_table(filter=pc.field(name).isin(values)).num_rows
+        assert dataset.to_table(filter=expression).num_rows == expected
+    assert dataset.to_table(filter=build_filter(
+        dataset.schema.names, cond={Dimension.INSTRUMENT_CODE: ['C001', None]})).num_rows == 110
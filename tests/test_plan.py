@@ -0,0 +1,58 @@
+# vim set fileencoding=utf-8
+"""并发查询规划：secu_codes为代码列表时按代码探测行数、按代码列表拆分工作单元"""
+import re
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from qt_etl.entity.fields import Dimension
+from tests.helpers import trade_dates
+
+DATES = trade_dates('2023-01-01', '2023-01-31')
+
+
+@pytest.fixture
+def plan_model(quote_model):
+    sqls = []
+
+    def query(cls, sql, **kwargs):
+        sqls.append(sql)
+        df = cls.source
+        codes = re.search(r"IDX_CODE in \((.*?)\)", sql)
+        if codes:
+            df = df[df[Dimension.INSTRUMENT_CODE].isin(re.findall(r"'([^']*)'", codes.group(1)))]
+        counts = df.groupby(Dimension.TRADE_DATE).size()
+        return pd.DataFrame({'PLAN_DATE': counts.index, 'PLAN_ROWS': counts.values})
+
+    # 源表有10个证券，只拉取其中2个
+    return quote_model(list('ABCDEFGHIJ'), DATES[0], DATES[-1], query=classmethod(query), sqls=sqls,
+                       main_table='QUOTE', PLAN_DATE_COLUMN='TRD_DATE', PLAN_CODE_COLUMN='IDX_CODE',
+                       plan_split_codes=True, plan_rows_per_unit=50)
+
+
+def test_probe_filters_list_codes(plan_model):
+    units = plan_model.plan_work_units(['A', 'B'], date(2023, 1, 1), date(2023, 1, 31))
+    assert "IDX_CODE in ('A','B')" in plan_model.sqls[-1]
+    # 按2个证券估计行数，整月一个单元
+    assert units == [(['A', 'B'], date(2023, 1, 1), date(2023, 1, 31), 2 * len(DATES))]
+
+
+def test_split_list_codes(plan_model):
+    plan_model.plan_rows_per_unit = 1
+    codes = tuple('ABCDEFGH')
+    units = plan_model.plan_work_units(codes, date(2023, 1, 2), date(2023, 1, 2))
+    # 单日超过目标行数，按代码拆分为多个代码列表
+    assert len(units) > 1 and all(isinstance(unit_codes, list) for unit_codes, *_ in units)
+    assert sorted(code for unit_codes, *_ in units for code in unit_codes) == list(codes)
+    # sql in列表字符串仍拆分为字符串
+    groups = plan_model.split_secu_codes(",".join(["'%s'" % code for code in codes]), 8)
+    assert len(groups) > 1 and all(isinstance(group, str) for group in groups)
+
+
+def test_concurrent_run_with_list_codes(plan_model):
+    rows = plan_model.run_etl(secu_codes=['A', 'B'], start_date=date(2023, 1, 1), end_date=date(2023, 1, 31),
+                              is_init=True, is_concurrent_query=True, executor='serial')
+    assert rows == 2 * len(DATES)
+    assert set(plan_model.get_data()[Dimension.INSTRUMENT_CODE]) == {'A', 'B'}
+    assert all(isinstance(codes, list) for codes, *_ in plan_model.fetch_calls)
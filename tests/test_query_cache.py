@@ -0,0 +1,90 @@
+# vim set fileencoding=utf-8
+"""源sql查询缓存：命中缓存与直接查询的结果（含decoder处理）一致"""
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from qt_common import db_manager
+from qt_etl import query_cache
+from qt_etl.config import settings
+from tests.helpers import make_model
+
+SQL = 'select * from QUOTE'
+
+
+def source_frame() -> pd.DataFrame:
+    # 源库驱动返回的类型：精度不同的Decimal、date、全空的object列
+    return pd.DataFrame({
+        'CODE': ['A', 'B', 'C'],
+        'PRICE': [Decimal('1.5'), Decimal('2.25'), None],
+        'TRD_DATE': [date(2021, 1, 4), date(2021, 1, 5), date(2021, 1, 6)],
+        'REMARK': pd.Series([None, None, None], dtype=object),
+    })
+
+
+def reprs(df: pd.DataFrame) -> pd.DataFrame:
+    # 逐值比较类型与格式：Decimal精度、None与NaN
+    return df.apply(lambda column: column.map(repr))
+
+
+@pytest.fixture
+def query_model(tmp_path, monkeypatch):
+    calls = []
+
+    def pd_read_sql(sql, session='default', decoder=None, **kwargs):
+        calls.append(sql)
+        df = source_frame()
+        return decoder(df) if decoder else df
+
+    monkeypatch.setattr(db_manager, 'pd_read_sql', pd_read_sql, raising=False)
+    monkeypatch.setattr(settings, 'enabled_query_cache', True)
+    monkeypatch.setattr(settings, 'query_cache_path', str(tmp_path / '.query_cache'))
+
+    def as_date_str(cls, df):
+        df['TRD_DATE'] = df['TRD_DATE'].map(lambda d: d.strftime('%Y%m%d'))
+        return df
+
+    def as_float(cls, df):
+        df['PRICE'] = df['PRICE'].astype(float)
+        return df
+
+    def as_text(cls, df):
+        df['PRICE'] = df['PRICE'].map(lambda v: '' if v is None else str(v))
+        return df
+
+    return make_model(calls=calls, as_date_str=classmethod(as_date_str), as_float=classmethod(as_float),
+                      as_text=classmethod(as_text))
+
+
+@pytest.mark.parametrize('decoder', [None, 'as_date_str', 'as_float', 'as_text'])
+def test_cached_equals_uncached(query_model, decoder):
+    as_format = getattr(query_model, decoder) if decoder else None
+    expected = query_model.query(SQL, as_format=as_format, use_cache=False)
+    miss = query_model.query(SQL, as_format=as_format)
+    hit = query_model.query(SQL, as_format=as_format)
+    # Decimal精度不一致的结果不缓存，decoder处理为float/字符串后可缓存
+    assert len(query_model.calls) == (2 if decoder in ('as_float', 'as_text') else 3)
+    for df in (miss, hit):
+        pd.testing.assert_frame_equal(df, expected)
+        assert reprs(df).equals(reprs(expected))
+
+
+def test_cache_by_decoder(query_model):
+    # 同一sql不同decoder的结果分别缓存
+    raw = query_model.query(SQL)
+    formatted = query_model.query(SQL, as_format=query_model.as_date_str)
+    assert len(query_model.calls) == 2
+    assert isinstance(raw['TRD_DATE'][0], date) and formatted['TRD_DATE'][0] == '20210104'
+
+
+def test_skip_lossy_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'query_cache_path', str(tmp_path))
+    # object列中的NaN往返后变为None，Decimal精度不同往返后补齐，均不缓存
+    assert not query_cache.put(SQL, 'default', pd.DataFrame({'A': pd.Series([float('nan'), 'x'], dtype=object)}))
+    assert not query_cache.put(SQL, 'default', pd.DataFrame({'A': [Decimal('1.5'), Decimal('2.25')]}))
+    assert query_cache.get(SQL) is None
+    df = source_frame().assign(PRICE=[Decimal('1.50'), Decimal('2.25'), None])
+    assert query_cache.put(SQL, 'default', df)
+    assert reprs(query_cache.get(SQL)).equals(reprs(df))
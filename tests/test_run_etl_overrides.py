@@ -0,0 +1,50 @@
+# vim set fileencoding=utf-8
+"""重写了run_etl的模型：扩展参数（is_stream、executor等）透传到EntityBase.run_etl"""
+from datetime import date
+
+import pytest
+
+from qt_etl.entity.market_data.bond_val_cnbd import BondValCNBD
+from qt_etl.entity.market_data.bond_val_csi import BondValCSI
+from qt_etl.entity.market_data.fund_daily_quote import FundDailyQuote
+from qt_etl.entity.market_data.index_rate import IndexRate
+from qt_etl.entity.market_data.time_series import TimeSeries
+from qt_etl.entity.market_data.yield_curve_cnbd_sample import YieldCurveCNBDSample
+from qt_etl.entity.trade_info.bond_trade_info import BondTradeInfo
+from tests.helpers import trade_dates
+
+
+def test_override_forwards_is_stream(bond_val_csi, monkeypatch):
+    chunks = []
+    origin_stream_and_save = bond_val_csi.stream_and_save.__func__
+
+    def stream_and_save(cls, *args, **kwargs):
+        chunks.append(kwargs)
+        return origin_stream_and_save(cls, *args, **kwargs)
+
+    monkeypatch.setattr(BondValCSI, 'stream_and_save', classmethod(stream_and_save))
+    rows = bond_val_csi.run_etl(secu_codes=['B1', 'B2'], start_date=date(2021, 1, 1), end_date=date(2021, 2, 28),
+                                is_init=True, is_stream=True)
+    assert chunks, 'is_stream未传到EntityBase.run_etl'
+    # 流式按月分块拉取
+    assert len(bond_val_csi.calls) == 2
+    assert rows == len(bond_val_csi.get_data()) == 2 * len(trade_dates('2021-01-01', '2021-02-28'))
+
+
+@pytest.mark.parametrize('model', [FundDailyQuote, BondValCSI, BondValCNBD, IndexRate, TimeSeries,
+                                   YieldCurveCNBDSample, BondTradeInfo])
+def test_override_forwards_executor_and_returns_rows(model, monkeypatch):
+    calls = []
+
+    def fetch_and_save(cls, *args, **kwargs):
+        calls.append(kwargs)
+        return 42
+
+    monkeypatch.setattr(model, 'fetch_and_save', classmethod(fetch_and_save))
+    # run_etl会修改类属性，测试后还原
+    monkeypatch.setattr(model, 'is_concurrent_query', model.is_concurrent_query)
+    monkeypatch.setattr(model, 'is_concurrent_save', model.is_concurrent_save)
+    rows = model.run_etl(secu_codes=['C1'], start_date=date(2021, 1, 1), end_date=date(2021, 1, 31),
+                         is_concurrent_query=True, executor='process')
+    assert rows == 42
+    assert calls[0]['executor'] == 'process'
@@ -0,0 +1,48 @@
+# vim set fileencoding=utf-8
+"""流式、并发查询写入：沿用已有数据的目录结构，不修改模型的partitioned_by_date"""
+import os
+from datetime import date
+
+import pytest
+
+from qt_common.error import QtException
+from qt_etl.constants import PartitionByDateType
+from tests.helpers import trade_dates
+
+ROWS = 2 * len(trade_dates('2021-01-01', '2021-03-31'))
+
+
+def run(model, **kwargs):
+    return model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 3, 31), secu_codes=['B1', 'B2'], **kwargs)
+
+
+def date_partition_dirs(model) -> set:
+    return {name.split('=', 1)[0] for _, dir_names, _ in os.walk(model.get_etl_dir()) for name in dir_names}
+
+
+def test_concurrent_run_keeps_existing_layout(bond_val_csi):
+    run(bond_val_csi, is_init=True)
+    run(bond_val_csi, is_concurrent_query=True, executor='serial')
+    assert bond_val_csi.partitioned_by_date is None
+    assert date_partition_dirs(bond_val_csi) == {bond_val_csi.BUCKET_FIELD}
+    assert len(bond_val_csi.get_data()) == ROWS
+
+
+def test_stream_run_refuses_other_layout(bond_val_csi):
+    run(bond_val_csi, is_init=True)
+    with pytest.raises(QtException):
+        run(bond_val_csi, is_stream=True)
+    assert date_partition_dirs(bond_val_csi) == {bond_val_csi.BUCKET_FIELD}
+    assert len(bond_val_csi.get_data()) == ROWS
+
+
+def test_stream_init_layout_is_kept(bond_val_csi):
+    run(bond_val_csi, is_init=True, is_stream=True)
+    # 按月分区记录在etl状态中，模型的类属性不变
+    assert bond_val_csi.partitioned_by_date is None
+    assert bond_val_csi.get_partitioned_by_date() == PartitionByDateType.month
+    run(bond_val_csi)
+    run(bond_val_csi, is_stream=True)
+    assert date_partition_dirs(bond_val_csi) == {bond_val_csi.BUCKET_FIELD, PartitionByDateType.month.value}
+    assert len(bond_val_csi.get_data()) == ROWS
+    assert len(bond_val_csi.get_data(start_date=date(2021, 3, 1))) == 2 * len(trade_dates('2021-03-01', '2021-03-31'))
@@ -0,0 +1,61 @@
+# vim set fileencoding=utf-8
+"""group_to_list/group_to_map与原逐组apply（list / json.dumps(dict(zip))）结果一致"""
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from qt_etl.utils import group_to_list, group_to_map, map_to_json
+
+
+@pytest.fixture
+def schedule_frame():
+    # 组内日期乱序、key重复（重复的key不相邻），含空分组值
+    return pd.DataFrame({
+        'code': ['B2', 'B1', 'B2', 'B1', 'B1', 'B2', None, 'B1'],
+        'date': ['2022-06-01', '2021-12-01', '2022-01-01', '2021-06-01', '2021-12-01', '2022-06-01', '2020-01-01',
+                 '2022-01-01'],
+        'value': [1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, np.nan],
+    })
+
+
+def legacy_list(df, by, value):
+    return df.groupby(by).apply(lambda x: x[value].to_list())
+
+
+def legacy_map(df, by, key, value):
+    return df.groupby(by).apply(lambda x: json.dumps(dict(zip(x[key], x[value]))))
+
+
+def test_group_to_list_matches_legacy(schedule_frame):
+    res = group_to_list(schedule_frame, 'code', 'date', pa.string())
+    expected = legacy_list(schedule_frame, 'code', 'date')
+    assert sorted(res.index) == sorted(expected.index)
+    for code, values in expected.items():
+        assert list(res[code]) == values
+
+
+def test_group_to_list_assign_by_index(schedule_frame):
+    # BondInfo按index赋值到基础信息df
+    df = pd.DataFrame(index=pd.Index(['B1', 'B2', 'B3'], name='code'))
+    df['rates'] = group_to_list(schedule_frame, 'code', 'value', pa.float64())
+    assert list(df.loc['B2', 'rates']) == [1.5, 2.5, 5.0]
+    assert df['rates'].notna().sum() == 2
+
+
+def test_group_to_map_matches_legacy(schedule_frame):
+    frame = schedule_frame.dropna(subset=['value'])
+    res = group_to_map(frame, 'code', 'date', 'value')
+    expected = legacy_map(frame, 'code', 'date', 'value')
+    assert sorted(res.index) == sorted(expected.index)
+    for code, value in expected.items():
+        # json字符串比较，同时校验key的顺序
+        assert map_to_json(res[code]) == value
+
+
+def test_group_to_map_key_order():
+    frame = pd.DataFrame({'code': ['B1'] * 4, 'date': ['d2', 'd1', 'd2', 'd3'], 'value': [1.0, 2.0, 3.0, 4.0]})
+    res = group_to_map(frame, 'code', 'date', 'value')
+    assert list(res['B1']) == [('d2', 3.0), ('d1', 2.0), ('d3', 4.0)]
@@ -0,0 +1,92 @@
+# vim set fileencoding=utf-8
+"""水位线：只拉取部分证券或窗口留有空档的运行不推进水位线"""
+from datetime import date
+
+from qt_etl.entity.fields import Dimension
+from qt_etl.entity.portfolio.comb_position import CombPosition
+from tests.helpers import trade_dates
+
+
+def test_init_run_advances_watermark(quote_model):
+    model = quote_model()
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 1, 31), is_init=True)
+    assert model.get_watermark() == '2021-01-29'
+
+
+def test_secu_codes_run_keeps_watermark(quote_model):
+    model = quote_model()
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 1, 31), is_init=True)
+    model.run_etl(secu_codes=['A'], start_date=date(2021, 2, 1), end_date=date(2021, 2, 28))
+    assert model.get_watermark() == '2021-01-29'
+
+    # 下次增量从水位线之后开始，仍拉取B在2月的数据
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 2, 28), is_incremental=True)
+    df = model.get_data()
+    assert set(df[df['trade_date'] >= '2021-02-01']['instrument_code']) == {'A', 'B'}
+    assert model.get_watermark() == '2021-02-26'
+
+
+def test_gap_window_keeps_watermark(quote_model):
+    model = quote_model()
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 1, 31), is_init=True)
+    model.run_etl(start_date=date(2021, 3, 1), end_date=date(2021, 3, 31))
+    assert model.get_watermark() == '2021-01-29'
+
+    # 与水位线衔接的窗口推进水位线
+    model.run_etl(start_date=date(2021, 1, 30), end_date=date(2021, 2, 28))
+    assert model.get_watermark() == '2021-02-26'
+
+
+def test_incremental_stream_run_advances_watermark(quote_model):
+    model = quote_model()
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 1, 31), is_init=True, is_stream=True)
+    model.run_etl(secu_codes=['B'], start_date=date(2021, 2, 1), end_date=date(2021, 2, 28), is_stream=True)
+    assert model.get_watermark() == '2021-01-29'
+    model.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 2, 28), is_incremental=True, is_stream=True)
+    assert model.get_watermark() == '2021-02-26'
+
+
+def test_full_universe_flag(quote_model):
+    model = quote_model()
+    assert model.can_advance_watermark(['A'], date(2021, 1, 1), is_full_universe=True)
+    assert not model.can_advance_watermark(['A'], date(2021, 1, 1))
+    assert model.can_advance_watermark(None, date(2021, 1, 1))
+
+
+def test_new_codes_backfilled_before_watermark(quote_model):
+    model = quote_model()
+    model.run_etl(secu_codes=['A'], start_date=date(2021, 1, 1), end_date=date(2021, 1, 31), is_init=True,
+                  is_full_universe=True)
+    assert model.get_watermark() == '2021-01-29'
+    assert model.get_watermark_codes() == {'A'}
+
+    # 证券范围新增B：增量时B从start_date补齐，A只拉取水位线之后
+    model.run_etl(secu_codes=['A', 'B'], start_date=date(2021, 1, 1), end_date=date(2021, 2, 28),
+                  is_incremental=True, is_full_universe=True)
+    df = model.get_data()
+    assert len(df[df[Dimension.INSTRUMENT_CODE] == 'B']) == len(df[df[Dimension.INSTRUMENT_CODE] == 'A']) == \
+        len(trade_dates('2021-01-04', '2021-02-28'))
+    assert model.get_watermark() == '2021-02-26'
+    assert model.get_watermark_codes() == {'A', 'B'}
+
+
+def test_default_universe_advances_watermark(bond_val_csi, monkeypatch):
+    holdings = ['B1']
+    # 按月分区（并发查询）才支持增量
+    concurrent = dict(is_concurrent_query=True, executor='serial')
+    monkeypatch.setattr(CombPosition, 'get_secu_code_list', classmethod(lambda cls, secu_type=None: holdings))
+    bond_val_csi.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 1, 31), is_init=True,
+                         **concurrent)
+    assert bond_val_csi.get_watermark() == '2021-01-29'
+    # 指定证券时不推进水位线
+    bond_val_csi.run_etl(secu_codes=['B1'], start_date=date(2021, 2, 1), end_date=date(2021, 2, 28),
+                         **concurrent)
+    assert bond_val_csi.get_watermark() == '2021-01-29'
+
+    # B2新进入持仓：增量运行补齐B2水位线之前的数据
+    holdings.append('B2')
+    bond_val_csi.run_etl(start_date=date(2021, 1, 1), end_date=date(2021, 2, 28), is_incremental=True,
+                         **concurrent)
+    assert bond_val_csi.get_watermark() == '2021-02-26'
+    df = bond_val_csi.get_data(secu_codes=['B2'])
+    assert sorted(df[Dimension.TRADE_DATE]) == trade_dates('2021-01-01', '2021-02-28')